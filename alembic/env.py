@@ -79,7 +79,8 @@ def run_migrations_online() -> None:
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
-        url=os.environ.get("DATABASE_URL"),
+        # run_app pasa la URL resuelta (incluida la base local SQLite) en sqlalchemy.url
+        url=os.environ.get("DATABASE_URL") or config.get_main_option("sqlalchemy.url"),
     )
 
     with connectable.connect() as connection:
@@ -0,0 +1,29 @@
+"""agregar huella_ficha a licitaciones
+
+Revision ID: 3aa44f9cf523
+Revises: ff20be777eea
+Create Date: 2026-10-19 12:20:07.551342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3aa44f9cf523'
+down_revision: Union[str, Sequence[str], None] = 'ff20be777eea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sin backfill: la primera descarga de cada ficha calcula su huella
+    op.add_column('ca_licitacion', sa.Column('huella_ficha', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ca_licitacion', 'huella_ficha')
@@ -0,0 +1,69 @@
+"""particionar licitaciones por mes
+
+Revision ID: 3f942cdb4d5b
+Revises: 3aa44f9cf523
+Create Date: 2026-10-19 13:41:18.205617
+
+Agrega siempre la clave 'mes_particion' (mes de fecha_publicacion) y el índice
+único (codigo_ca, mes_particion) que usa el ETL. La conversión a tabla
+particionada es opcional y solo en PostgreSQL:
+
+    alembic -x particionar=true upgrade head
+
+Para particionar una base que ya pasó por esta revisión:
+
+    alembic downgrade 3aa44f9cf523 && alembic -x particionar=true upgrade head
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from src.db.ddl_particiones import convertir_a_particionada, revertir_a_tabla_plana
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f942cdb4d5b'
+down_revision: Union[str, Sequence[str], None] = '3aa44f9cf523'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# Mismo criterio que db_models.mes_particion_de
+BACKFILL_MES = {
+    "postgresql": "UPDATE ca_licitacion SET mes_particion = "
+                  "coalesce(CAST(date_trunc('month', fecha_publicacion) AS date), DATE '1900-01-01')",
+    "sqlite": "UPDATE ca_licitacion SET mes_particion = "
+              "coalesce(date(fecha_publicacion, 'start of month'), '1900-01-01')",
+}
+
+
+def _particionar_solicitado() -> bool:
+    return context.get_x_argument(as_dictionary=True).get('particionar', 'false').lower() == 'true'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialecto = op.get_bind().dialect.name
+    op.add_column('ca_licitacion', sa.Column('mes_particion', sa.Date(), nullable=True))
+    op.execute(BACKFILL_MES.get(dialecto, BACKFILL_MES["postgresql"]))
+    # SQLite no admite SET NOT NULL y el modo batch recrearía la tabla perdiendo el DESC de los índices
+    if dialecto != 'sqlite':
+        op.alter_column('ca_licitacion', 'mes_particion', existing_type=sa.Date(), nullable=False)
+    op.create_index('ux_ca_licitacion_codigo_mes', 'ca_licitacion', ['codigo_ca', 'mes_particion'], unique=True)
+
+    if _particionar_solicitado():
+        if dialecto == 'postgresql':
+            convertir_a_particionada(op.get_bind())
+        else:
+            logger.warning(f"particionar=true ignorado: requiere PostgreSQL (dialecto actual: {dialecto}).")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        revertir_a_tabla_plana(op.get_bind())
+    op.drop_index('ux_ca_licitacion_codigo_mes', table_name='ca_licitacion')
+    op.drop_column('ca_licitacion', 'mes_particion')
@@ -0,0 +1,80 @@
+"""lineas de producto y reglas por codigo
+
+Revision ID: 5d0b8e3a71c4
+Revises: c4e1a7d20b96
+Create Date: 2026-10-19 17:48:02.913455
+
+Crea ca_producto (líneas normalizadas de productos_solicitados) y
+ca_producto_regla (puntos por código ONU o prefijo), y llena ca_producto desde
+las fichas ya guardadas. Desde aquí la mantiene EtlRepository al guardar la Fase 2.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.utils.productos import lineas_producto
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0b8e3a71c4'
+down_revision: Union[str, Sequence[str], None] = 'c4e1a7d20b96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TAMANO_LOTE = 1000
+
+
+def _cargar_lineas(tabla_producto: sa.Table):
+    """Recorre ca_licitacion por keyset e inserta las líneas de cada ficha."""
+    conexion = op.get_bind()
+    licitacion = sa.table('ca_licitacion', sa.column('ca_id', sa.Integer()), sa.column('productos_solicitados', sa.JSON()))
+    ultimo_id = 0
+    while True:
+        filas = conexion.execute(
+            sa.select(licitacion.c.ca_id, licitacion.c.productos_solicitados)
+            .where(licitacion.c.ca_id > ultimo_id, licitacion.c.productos_solicitados.isnot(None))
+            .order_by(licitacion.c.ca_id).limit(TAMANO_LOTE)
+        ).all()
+        if not filas:
+            break
+        lineas = [{"ca_id": ca_id, **linea} for ca_id, productos in filas for linea in lineas_producto(productos)]
+        if lineas:
+            op.bulk_insert(tabla_producto, lineas)
+        ultimo_id = filas[-1][0]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tabla_producto = op.create_table(
+        'ca_producto',
+        sa.Column('ca_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('linea', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('codigo_producto', sa.Integer(), nullable=True),
+        sa.Column('nombre_norm', sa.String(), nullable=False),
+        sa.Column('cantidad', sa.Float(), nullable=True),
+        sa.Column('unidad', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('ca_id', 'linea'),
+    )
+    op.create_index(op.f('ix_ca_producto_codigo_producto'), 'ca_producto', ['codigo_producto'], unique=False)
+    op.create_table(
+        'ca_producto_regla',
+        sa.Column('regla_id', sa.Integer(), nullable=False),
+        sa.Column('prefijo', sa.String(length=8), nullable=False),
+        sa.Column('codigo_desde', sa.Integer(), nullable=False),
+        sa.Column('codigo_hasta', sa.Integer(), nullable=False),
+        sa.Column('puntos', sa.Integer(), nullable=False),
+        sa.Column('descripcion', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('regla_id'),
+    )
+    op.create_index(op.f('ix_ca_producto_regla_prefijo'), 'ca_producto_regla', ['prefijo'], unique=True)
+
+    _cargar_lineas(tabla_producto)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ca_producto_regla_prefijo'), table_name='ca_producto_regla')
+    op.drop_table('ca_producto_regla')
+    op.drop_index(op.f('ix_ca_producto_codigo_producto'), table_name='ca_producto')
+    op.drop_table('ca_producto')
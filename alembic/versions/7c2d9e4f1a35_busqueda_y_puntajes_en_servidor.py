@@ -0,0 +1,61 @@
+"""busqueda y puntajes en servidor
+
+Revision ID: 7c2d9e4f1a35
+Revises: 5d0b8e3a71c4
+Create Date: 2026-10-19 19:12:40.518204
+
+Solo PostgreSQL: extensiones pg_trgm y unaccent, funciones de normalización,
+búsqueda de texto completo y masking de puntajes (src/db/ddl_postgres.py), e
+índices trigram / GIN con CREATE INDEX CONCURRENTLY para no bloquear las
+escrituras mientras se construyen. Si el rol no puede crear las extensiones se
+omite todo con una advertencia: la búsqueda usa ILIKE y los puntajes se
+calculan en Python hasta aplicar esta revisión con un rol que pueda.
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+
+from src.db.ddl_postgres import INDICES_TEXTO, crear_funciones, crear_indices_texto
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d9e4f1a35'
+down_revision: Union[str, Sequence[str], None] = '5d0b8e3a71c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+FUNCIONES = [
+    'public.ca_documento_busqueda(text, text, jsonb)',
+    'public.ca_puntaje_masking(text, text[], text[], integer[], text)',
+    'public.ca_texto_productos(jsonb)',
+    'public.ca_normalizar(text)',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conexion = op.get_bind()
+    if conexion.dialect.name != 'postgresql':
+        return
+    try:
+        with conexion.begin_nested():
+            crear_funciones(conexion)
+    except Exception as e:
+        logger.warning(f"Búsqueda y puntajes en servidor omitidos (extensiones o funciones): {e}")
+        return
+    with op.get_context().autocommit_block():
+        crear_indices_texto(conexion, concurrente=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for nombre, _tabla, _definicion in reversed(INDICES_TEXTO):
+        op.execute(f"DROP INDEX IF EXISTS {nombre}")
+    for funcion in FUNCIONES:
+        op.execute(f"DROP FUNCTION IF EXISTS {funcion}")
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS public.es_sin_acentos")
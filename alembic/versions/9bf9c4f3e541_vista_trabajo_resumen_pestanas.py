@@ -0,0 +1,93 @@
+"""vista de trabajo resumen de pestanas
+
+Revision ID: 9bf9c4f3e541
+Revises: 3f942cdb4d5b
+Create Date: 2026-10-19 16:12:40.518203
+
+Crea ca_vista_trabajo (read model de Candidatas, Seguimiento y Ofertadas) y la
+llena desde las tablas vivas. Desde aquí la mantiene VistaTrabajoRepository.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9bf9c4f3e541'
+down_revision: Union[str, Sequence[str], None] = '3f942cdb4d5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mismas reglas que vista_trabajo_repository._select_origen (estados abiertos: 1, 2)
+SQL_CARGA_INICIAL = """
+INSERT INTO ca_vista_trabajo (
+    ca_id, codigo_ca, nombre, estado_ca_texto, puntuacion_final, puntaje_detalle,
+    fecha_publicacion, fecha_cierre, fecha_cierre_segundo_llamado, proveedores_cotizando, monto_clp,
+    organismo_nombre, es_favorito, es_ofertada, tiene_nota, es_candidata
+)
+SELECT l.ca_id, l.codigo_ca, l.nombre, l.estado_ca_texto, coalesce(l.puntuacion_final, 0), l.puntaje_detalle,
+       l.fecha_publicacion, l.fecha_cierre, l.fecha_cierre_segundo_llamado, l.proveedores_cotizando, l.monto_clp,
+       coalesce(o.nombre, 'N/A'), coalesce(s.es_favorito, {falso}), coalesce(s.es_ofertada, {falso}),
+       coalesce(s.notas IS NOT NULL AND trim(s.notas) <> '', {falso}),
+       l.estado_codigo IN (1, 2) AND (s.ca_id IS NULL OR NOT (s.es_favorito OR s.es_ofertada OR s.es_oculta))
+FROM ca_licitacion l
+LEFT JOIN ca_organismo o ON o.organismo_id = l.organismo_id
+LEFT JOIN ca_seguimiento s ON s.ca_id = l.ca_id
+WHERE (l.estado_codigo IN (1, 2) AND (s.ca_id IS NULL OR NOT (s.es_favorito OR s.es_ofertada OR s.es_oculta)))
+   OR s.es_favorito OR s.es_ofertada
+"""
+
+
+def _where(postgres: str, sqlite: str) -> dict:
+    """Predicado del índice parcial con la misma forma que genera el ORM en cada dialecto."""
+    return {"postgresql_where": sa.text(postgres), "sqlite_where": sa.text(sqlite)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ca_vista_trabajo',
+        sa.Column('ca_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('codigo_ca', sa.String(length=50), nullable=False),
+        sa.Column('nombre', sa.String(length=1000), nullable=True),
+        sa.Column('estado_ca_texto', sa.String(length=255), nullable=True),
+        sa.Column('puntuacion_final', sa.Integer(), nullable=False),
+        sa.Column('puntaje_detalle', sa.JSON(), nullable=True),
+        sa.Column('fecha_publicacion', sa.Date(), nullable=True),
+        sa.Column('fecha_cierre', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('fecha_cierre_segundo_llamado', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('proveedores_cotizando', sa.Integer(), nullable=True),
+        sa.Column('monto_clp', sa.Float(), nullable=True),
+        sa.Column('organismo_nombre', sa.String(length=1000), nullable=False),
+        sa.Column('es_favorito', sa.Boolean(), nullable=False),
+        sa.Column('es_ofertada', sa.Boolean(), nullable=False),
+        sa.Column('tiene_nota', sa.Boolean(), nullable=False),
+        sa.Column('es_candidata', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('ca_id'),
+    )
+    op.create_index(op.f('ix_ca_vista_trabajo_codigo_ca'), 'ca_vista_trabajo', ['codigo_ca'], unique=False)
+    op.create_index(
+        'ix_ca_vista_trabajo_candidatas', 'ca_vista_trabajo', [sa.text('puntuacion_final DESC'), 'ca_id'], unique=False,
+        **_where("es_candidata = true", "es_candidata = 1")
+    )
+    op.create_index(
+        'ix_ca_vista_trabajo_seguimiento', 'ca_vista_trabajo', ['fecha_cierre', 'ca_id'], unique=False,
+        **_where("es_favorito = true AND es_ofertada = false", "es_favorito = 1 AND es_ofertada = 0")
+    )
+    op.create_index(
+        'ix_ca_vista_trabajo_ofertadas', 'ca_vista_trabajo', ['fecha_cierre', 'ca_id'], unique=False,
+        **_where("es_ofertada = true", "es_ofertada = 1")
+    )
+
+    falso = "0" if op.get_bind().dialect.name == "sqlite" else "false"
+    op.execute(SQL_CARGA_INICIAL.format(falso=falso))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ca_vista_trabajo_ofertadas', table_name='ca_vista_trabajo')
+    op.drop_index('ix_ca_vista_trabajo_seguimiento', table_name='ca_vista_trabajo')
+    op.drop_index('ix_ca_vista_trabajo_candidatas', table_name='ca_vista_trabajo')
+    op.drop_index(op.f('ix_ca_vista_trabajo_codigo_ca'), table_name='ca_vista_trabajo')
+    op.drop_table('ca_vista_trabajo')
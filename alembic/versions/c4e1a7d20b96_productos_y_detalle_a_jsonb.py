@@ -0,0 +1,55 @@
+"""productos y detalle a jsonb
+
+Revision ID: c4e1a7d20b96
+Revises: 9bf9c4f3e541
+Create Date: 2026-10-19 17:05:11.402318
+
+Solo PostgreSQL: convierte las columnas JSON de ca_licitacion y ca_vista_trabajo
+a JSONB y crea el índice GIN (jsonb_path_ops) sobre productos_solicitados para
+las consultas por contención ('@>'). En SQLite las columnas siguen como JSON.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1a7d20b96'
+down_revision: Union[str, Sequence[str], None] = '9bf9c4f3e541'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNAS = (
+    ('ca_licitacion', 'productos_solicitados'),
+    ('ca_licitacion', 'puntaje_detalle'),
+    ('ca_vista_trabajo', 'puntaje_detalle'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for tabla, columna in COLUMNAS:
+        op.alter_column(
+            tabla, columna, type_=postgresql.JSONB(), existing_type=sa.JSON(),
+            postgresql_using=f'{columna}::jsonb'
+        )
+    op.create_index(
+        'ix_ca_licitacion_productos_gin', 'ca_licitacion', ['productos_solicitados'], unique=False,
+        postgresql_using='gin', postgresql_ops={'productos_solicitados': 'jsonb_path_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_ca_licitacion_productos_gin', table_name='ca_licitacion')
+    for tabla, columna in COLUMNAS:
+        op.alter_column(
+            tabla, columna, type_=sa.JSON(), existing_type=postgresql.JSONB(),
+            postgresql_using=f'{columna}::json'
+        )
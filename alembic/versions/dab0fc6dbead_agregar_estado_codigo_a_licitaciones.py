@@ -0,0 +1,49 @@
+"""agregar estado_codigo a licitaciones
+
+Revision ID: dab0fc6dbead
+Revises: aaa28eab2949
+Create Date: 2026-10-19 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dab0fc6dbead'
+down_revision: Union[str, Sequence[str], None] = 'aaa28eab2949'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mismo criterio que db_models.derivar_estado_codigo (códigos de EstadoCa)
+BACKFILL_ESTADO_CODIGO = """
+UPDATE ca_licitacion SET estado_codigo = CASE
+    WHEN estado_ca_texto IS NULL OR estado_ca_texto = '' THEN 0
+    WHEN lower(estado_ca_texto) LIKE '%vencida%' THEN 8
+    WHEN (lower(estado_ca_texto) LIKE '%publicada%' OR lower(estado_ca_texto) LIKE '%segundo llamado%')
+         AND (lower(estado_ca_texto) LIKE '%segundo%' OR estado_convocatoria = 2) THEN 2
+    WHEN lower(estado_ca_texto) LIKE '%publicada%' THEN 1
+    WHEN lower(estado_ca_texto) LIKE '%oc emitida%' OR lower(estado_ca_texto) LIKE '%orden de compra%' THEN 4
+    WHEN lower(estado_ca_texto) LIKE '%desierta%' THEN 5
+    WHEN lower(estado_ca_texto) LIKE '%adjudicada%' THEN 6
+    WHEN lower(estado_ca_texto) LIKE '%cancelada%' OR lower(estado_ca_texto) LIKE '%revocada%'
+         OR lower(estado_ca_texto) LIKE '%suspendida%' THEN 7
+    WHEN lower(estado_ca_texto) LIKE '%cerrada%' THEN 3
+    ELSE 0
+END
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ca_licitacion', sa.Column('estado_codigo', sa.SmallInteger(), nullable=False, server_default=sa.text('0')))
+    op.execute(BACKFILL_ESTADO_CODIGO)
+    op.create_index(op.f('ix_ca_licitacion_estado_codigo'), 'ca_licitacion', ['estado_codigo'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ca_licitacion_estado_codigo'), table_name='ca_licitacion')
+    op.drop_column('ca_licitacion', 'estado_codigo')
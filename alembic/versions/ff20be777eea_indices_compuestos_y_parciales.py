@@ -0,0 +1,71 @@
+"""indices compuestos y parciales
+
+Revision ID: ff20be777eea
+Revises: dab0fc6dbead
+Create Date: 2026-10-19 11:02:54.118730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ff20be777eea'
+down_revision: Union[str, Sequence[str], None] = 'dab0fc6dbead'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _where(postgres: str, sqlite: str) -> dict:
+    """Predicado del índice parcial con la misma forma que genera el ORM en cada dialecto."""
+    return {"postgresql_where": sa.text(postgres), "sqlite_where": sa.text(sqlite)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # (estado_codigo, fecha_cierre) cubre también las búsquedas solo por estado
+    op.drop_index(op.f('ix_ca_licitacion_estado_codigo'), table_name='ca_licitacion')
+    op.create_index('ix_ca_licitacion_estado_cierre', 'ca_licitacion', ['estado_codigo', 'fecha_cierre'], unique=False)
+
+    # Candidatas: compras abiertas ordenadas por puntaje
+    op.create_index(
+        'ix_ca_licitacion_abiertas_puntaje', 'ca_licitacion', [sa.text('puntuacion_final DESC'), 'ca_id'], unique=False,
+        **_where("estado_codigo IN (1, 2)", "estado_codigo IN (1, 2)")
+    )
+    # Fase 2 automática: sin ficha y sobre el umbral (config.UMBRAL_FASE_2)
+    op.create_index(
+        'ix_ca_licitacion_pendientes_fase_2', 'ca_licitacion', ['fecha_cierre'], unique=False,
+        **_where("descripcion IS NULL AND puntuacion_final >= 10", "descripcion IS NULL AND puntuacion_final >= 10")
+    )
+
+    # Los índices booleanos por columna quedan reemplazados por los parciales
+    for columna in ('es_favorito', 'es_ofertada', 'es_oculta'):
+        op.drop_index(op.f(f'ix_ca_seguimiento_{columna}'), table_name='ca_seguimiento')
+    op.create_index(
+        'ix_ca_seguimiento_marcadas', 'ca_seguimiento', ['ca_id'], unique=False,
+        **_where("es_favorito = true OR es_ofertada = true OR es_oculta = true",
+                 "es_favorito = 1 OR es_ofertada = 1 OR es_oculta = 1")
+    )
+    op.create_index(
+        'ix_ca_seguimiento_favoritas', 'ca_seguimiento', ['ca_id'], unique=False,
+        **_where("es_favorito = true AND es_ofertada = false", "es_favorito = 1 AND es_ofertada = 0")
+    )
+    op.create_index(
+        'ix_ca_seguimiento_ofertadas', 'ca_seguimiento', ['ca_id'], unique=False,
+        **_where("es_ofertada = true", "es_ofertada = 1")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ca_seguimiento_ofertadas', table_name='ca_seguimiento')
+    op.drop_index('ix_ca_seguimiento_favoritas', table_name='ca_seguimiento')
+    op.drop_index('ix_ca_seguimiento_marcadas', table_name='ca_seguimiento')
+    for columna in ('es_favorito', 'es_ofertada', 'es_oculta'):
+        op.create_index(op.f(f'ix_ca_seguimiento_{columna}'), 'ca_seguimiento', [columna], unique=False)
+    op.drop_index('ix_ca_licitacion_pendientes_fase_2', table_name='ca_licitacion')
+    op.drop_index('ix_ca_licitacion_abiertas_puntaje', table_name='ca_licitacion')
+    op.drop_index('ix_ca_licitacion_estado_cierre', table_name='ca_licitacion')
+    op.create_index(op.f('ix_ca_licitacion_estado_codigo'), 'ca_licitacion', ['estado_codigo'], unique=False)
@@ -18,9 +18,21 @@ ruta_env = DIR_BASE / ".env"
 load_dotenv(ruta_env, encoding="utf-8")
 
 # --- Base de Datos ---
+# BASE_LOCAL=true (instalación de un solo puesto): sin DATABASE_URL se usa un
+# archivo SQLite embebido en RUTA_BASE_LOCAL en vez de un servidor PostgreSQL.
+_base_local_env = os.getenv('BASE_LOCAL', 'False').lower()
+BASE_LOCAL = _base_local_env == 'true'
+RUTA_BASE_LOCAL = Path(os.getenv('RUTA_BASE_LOCAL', str(DIR_BASE / "data" / "compra_agil.db")))
 DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL and BASE_LOCAL:
+    RUTA_BASE_LOCAL.parent.mkdir(parents=True, exist_ok=True)
+    DATABASE_URL = f"sqlite:///{RUTA_BASE_LOCAL.as_posix()}"
 if not DATABASE_URL:
     print(f"ADVERTENCIA CRÍTICA: DATABASE_URL no encontrada en {ruta_env}")
+# Réplica para lecturas (listados, búsquedas, exportaciones). Sin ella, en PostgreSQL
+# las lecturas usan un pool aparte de solo lectura sobre DATABASE_URL.
+DATABASE_URL_LECTURA = os.getenv("DATABASE_URL_LECTURA")
+POOL_LECTURA = int(os.getenv('POOL_LECTURA', '5'))
 
 # --- URLs Externas ---
 URL_BASE_WEB = "https://buscador.mercadopublico.cl"
@@ -43,4 +55,50 @@ HEADERS_API = {
 
 # --- Constantes de Negocio ---
 # Puntaje adicional fijo por regla de negocio
-PUNTOS_SEGUNDO_LLAMADO = 5
\ No newline at end of file
+PUNTOS_SEGUNDO_LLAMADO = 5
+
+# Puntaje mínimo para descargar la ficha (Fase 2) automáticamente.
+# Coincide con el WHERE del índice parcial 'ix_ca_licitacion_pendientes_fase_2'.
+UMBRAL_FASE_2 = 10
+
+# --- Mantenimiento ---
+# Días tras el cierre para marcar una compra como 'Vencida Local' y para purgarla
+DIAS_GRACIA_CIERRE = int(os.getenv('DIAS_GRACIA_CIERRE', '14'))
+DIAS_RETENCION = int(os.getenv('DIAS_RETENCION', '30'))
+# Con ca_licitacion particionada: 'true' desacopla (DETACH) las particiones
+# vencidas en vez de eliminarlas, para archivarlas o revisarlas antes del DROP.
+_desacoplar_env = os.getenv('RETENCION_DESACOPLAR_PARTICIONES', 'False').lower()
+RETENCION_DESACOPLAR_PARTICIONES = _desacoplar_env == 'true'
+# Archivo histórico: antes de purgar, las compras se guardan en Parquet (zstd)
+# particionado por mes bajo DIR_ARCHIVO. Requiere 'pyarrow'; sin él se purga sin archivar.
+_archivo_env = os.getenv('ARCHIVO_HISTORICO', 'True').lower()
+ARCHIVO_HISTORICO = _archivo_env == 'true'
+DIR_ARCHIVO = Path(os.getenv('DIR_ARCHIVO', str(DIR_BASE / "data" / "archivo")))
+
+# --- Motor de Puntajes ---
+# Recalcula puntajes dentro de PostgreSQL (funciones + índices trigram) en vez
+# de traer cada licitación a Python. Requiere extensiones pg_trgm y unaccent.
+_motor_sql_env = os.getenv('MOTOR_PUNTAJES_SQL', 'False').lower()
+MOTOR_PUNTAJES_SQL = _motor_sql_env == 'true'
+
+# --- Cola de Escritura (acciones de triage) ---
+# Seguir/ofertar/ocultar/anotar se escriben en segundo plano: ventana en ms para
+# juntar acciones seguidas en un lote y reintentos ante errores transitorios.
+RETARDO_COLA_ESCRITURA_MS = int(os.getenv('RETARDO_COLA_ESCRITURA_MS', '300'))
+REINTENTOS_COLA_ESCRITURA = int(os.getenv('REINTENTOS_COLA_ESCRITURA', '5'))
+
+# --- Instrumentación SQL ---
+# Mide cada sentencia (tiempo, filas, origen) agrupada por operación de DbService
+# o etapa del ETL. Avisa sentencias sobre SQL_LENTA_MS y sentencias repetidas más
+# de SQL_UMBRAL_N_MAS_1 veces en una misma operación (patrón N+1).
+_instrumentacion_env = os.getenv('INSTRUMENTACION_SQL', 'True').lower()
+INSTRUMENTACION_SQL = _instrumentacion_env == 'true'
+SQL_LENTA_MS = int(os.getenv('SQL_LENTA_MS', '500'))
+SQL_UMBRAL_N_MAS_1 = int(os.getenv('SQL_UMBRAL_N_MAS_1', '20'))
+DIR_ESTADISTICAS_SQL = Path(os.getenv('DIR_ESTADISTICAS_SQL', str(DIR_BASE / "data" / "logs")))
+
+# --- Unidad de Trabajo (ETL) ---
+# Las corridas del ETL usan una sola conexión y confirman cada N unidades
+# completadas (llamadas a repositorios o ítems) o cada S segundos.
+TAMANO_TRANSACCION_ETL = int(os.getenv('TAMANO_TRANSACCION_ETL', '50'))
+SEGUNDOS_TRANSACCION_ETL = float(os.getenv('SEGUNDOS_TRANSACCION_ETL', '5'))
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de Escritura Diferida (write-behind) para las acciones de triage.
+
+Seguir, ofertar, ocultar y anotar no esperan a la base: la vista se actualiza
+en memoria y el cambio queda en esta cola. Un hilo propio junta lo encolado
+durante una ventana corta y lo escribe en ca_seguimiento con una transacción
+por lote (ver LicitacionRepository.aplicar_seguimiento).
+
+- Los cambios se fusionan por ca_id: el último valor de cada columna gana.
+- Los valores son absolutos y el upsert solo toca las columnas cambiadas, así
+  que reintentar un lote es idempotente (incluso si el commit alcanzó a llegar).
+- Caídas de conexión, bloqueos, deadlocks y conflictos de serialización se
+  reintentan con espera exponencial; lo encolado mientras tanto se escribe
+  después del lote en curso, sin alterar el orden.
+- Los demás errores, o agotar los reintentos, descartan el lote y se avisan
+  con 'al_fallar' para que la vista recargue el estado real.
+- Las lecturas de la GUI no esperan a la cola: 'superponer' aplica lo aún no
+  confirmado a las filas recién leídas. Solo las tareas en segundo plano que
+  deben ver lo encolado en la base (exportar, importar) usan 'esperar'.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from src.db.repositories.licitacion_repository import LicitacionRepository
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+_SIN_CAMBIO = object()
+
+# Pertenencia a cada pestaña según las marcas efectivas (mismos criterios que los
+# filtros de LicitacionRepository). Candidatas se evalúa solo con lo pendiente:
+# una fila leída de esa pestaña no tenía marcas.
+_EN_VISTA = {
+    "candidatas": lambda m: not (m.get("es_favorito") or m.get("es_ofertada") or m.get("es_oculta")),
+    "seguimiento": lambda m: bool(m.get("es_favorito")) and not m.get("es_ofertada"),
+    "ofertadas": lambda m: bool(m.get("es_ofertada")),
+}
+
+
+def es_reintentable(error: Exception) -> bool:
+    """Errores transitorios: el mismo lote puede volver a intentarse."""
+    return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+class ColaEscrituraDiferida:
+    def __init__(self, aplicar: Callable[[Dict[int, Dict[str, Any]]], List[int]], retardo: float = 0.3,
+                 max_reintentos: int = 5, espera_base: float = 0.5,
+                 al_guardar: Optional[Callable[[List[int]], None]] = None,
+                 al_fallar: Optional[Callable[[List[int], str], None]] = None):
+        """
+        aplicar: escribe {ca_id: {columna: valor}} en una transacción y retorna los ca_id escritos.
+        al_guardar / al_fallar: se llaman desde el hilo de la cola.
+        """
+        self._aplicar = aplicar
+        self.retardo = retardo
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.al_guardar = al_guardar
+        self.al_fallar = al_fallar
+
+        self._pendientes: Dict[int, Dict[str, Any]] = {}
+        self._en_vuelo: Dict[int, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._urgente = False
+        self._cerrada = False
+        self._hilo = threading.Thread(target=self._ejecutar, name="cola-escritura", daemon=True)
+        self._hilo.start()
+
+    # --- API (hilo de la GUI) ---
+
+    def encolar(self, ca_ids: Iterable[int], valores: Dict[str, Any]) -> int:
+        """Agrega el mismo cambio para varias compras. Retorna cuántas se encolaron."""
+        ids = list(dict.fromkeys(ca_ids))
+        if not ids or not valores: return 0
+        with self._cond:
+            if self._cerrada:
+                raise RuntimeError("La cola de escritura está cerrada.")
+            for ca_id in ids:
+                self._pendientes.setdefault(ca_id, {}).update(valores)
+            self._cond.notify_all()
+        return len(ids)
+
+    def marcar(self, ca_ids: Iterable[int], es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None,
+               es_oculta: Optional[bool] = None) -> int:
+        return self.encolar(ca_ids, LicitacionRepository.marcas_seguimiento(es_favorito, es_ofertada, es_oculta))
+
+    def anotar(self, ca_ids: Iterable[int], nota: str) -> int:
+        return self.encolar(ca_ids, {"notas": nota})
+
+    def valor_pendiente(self, ca_id: int, columna: str, defecto: Any = None) -> Any:
+        """Valor aún no confirmado en la base para 'columna' (o 'defecto' si no hay)."""
+        with self._cond:
+            for cambios in (self._pendientes, self._en_vuelo):
+                valor = cambios.get(ca_id, {}).get(columna, _SIN_CAMBIO)
+                if valor is not _SIN_CAMBIO:
+                    return valor
+        return defecto
+
+    def cambios_pendientes(self) -> Dict[int, Dict[str, Any]]:
+        """Copia de lo no confirmado por ca_id (lo encolado después pisa a lo que está en vuelo)."""
+        with self._cond:
+            cambios = {ca_id: dict(valores) for ca_id, valores in self._en_vuelo.items()}
+            for ca_id, valores in self._pendientes.items():
+                cambios.setdefault(ca_id, {}).update(valores)
+        return cambios
+
+    def superponer(self, filas: List[Any], vista: Optional[str] = None) -> List[Any]:
+        """
+        Aplica a filas del listado (con 'ca_id', 'es_favorito', 'es_ofertada',
+        'tiene_nota') los cambios aún no confirmados, sin bloquear. Con 'vista'
+        quita las filas que esos cambios sacan de la pestaña; las que entran
+        aparecen en la lectura siguiente a su confirmación.
+        """
+        cambios = self.cambios_pendientes()
+        if not cambios: return filas
+        en_vista = _EN_VISTA.get(vista)
+        resultado = []
+        for fila in filas:
+            pendiente = cambios.get(fila["ca_id"])
+            if pendiente is None:
+                resultado.append(fila)
+                continue
+            if vista == "candidatas":
+                marcas = pendiente
+            else:
+                marcas = {"es_favorito": fila["es_favorito"], "es_ofertada": fila["es_ofertada"], **pendiente}
+            if en_vista is not None and not en_vista(marcas):
+                continue
+            fila = dict(fila)
+            fila["es_favorito"] = bool(marcas.get("es_favorito", fila["es_favorito"]))
+            fila["es_ofertada"] = bool(marcas.get("es_ofertada", fila["es_ofertada"]))
+            if "notas" in pendiente:
+                fila["tiene_nota"] = bool((pendiente["notas"] or "").strip())
+            resultado.append(fila)
+        return resultado
+
+    def hay_pendientes(self) -> bool:
+        with self._cond:
+            return bool(self._pendientes or self._en_vuelo)
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """
+        Escribe ya lo pendiente (sin esperar la ventana) y bloquea hasta que se
+        confirme. Para lecturas que deben ver lo encolado. False si venció 'timeout'.
+        """
+        with self._cond:
+            if self._pendientes:
+                self._urgente = True
+                self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pendientes and not self._en_vuelo, timeout)
+
+    def cerrar(self, timeout: Optional[float] = None) -> bool:
+        """Deja de aceptar cambios y escribe lo pendiente. False si quedó algo sin confirmar."""
+        with self._cond:
+            self._cerrada = True
+            self._cond.notify_all()
+        self._hilo.join(timeout)
+        return not self._hilo.is_alive()
+
+    # --- Hilo de la cola ---
+
+    def _ejecutar(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pendientes or self._cerrada)
+                if not self._pendientes:
+                    return
+                # Ventana de agrupación: las acciones seguidas viajan en el mismo lote
+                limite = time.monotonic() + self.retardo
+                while not (self._urgente or self._cerrada):
+                    restante = limite - time.monotonic()
+                    if restante <= 0: break
+                    self._cond.wait(restante)
+                self._en_vuelo, self._pendientes = self._pendientes, {}
+                self._urgente = False
+
+            self._guardar(self._en_vuelo)
+
+            with self._cond:
+                self._en_vuelo = {}
+                self._cond.notify_all()
+
+    def _guardar(self, lote: Dict[int, Dict[str, Any]]):
+        intento = 0
+        while True:
+            try:
+                escritos = self._aplicar(lote)
+                break
+            except Exception as e:
+                intento += 1
+                if not es_reintentable(e) or intento > self.max_reintentos:
+                    logger.error(f"Cola de escritura: se descartan {len(lote)} cambios tras {intento} intento(s): {e}")
+                    self._avisar(self.al_fallar, list(lote), str(e))
+                    return
+                espera = self.espera_base * 2 ** (intento - 1)
+                logger.warning(f"Cola de escritura: reintento {intento}/{self.max_reintentos} en {espera:.1f}s ({e})")
+                time.sleep(espera)
+
+        omitidas = len(lote) - len(escritos)
+        if omitidas:
+            logger.info(f"Cola de escritura: {omitidas} compras ya no existen y se omitieron.")
+        self._avisar(self.al_guardar, escritos)
+
+    @staticmethod
+    def _avisar(callback, *args):
+        if callback is None: return
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Cola de escritura: error en aviso: {e}")
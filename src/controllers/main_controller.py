@@ -1,21 +1,27 @@
 # src/controllers/main_controller.py
 import logging
-from src.db.session import SessionLocal
+from src.db.session import sesiones
 from src.db.db_service import DbService
 from src.scraper.scraper_service import ServicioScraper
 from src.logic.score_engine import MotorPuntajes
 from src.logic.etl_service import ServicioEtl
 from src.logic.excel_service import ServicioExcel
 from src.utils.settings_manager import GestorConfiguracion
-from src.controllers.worker import GenericWorker
+from src.controllers.worker import GenericWorker, SenalesEscritura
+from src.controllers.cola_escritura import ColaEscrituraDiferida
+from config.config import RETARDO_COLA_ESCRITURA_MS, REINTENTOS_COLA_ESCRITURA
 
 # Configuración correcta del logger
 logger = logging.getLogger(__name__)
 
+# Segundos que una tarea en segundo plano (o el cierre) espera a que la cola confirme lo encolado
+ESPERA_LECTURA_COLA = 5.0
+
 class MainController:
     def __init__(self):
         # 1. Inicialización de Servicios Backend
-        self.session_factory = SessionLocal
+        # Escrituras al primario; listados y exportaciones a la réplica / pool de lectura
+        self.session_factory = sesiones
         self.db_service = DbService(self.session_factory)
         
         # Servicios de Lógica
@@ -35,6 +41,23 @@ class MainController:
         self._current_worker = None
         self._maintenance_worker = None
 
+        # codigo_ca -> ca_id de las filas ya cargadas en las tablas: las acciones
+        # rápidas no vuelven a consultarlo. Se vacía al terminar tareas que pueden
+        # borrar o reingresar compras (mantenimiento, extracción, importación).
+        self._ca_ids = {}
+
+        # Acciones de triage: la vista se actualiza en memoria y la escritura
+        # va por la cola (hilo propio, lotes, reintentos). La GUI escucha
+        # 'senales_escritura' para saber cuándo se confirmó o falló un lote.
+        self.senales_escritura = SenalesEscritura()
+        self._cola = ColaEscrituraDiferida(
+            self.db_service.aplicar_seguimiento,
+            retardo=RETARDO_COLA_ESCRITURA_MS / 1000,
+            max_reintentos=REINTENTOS_COLA_ESCRITURA,
+            al_guardar=lambda ids: self.senales_escritura.guardado.emit(len(ids)),
+            al_fallar=lambda ids, error: self.senales_escritura.fallo.emit(error),
+        )
+
         # Arrancar mantenimiento
         self._iniciar_mantenimiento_silencioso()
 
@@ -52,78 +75,131 @@ class MainController:
         self._maintenance_worker.finished_success.connect(
             lambda: logger.info("Mantenimiento automático finalizado con éxito.")
         )
+        self._maintenance_worker.finished_success.connect(self._olvidar_ca_ids)
         self._maintenance_worker.finished_error.connect(
             lambda err: logger.error(f"Error en mantenimiento automático: {err}")
         )
         
         self._maintenance_worker.start()
 
+    # --- CACHÉ codigo_ca -> ca_id ---
+
+    def _recordar_ca_ids(self, filas):
+        for fila in filas:
+            self._ca_ids[fila["codigo_ca"]] = fila["ca_id"]
+        return filas
+
+    def _olvidar_ca_ids(self, *_args):
+        self._ca_ids.clear()
+
+    def _resolver_ca_id(self, codigo_ca: str):
+        """ca_id desde la caché; si la fila no se ha cargado, una consulta por la clave."""
+        ca_id = self._ca_ids.get(codigo_ca)
+        if ca_id is None:
+            ca_id = self.db_service.obtener_ca_ids([codigo_ca]).get(codigo_ca)
+            if ca_id is not None:
+                self._ca_ids[codigo_ca] = ca_id
+        return ca_id
+
+    def _resolver_ca_ids(self, codigos) -> list:
+        """ca_id de varias filas: los que faltan en la caché se resuelven en una sola consulta."""
+        faltantes = [c for c in codigos if c not in self._ca_ids]
+        if faltantes:
+            self._ca_ids.update(self.db_service.obtener_ca_ids(faltantes))
+        return [self._ca_ids[c] for c in codigos if c in self._ca_ids]
+
+    def _leer_lo_escrito(self):
+        """
+        Confirma lo encolado para que la lectura siguiente lo vea. Bloquea hasta
+        ESPERA_LECTURA_COLA: llamar solo desde hilos de trabajo, nunca desde la GUI.
+        """
+        if self._cola.hay_pendientes() and not self._cola.esperar(ESPERA_LECTURA_COLA):
+            logger.warning("La cola de escritura sigue con cambios pendientes; la lectura puede no reflejarlos.")
+
+    def hay_escrituras_pendientes(self) -> bool:
+        return self._cola.hay_pendientes()
+
+    def cerrar(self):
+        """Al salir: escribe lo que quede en la cola."""
+        if not self._cola.cerrar(timeout=ESPERA_LECTURA_COLA):
+            logger.error("Se cerró la aplicación con cambios de seguimiento sin confirmar.")
+
     # --- GESTIÓN DE DATOS (TABLAS) ---
     
     def get_data_for_view(self, view_type: str):
-        """Retorna la lista de diccionarios para las tablas."""
+        """
+        Retorna las filas livianas (solo columnas visibles) para las tablas. Lo
+        que sigue en la cola se aplica sobre lo leído en vez de esperar al commit.
+        """
         if view_type == "candidatas":
             min_score = self.settings_manager.obtener_valor("umbral_puntaje_minimo") or 5
-            return self.db_service.exportar_candidatas() 
+            filas = self.db_service.obtener_listado_candidatas(umbral_minimo=min_score)
         elif view_type == "seguimiento":
-            return self.db_service.exportar_seguimiento()
+            filas = self.db_service.obtener_listado_seguimiento()
         elif view_type == "ofertadas":
-            return self.db_service.exportar_ofertadas()
-        return []
+            filas = self.db_service.obtener_listado_ofertadas()
+        else:
+            return []
+        return self._recordar_ca_ids(self._cola.superponer(filas, view_type))
+
+    def get_page_for_view(self, view_type: str, cursor=None):
+        """
+        Una página de la vista (keyset). Retorna {'filas', 'cursor', 'hay_mas'};
+        con cursor=None es la primera y trae además 'total' estimado.
+        """
+        pagina = self.db_service.obtener_pagina_listado(view_type, cursor)
+        pagina["filas"] = self._recordar_ca_ids(self._cola.superponer(pagina["filas"], view_type))
+        if cursor is None:
+            pagina["total"] = self.db_service.estimar_total_listado(view_type)
+        return pagina
+
+    def search_licitaciones(self, texto: str, cursor=None):
+        """Búsqueda en servidor sobre todas las compras, no solo las cargadas en la pestaña."""
+        pagina = self.db_service.buscar_licitaciones(texto, cursor)
+        pagina["filas"] = self._recordar_ca_ids(self._cola.superponer(pagina["filas"]))
+        return pagina
 
     def get_licitacion_detail(self, codigo_ca: str):
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            
-            if lic:
-                # Extraer nota si existe
-                nota_texto = ""
-                if lic.seguimiento and lic.seguimiento.notas:
-                    nota_texto = lic.seguimiento.notas
-
-                return {
-                    "codigo_ca": lic.codigo_ca,
-                    "nombre": lic.nombre,
-                    "descripcion": lic.descripcion,
-                    "organismo_nombre": lic.organismo.nombre if lic.organismo else "N/A",
-                    "estado_ca_texto": lic.estado_ca_texto,
-                    "monto_clp": lic.monto_clp,
-                    "fecha_publicacion": str(lic.fecha_publicacion),
-                    "fecha_cierre": str(lic.fecha_cierre),
-                    "fecha_cierre_p2": str(lic.fecha_cierre_segundo_llamado) if lic.fecha_cierre_segundo_llamado else "No aplica",
-                    "direccion_entrega": lic.direccion_entrega,
-                    "plazo_entrega": lic.plazo_entrega,
-                    "productos_solicitados": lic.productos_solicitados,
-                    "nota_usuario": nota_texto
-                }
-            return None
+        """Campos pesados de la ficha: se consultan recién al abrir el DetailDrawer."""
+        detalle = self.db_service.obtener_detalle_licitacion(codigo_ca)
+        if detalle:
+            detalle["fecha_publicacion"] = str(detalle["fecha_publicacion"])
+            detalle["fecha_cierre"] = str(detalle["fecha_cierre"])
+            f_p2 = detalle.pop("fecha_cierre_segundo_llamado")
+            detalle["fecha_cierre_p2"] = str(f_p2) if f_p2 else "No aplica"
+        return detalle
 
     # --- ACCIONES RÁPIDAS (Context Menu) ---
-    
+    # No tocan la base en el hilo de la GUI: se encolan por ca_id (ya resuelto
+    # en la caché) y la vista aplica el cambio en memoria.
+
+    def _marcar(self, codigo_ca: str, **marcas):
+        ca_id = self._resolver_ca_id(codigo_ca)
+        if ca_id is not None:
+            self._cola.marcar([ca_id], **marcas)
+
     def move_to_ofertar(self, codigo_ca: str):
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            if lic:
-                self.db_service.gestionar_ofertada(lic.ca_id, True)
+        self._marcar(codigo_ca, es_ofertada=True)
 
     def move_to_seguimiento(self, codigo_ca: str):
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            if lic:
-                self.db_service.gestionar_favorito(lic.ca_id, True)
-                self.db_service.gestionar_ofertada(lic.ca_id, False)
+        self._marcar(codigo_ca, es_favorito=True, es_ofertada=False)
 
     def stop_following(self, codigo_ca: str):
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            if lic:
-                self.db_service.gestionar_favorito(lic.ca_id, False)
-                self.db_service.gestionar_ofertada(lic.ca_id, False)
-                self.db_service.ocultar_licitacion(lic.ca_id, True)
+        self._marcar(codigo_ca, es_favorito=False, es_ofertada=False, es_oculta=True)
+
+    # Selección múltiple: viajan en el mismo lote de la cola. Retornan cuántas compras se encolaron.
+
+    def _marcar_varias(self, codigos, **marcas) -> int:
+        return self._cola.marcar(self._resolver_ca_ids(codigos), **marcas)
+
+    def move_to_ofertar_many(self, codigos) -> int:
+        return self._marcar_varias(codigos, es_ofertada=True)
+
+    def move_to_seguimiento_many(self, codigos) -> int:
+        return self._marcar_varias(codigos, es_favorito=True, es_ofertada=False)
+
+    def stop_following_many(self, codigos) -> int:
+        return self._marcar_varias(codigos, es_favorito=False, es_ofertada=False, es_oculta=True)
 
     # --- TAREAS EN SEGUNDO PLANO (Workers) ---
 
@@ -134,6 +210,8 @@ class MainController:
         # GenericWorker siempre inyecta 'callback_texto' y 'callback_porcentaje'.
         # Al poner **kwargs, la función acepta esos argumentos extra y los ignora sin romper.
         def _wrapper_export(tasks, path, **kwargs):
+             # Lo encolado se confirma en el hilo del worker, no en el de la GUI
+             self._leer_lo_escrito()
              return self.excel_service.ejecutar_exportacion_lote(tasks, path)
         
         worker = GenericWorker(_wrapper_export, tasks=export_tasks, path=output_path)
@@ -153,6 +231,7 @@ class MainController:
     def _conectar_worker(self, worker, on_prog, on_fin, on_err):
         worker.progress_text.connect(lambda t: on_prog(t, None))
         worker.progress_value.connect(lambda v: on_prog(None, v))
+        worker.finished_success.connect(self._olvidar_ca_ids)
         worker.finished_success.connect(on_fin)
         worker.finished_error.connect(on_err)
 
@@ -203,28 +282,31 @@ class MainController:
 
     def get_note(self, codigo_ca: str) -> str:
         """Obtiene la nota personal guardada para una licitación."""
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            if lic and lic.seguimiento and lic.seguimiento.notas:
-                return lic.seguimiento.notas
-            return ""
+        ca_id = self._resolver_ca_id(codigo_ca)
+        if ca_id is None: return ""
+        # Una nota aún en la cola es más reciente que la guardada
+        pendiente = self._cola.valor_pendiente(ca_id, "notas")
+        return pendiente if pendiente is not None else self.db_service.obtener_nota_usuario(ca_id)
 
     def save_note(self, codigo_ca: str, nota: str):
-        """Guarda o actualiza la nota del usuario."""
-        with self.session_factory() as session:
-            from src.db.db_models import CaLicitacion
-            lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo_ca).first()
-            if lic:
-                self.db_service.guardar_nota_usuario(lic.ca_id, nota)
+        """Encola la nota del usuario (se guarda en segundo plano)."""
+        ca_id = self._resolver_ca_id(codigo_ca)
+        if ca_id is not None:
+            self._cola.anotar([ca_id], nota)
+
+    def save_note_many(self, codigos, nota: str) -> int:
+        """Misma nota para todas las filas seleccionadas."""
+        return self._cola.anotar(self._resolver_ca_ids(codigos), nota)
     
     def run_manual_import(self, lista_codigos, destino, on_progress, on_finish, on_error):
         """Ejecuta la importación manual en segundo plano."""
         def _wrapper_import(codigos, dest, callback_texto, callback_porcentaje):
+            # La importación también marca seguimiento: lo encolado va primero (ya en el worker)
+            self._leer_lo_escrito()
             return self.etl_service.importar_lista_manual(
                 codigos, dest, callback_texto, callback_porcentaje
             )
-        
+
         worker = GenericWorker(
             _wrapper_import, 
             codigos=lista_codigos, 
@@ -1,5 +1,5 @@
 # src/controllers/worker.py
-from PySide6.QtCore import QThread, Signal
+from PySide6.QtCore import QObject, QThread, Signal
 
 class WorkerSignals(QThread):
     """
@@ -34,4 +34,12 @@ class GenericWorker(WorkerSignals):
             self.finished_success.emit(result)
         except Exception as e:
             # Capturamos cualquier error del backend y lo enviamos a la GUI
-            self.finished_error.emit(str(e))
\ No newline at end of file
+            self.finished_error.emit(str(e))
+
+class SenalesEscritura(QObject):
+    """
+    Avisos de la ColaEscrituraDiferida. La cola corre en su propio hilo: emitir
+    una señal Qt entrega el aviso en el hilo de la GUI.
+    """
+    guardado = Signal(int)   # Compras confirmadas en la base
+    fallo = Signal(str)      # Lote descartado: la vista debe recargar el estado real
@@ -12,4 +12,4 @@ from .db_models import Base, CaLicitacion, CaSeguimiento  # noqa: F401
 from .db_service import DbService  # noqa: F401
 
 # Exporta la 'fábrica de sesiones'
-from .session import SessionLocal, engine  # noqa: F401
+from .session import SessionLocal, engine, sesiones  # noqa: F401
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Archivo Histórico en Parquet.
+
+Las compras que salen de la base por retención se escriben antes en archivos
+Parquet comprimidos con zstd, particionados por mes de publicación:
+
+    <DIR_ARCHIVO>/ca_licitacion/mes=2026-07/parte-<marca>-<id>.parquet
+
+La tabla activa queda chica y el histórico sigue consultable con
+'consultar' / 'resumen_por_mes' (escaneo de pyarrow.dataset con poda por mes).
+'pyarrow' es opcional: sin él 'disponible' es False y la purga no archiva.
+"""
+import datetime
+import json
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.utils.logger import configurar_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = None
+
+logger = configurar_logger(__name__)
+
+COMPRESION = "zstd"
+NIVEL_COMPRESION = 6
+# Columnas JSON de ca_licitacion: se guardan como texto JSON
+COLUMNAS_JSON = ("productos_solicitados", "puntaje_detalle")
+
+
+def _esquema():
+    return pa.schema([
+        ("ca_id", pa.int64()),
+        ("codigo_ca", pa.string()),
+        ("nombre", pa.string()),
+        ("descripcion", pa.string()),
+        ("monto_clp", pa.float64()),
+        ("fecha_publicacion", pa.date32()),
+        ("fecha_cierre", pa.timestamp("us", tz="UTC")),
+        ("fecha_cierre_segundo_llamado", pa.timestamp("us", tz="UTC")),
+        ("plazo_entrega", pa.int32()),
+        ("estado_ca_texto", pa.string()),
+        ("estado_convocatoria", pa.int32()),
+        ("estado_codigo", pa.int16()),
+        ("proveedores_cotizando", pa.int32()),
+        ("direccion_entrega", pa.string()),
+        ("productos_solicitados", pa.string()),
+        ("puntuacion_final", pa.int32()),
+        ("puntaje_detalle", pa.string()),
+        ("organismo_nombre", pa.string()),
+        ("archivado_en", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def _mes_de(fila: Dict[str, Any]) -> str:
+    fecha = fila.get("fecha_publicacion") or fila.get("fecha_cierre") or datetime.date.today()
+    return f"{fecha:%Y-%m}"
+
+
+class ArchivoHistorico:
+    """Escritura y consulta del archivo Parquet de compras purgadas."""
+
+    # Columnas de ca_licitacion que se archivan (además de 'organismo_nombre')
+    COLUMNAS_ORIGEN = (
+        "ca_id", "codigo_ca", "nombre", "descripcion", "monto_clp", "fecha_publicacion", "fecha_cierre",
+        "fecha_cierre_segundo_llamado", "plazo_entrega", "estado_ca_texto", "estado_convocatoria",
+        "estado_codigo", "proveedores_cotizando", "direccion_entrega", "productos_solicitados",
+        "puntuacion_final", "puntaje_detalle",
+    )
+
+    def __init__(self, dir_base: Path):
+        self.dir_tabla = Path(dir_base) / "ca_licitacion"
+
+    @staticmethod
+    def disponible() -> bool:
+        return pa is not None
+
+    def archivar(self, filas: Iterable[Dict[str, Any]]) -> List[Path]:
+        """
+        Escribe las filas (dicts con las columnas del esquema) en un archivo nuevo
+        por mes. Retorna las rutas creadas para poder eliminarlas si la transacción
+        de borrado posterior falla.
+        """
+        por_mes: Dict[str, List[Dict[str, Any]]] = {}
+        for fila in filas:
+            por_mes.setdefault(_mes_de(fila), []).append(fila)
+        if not por_mes: return []
+
+        esquema = _esquema()
+        archivado_en = datetime.datetime.now(datetime.timezone.utc)
+        marca = archivado_en.strftime("%Y%m%dT%H%M%S")
+        rutas = []
+        try:
+            for mes, grupo in sorted(por_mes.items()):
+                columnas = {}
+                for campo in esquema.names:
+                    if campo == "archivado_en":
+                        columnas[campo] = [archivado_en] * len(grupo)
+                    elif campo in COLUMNAS_JSON:
+                        columnas[campo] = [
+                            None if f.get(campo) is None else json.dumps(f[campo], ensure_ascii=False, default=str)
+                            for f in grupo
+                        ]
+                    else:
+                        columnas[campo] = [f.get(campo) for f in grupo]
+                tabla = pa.Table.from_pydict(columnas, schema=esquema)
+
+                directorio = self.dir_tabla / f"mes={mes}"
+                directorio.mkdir(parents=True, exist_ok=True)
+                ruta = directorio / f"parte-{marca}-{uuid.uuid4().hex[:8]}.parquet"
+                pq.write_table(tabla, ruta, compression=COMPRESION, compression_level=NIVEL_COMPRESION)
+                rutas.append(ruta)
+        except Exception:
+            self.descartar(rutas)
+            raise
+        return rutas
+
+    @staticmethod
+    def descartar(rutas: Iterable[Path]):
+        """Elimina archivos recién escritos (rollback del archivado)."""
+        for ruta in rutas:
+            try:
+                Path(ruta).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar el archivo {ruta}: {e}")
+
+    def _dataset(self):
+        if not self.dir_tabla.exists(): return None
+        particionado = ds.partitioning(pa.schema([("mes", pa.string())]), flavor="hive")
+        return ds.dataset(self.dir_tabla, format="parquet", schema=_esquema().append(pa.field("mes", pa.string())),
+                          partitioning=particionado)
+
+    def consultar(self, desde: Optional[datetime.date] = None, hasta: Optional[datetime.date] = None,
+                  texto: Optional[str] = None, codigo_ca: Optional[str] = None,
+                  columnas: Optional[List[str]] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Busca en el histórico. 'desde'/'hasta' filtran por mes de publicación
+        (solo se leen los directorios de esos meses); 'texto' busca en el nombre
+        sin distinguir mayúsculas.
+        """
+        dataset = self._dataset()
+        if dataset is None: return []
+
+        filtro = None
+        condiciones = []
+        if desde: condiciones.append(ds.field("mes") >= f"{desde:%Y-%m}")
+        if hasta: condiciones.append(ds.field("mes") <= f"{hasta:%Y-%m}")
+        if codigo_ca: condiciones.append(ds.field("codigo_ca") == codigo_ca)
+        if texto: condiciones.append(pc.match_substring(ds.field("nombre"), texto, ignore_case=True))
+        for condicion in condiciones:
+            filtro = condicion if filtro is None else filtro & condicion
+
+        if limite:
+            tabla = dataset.head(limite, columns=columnas, filter=filtro)
+        else:
+            tabla = dataset.to_table(columns=columnas, filter=filtro)
+        filas = tabla.to_pylist()
+        for fila in filas:
+            for campo in COLUMNAS_JSON:
+                if fila.get(campo) is not None:
+                    fila[campo] = json.loads(fila[campo])
+        return filas
+
+    def resumen_por_mes(self) -> List[Dict[str, Any]]:
+        """Cantidad de compras archivadas por mes, ordenado cronológicamente."""
+        dataset = self._dataset()
+        if dataset is None: return []
+        conteo = dataset.to_table(columns=["mes", "codigo_ca"]).group_by("mes").aggregate([("codigo_ca", "count")])
+        return sorted(
+            ({"mes": f["mes"], "compras": f["codigo_ca_count"]} for f in conteo.to_pylist()),
+            key=lambda f: f["mes"],
+        )
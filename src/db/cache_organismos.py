@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de Organismos (nombre -> organismo_id).
+
+Cada upsert del listado necesita el organismo_id de sus compras, y la
+importación manual hace un upsert por código. Los organismos casi no cambian:
+se leen una vez (precarga al iniciar) y luego se resuelven en memoria. Un
+nombre desconocido se crea con un solo INSERT ... ON CONFLICT DO NOTHING
+RETURNING; solo si otro proceso lo creó al mismo tiempo hace falta un SELECT.
+
+Los ids creados en una transacción se publican recién en su commit y se
+descartan en su rollback, así la caché nunca apunta a filas que no existen.
+Dentro de una unidad de trabajo el commit de la sesión es un SAVEPOINT: la
+publicación espera al commit del lote.
+"""
+import threading
+from typing import Dict, Iterable
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+
+from src.db.db_models import CaOrganismo, CaSector
+from src.db.dialecto import insert_upsert
+from src.db.unidad_trabajo import CLAVE_UNIDAD
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Crea el sector 'General' si la tabla está vacía (organismos nuevos necesitan uno)
+SQL_SECTOR_POR_DEFECTO = """
+INSERT INTO ca_sector (nombre)
+SELECT 'General' WHERE NOT EXISTS (SELECT 1 FROM ca_sector)
+ON CONFLICT (nombre) DO NOTHING
+"""
+# Clave en session.info de las cachés que ya escuchan commit/rollback de la sesión
+_CLAVE_EVENTOS = "cache_organismos_eventos"
+
+
+class CacheOrganismos:
+    """Mapa nombre -> organismo_id compartido por los hilos del proceso."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._cargada = False
+        self._lock = threading.Lock()
+        # Clave en session.info de los ids creados por esta caché y aún sin commit
+        self._clave = f"cache_organismos_pendientes_{id(self)}"
+
+    def precargar(self, session: Session) -> int:
+        """Lee todos los organismos (una consulta). Retorna cuántos quedaron en caché."""
+        filas = dict(session.execute(select(CaOrganismo.nombre, CaOrganismo.organismo_id)).all())
+        # Lo creado por esta misma transacción aún puede revertirse
+        for nombre in session.info.get(self._clave, {}):
+            filas.pop(nombre, None)
+        with self._lock:
+            self._ids = filas
+            self._cargada = True
+        logger.info(f"Caché de organismos precargada: {len(filas)} organismos.")
+        return len(filas)
+
+    def invalidar(self):
+        """Vacía la caché; la próxima resolución vuelve a leer la tabla."""
+        with self._lock:
+            self._ids = {}
+            self._cargada = False
+
+    def resolver(self, session: Session, nombres: Iterable[str]) -> Dict[str, int]:
+        """
+        organismo_id de cada nombre (sin espacios en los extremos), creando los
+        que falten dentro de la transacción de 'session'.
+        """
+        nombres_norm = {n.strip() for n in nombres if n and n.strip()}
+        if not nombres_norm: return {}
+        if not self._cargada:
+            self.precargar(session)
+
+        pendientes: Dict[str, int] = session.info.get(self._clave, {})
+        with self._lock:
+            resueltos = {n: self._ids[n] for n in nombres_norm if n in self._ids}
+        resueltos.update({n: pendientes[n] for n in nombres_norm - resueltos.keys() if n in pendientes})
+
+        faltantes = nombres_norm - resueltos.keys()
+        if faltantes:
+            nuevos = self._crear(session, faltantes)
+            self._registrar_pendientes(session, nuevos)
+            resueltos.update(nuevos)
+        return resueltos
+
+    def _crear(self, session: Session, nombres: set) -> Dict[str, int]:
+        session.execute(text(SQL_SECTOR_POR_DEFECTO))
+        sector_id = select(func.min(CaSector.sector_id)).scalar_subquery()
+        stmt = insert_upsert(session, CaOrganismo.__table__).values(
+            [{"nombre": n, "sector_id": sector_id, "es_nuevo": True} for n in sorted(nombres)]
+        ).on_conflict_do_nothing(index_elements=["nombre"]).returning(
+            CaOrganismo.__table__.c.nombre, CaOrganismo.__table__.c.organismo_id
+        )
+        nuevos = dict(session.execute(stmt).all())
+
+        # En conflicto (creado por otro proceso o por la carga vía COPY) RETURNING no trae la fila
+        ajenos = nombres - nuevos.keys()
+        if ajenos:
+            nuevos.update(session.execute(
+                select(CaOrganismo.nombre, CaOrganismo.organismo_id).where(CaOrganismo.nombre.in_(ajenos))
+            ).all())
+        return nuevos
+
+    def _registrar_pendientes(self, session: Session, nuevos: Dict[str, int]):
+        registradas = session.info.setdefault(_CLAVE_EVENTOS, set())
+        if id(self) not in registradas:
+            registradas.add(id(self))
+            event.listen(session, "after_commit", self._publicar)
+            event.listen(session, "after_rollback", self._descartar)
+        session.info.setdefault(self._clave, {}).update(nuevos)
+
+    def _publicar(self, session: Session):
+        nuevos = session.info.pop(self._clave, None)
+        if not nuevos: return
+        unidad = session.info.get(CLAVE_UNIDAD)
+        if unidad is not None:
+            # En una unidad de trabajo este commit solo libera un SAVEPOINT
+            unidad.al_confirmar(lambda: self._agregar(nuevos))
+        else:
+            self._agregar(nuevos)
+
+    def _agregar(self, nuevos: Dict[str, int]):
+        with self._lock:
+            self._ids.update(nuevos)
+
+    def _descartar(self, session: Session):
+        session.info.pop(self._clave, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids)
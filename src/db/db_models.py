@@ -8,19 +8,31 @@ el sistema declarativo moderno de SQLAlchemy.
 
 import datetime
 import enum  
+import unicodedata
 from typing import Optional, List, Dict, Any
 
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, validates
 from sqlalchemy import (
-    String, Integer, Float, Boolean, DateTime, JSON, ForeignKey, Enum, Text
+    String, Integer, SmallInteger, Float, Boolean, Date, DateTime, JSON, ForeignKey, Enum, Text,
+    Index, bindparam, or_, and_
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from config.config import UMBRAL_FASE_2
+
+# Ninguna relación se carga sola: cada consulta declara lo que necesita con un
+# perfil de src/db/perfiles_carga.py. Un acceso no previsto que requiera SQL
+# lanza InvalidRequestError (N+1 y joins de más se ven en las pruebas).
+CARGA_POR_DEFECTO = "raise_on_sql"
+
+# JSON en SQLite; JSONB en PostgreSQL (binario, sin re-parseo al leer e indexable con GIN)
+JSON_DOC = JSON().with_variant(JSONB(), "postgresql")
 
 class Base(DeclarativeBase):
     """Clase base para todos los modelos, define el mapeo de tipos JSON."""
     type_annotation_map = {
-        Dict[str, Any]: JSON,
-        List[Dict[str, Any]]: JSON,
-        List[str]: JSON,  
+        Dict[str, Any]: JSON_DOC,
+        List[Dict[str, Any]]: JSON_DOC,
+        List[str]: JSON_DOC,  
     }
 
 # --- Tablas de Jerarquía (Organización) ---
@@ -33,7 +45,10 @@ class CaSector(Base):
     nombre: Mapped[str] = mapped_column(String(255), unique=True, index=True)
     
     # Relaciones
-    organismos: Mapped[List["CaOrganismo"]] = relationship(back_populates="sector")
+    # passive_deletes: al borrar un sector sus organismos ya fueron reasignados (no se cargan)
+    organismos: Mapped[List["CaOrganismo"]] = relationship(
+        back_populates="sector", lazy=CARGA_POR_DEFECTO, passive_deletes=True
+    )
 
 class CaOrganismo(Base):
     """Representa una entidad pública que publica licitaciones."""
@@ -45,8 +60,101 @@ class CaOrganismo(Base):
     es_nuevo: Mapped[bool] = mapped_column(Boolean, default=True)
     
     # Relaciones
-    sector: Mapped["CaSector"] = relationship(back_populates="organismos", lazy="joined")
-    licitaciones: Mapped[List["CaLicitacion"]] = relationship(back_populates="organismo")
+    sector: Mapped["CaSector"] = relationship(back_populates="organismos", lazy=CARGA_POR_DEFECTO)
+    licitaciones: Mapped[List["CaLicitacion"]] = relationship(back_populates="organismo", lazy=CARGA_POR_DEFECTO)
+
+# --- Estados Normalizados ---
+
+class EstadoCa(enum.IntEnum):
+    """
+    Código numérico del estado de una compra, derivado de 'estado_ca_texto' y
+    'estado_convocatoria'. Se persiste como SMALLINT indexado para que los
+    filtros por estado no dependan de comparaciones de texto (ILIKE).
+    """
+    DESCONOCIDO = 0
+    PUBLICADA = 1
+    SEGUNDO_LLAMADO = 2
+    CERRADA = 3
+    OC_EMITIDA = 4
+    DESIERTA = 5
+    ADJUDICADA = 6
+    CANCELADA = 7
+    VENCIDA_LOCAL = 8
+
+# Estados en los que la compra sigue recibiendo cotizaciones
+ESTADOS_ABIERTOS = (EstadoCa.PUBLICADA.value, EstadoCa.SEGUNDO_LLAMADO.value)
+
+# Texto que el ETL asigna al cerrar localmente una compra vencida
+TEXTO_VENCIDA_LOCAL = "Cerrada (Vencida Local)"
+
+def derivar_estado_codigo(estado_texto: Optional[str], estado_convocatoria: Optional[int] = None) -> int:
+    """Traduce el texto de estado de Mercado Público a un código EstadoCa."""
+    if not estado_texto:
+        return EstadoCa.DESCONOCIDO
+    texto = ''.join(c for c in unicodedata.normalize('NFD', estado_texto.lower()) if unicodedata.category(c) != 'Mn')
+
+    if "vencida" in texto:
+        return EstadoCa.VENCIDA_LOCAL
+    if "publicada" in texto or "segundo llamado" in texto:
+        if "segundo" in texto or estado_convocatoria == 2:
+            return EstadoCa.SEGUNDO_LLAMADO
+        return EstadoCa.PUBLICADA
+    if "oc emitida" in texto or "orden de compra" in texto:
+        return EstadoCa.OC_EMITIDA
+    if "desierta" in texto:
+        return EstadoCa.DESIERTA
+    if "adjudicada" in texto:
+        return EstadoCa.ADJUDICADA
+    if "cancelada" in texto or "revocada" in texto or "suspendida" in texto:
+        return EstadoCa.CANCELADA
+    if "cerrada" in texto:
+        return EstadoCa.CERRADA
+    return EstadoCa.DESCONOCIDO
+
+# --- Clave de Partición ---
+
+# Mes ficticio de la partición fija: ahí se mueven las filas que la retención no
+# puede borrar al retirar la partición de su mes (favoritas, ofertadas, abiertas)
+# y ahí nacen las compras sin fecha de publicación, cuyo mes no es estable.
+MES_FIJADO = datetime.date(1900, 1, 1)
+
+def fecha_hora_de(valor) -> Optional[datetime.datetime]:
+    """datetime desde el texto ISO de la API (o un date/datetime ya convertido); None si no se entiende."""
+    if valor is None or isinstance(valor, datetime.datetime):
+        return valor
+    if isinstance(valor, datetime.date):
+        return datetime.datetime.combine(valor, datetime.time())
+    texto = str(valor).strip()
+    try:
+        return datetime.datetime.fromisoformat(texto)
+    except ValueError:
+        pass
+    try:
+        # Sufijos que fromisoformat no acepta: se conserva al menos el día
+        return datetime.datetime.combine(datetime.date.fromisoformat(texto[:10]), datetime.time())
+    except ValueError:
+        return None
+
+def fecha_de(valor) -> Optional[datetime.date]:
+    """date desde el texto ISO de la API (o un date/datetime); None si no se entiende."""
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if valor is None or isinstance(valor, datetime.date):
+        return valor
+    fecha_hora = fecha_hora_de(valor)
+    return fecha_hora.date() if fecha_hora else None
+
+def mes_particion_de(fecha_publicacion) -> datetime.date:
+    """
+    Primer día del mes de publicación (MES_FIJADO si no se conoce: el mes en
+    curso cambiaría la clave de la fila en el próximo barrido).
+    Acepta date/datetime o el texto ISO que entrega la API del listado.
+    """
+    fecha = fecha_de(fecha_publicacion)
+    return datetime.date(fecha.year, fecha.month, 1) if fecha else MES_FIJADO
+
+def _mes_particion_por_defecto(contexto) -> datetime.date:
+    return mes_particion_de(contexto.get_current_parameters().get("fecha_publicacion"))
 
 # --- Tablas de Negocio (Licitaciones) ---
 
@@ -67,6 +175,9 @@ class CaLicitacion(Base):
     
     # Fechas y Plazos
     fecha_publicacion: Mapped[Optional[datetime.date]] = mapped_column()
+    # Clave de partición (mes de publicación). Existe siempre; solo particiona la
+    # tabla si la migración se corrió con '-x particionar=true' (PostgreSQL).
+    mes_particion: Mapped[datetime.date] = mapped_column(Date, default=_mes_particion_por_defecto, nullable=False)
     fecha_cierre: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True))
     fecha_cierre_segundo_llamado: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     plazo_entrega: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -74,22 +185,41 @@ class CaLicitacion(Base):
     # Estados
     estado_ca_texto: Mapped[Optional[str]] = mapped_column(String(255))
     estado_convocatoria: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Código derivado (EstadoCa). Se sincroniza solo vía ORM; las sentencias Core lo calculan explícitamente.
+    estado_codigo: Mapped[int] = mapped_column(SmallInteger, default=EstadoCa.DESCONOCIDO, server_default="0", nullable=False)
     proveedores_cotizando: Mapped[Optional[int]] = mapped_column(Integer)
     
     # Datos Detallados (Fase 2)
     direccion_entrega: Mapped[Optional[str]] = mapped_column(String(1000))
-    productos_solicitados: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(JSON, nullable=True)
+    productos_solicitados: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(JSON_DOC, nullable=True)
+    # Huella de la última ficha guardada (src/utils/huellas.py); evita reescribir fichas idénticas
+    huella_ficha: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     
     # Motor de Puntuación
     puntuacion_final: Mapped[int] = mapped_column(Integer, default=0, index=True)
-    puntaje_detalle: Mapped[Optional[List[str]]] = mapped_column(JSON, nullable=True)
+    puntaje_detalle: Mapped[Optional[List[str]]] = mapped_column(JSON_DOC, nullable=True)
     
     # Claves Foráneas y Relaciones
     organismo_id: Mapped[Optional[int]] = mapped_column(ForeignKey("ca_organismo.organismo_id"))
-    organismo: Mapped[Optional["CaOrganismo"]] = relationship(back_populates="licitaciones", lazy="joined")
+    organismo: Mapped[Optional["CaOrganismo"]] = relationship(back_populates="licitaciones", lazy=CARGA_POR_DEFECTO)
     
-    # Relación 1 a 1 con Seguimiento 
-    seguimiento: Mapped["CaSeguimiento"] = relationship(back_populates="licitacion", cascade="all, delete-orphan", lazy="joined")
+    # Relación 1 a 1 con Seguimiento (ON DELETE CASCADE en la FK: borrar no necesita cargarlo)
+    seguimiento: Mapped["CaSeguimiento"] = relationship(
+        back_populates="licitacion", cascade="all, delete-orphan", lazy=CARGA_POR_DEFECTO, passive_deletes=True
+    )
+
+    @validates("estado_ca_texto", "estado_convocatoria")
+    def _sincronizar_estado_codigo(self, clave, valor):
+        texto = valor if clave == "estado_ca_texto" else self.estado_ca_texto
+        convocatoria = valor if clave == "estado_convocatoria" else self.estado_convocatoria
+        self.estado_codigo = int(derivar_estado_codigo(texto, convocatoria))
+        return valor
+
+    @validates("fecha_publicacion")
+    def _sincronizar_mes_particion(self, clave, valor):
+        if self.mes_particion != MES_FIJADO:
+            self.mes_particion = mes_particion_de(valor)
+        return valor
 
 class CaSeguimiento(Base):
     """
@@ -100,12 +230,139 @@ class CaSeguimiento(Base):
     
     ca_id: Mapped[int] = mapped_column(ForeignKey("ca_licitacion.ca_id", ondelete="CASCADE"), primary_key=True)
     
-    es_favorito: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
-    es_ofertada: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
-    es_oculta: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
+    # Sin índices por columna: los índices parciales de más abajo cubren cada vista
+    es_favorito: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    es_ofertada: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    es_oculta: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     notas: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
-    licitacion: Mapped["CaLicitacion"] = relationship(back_populates="seguimiento")
+    licitacion: Mapped["CaLicitacion"] = relationship(back_populates="seguimiento", lazy=CARGA_POR_DEFECTO)
+
+# --- Filtros compartidos con los índices parciales ---
+# Los índices parciales solo se usan si el planner puede deducir su WHERE desde
+# la consulta, por eso los repositorios reutilizan estas mismas expresiones y
+# envían los valores como literales (literal_execute) en vez de parámetros.
+
+def filtro_estado_abierto():
+    """Compras que siguen abiertas (Publicada / Segundo llamado)."""
+    return CaLicitacion.estado_codigo.in_(
+        bindparam("estados_abiertos", list(ESTADOS_ABIERTOS), expanding=True, literal_execute=True, unique=True)
+    )
+
+def filtro_pendiente_fase_2(umbral: int = UMBRAL_FASE_2):
+    """Compras puntuadas sin ficha descargada."""
+    return and_(
+        CaLicitacion.descripcion.is_(None),
+        CaLicitacion.puntuacion_final >= bindparam("umbral_fase_2", umbral, literal_execute=True, unique=True),
+    )
+
+def filtro_seguimiento_marcado():
+    """Compras con cualquier marca del usuario (se excluyen de candidatas)."""
+    return or_(CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == True, CaSeguimiento.es_oculta == True)
+
+def filtro_seguimiento_favorito():
+    return and_(CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == False)
+
+def filtro_seguimiento_ofertado():
+    return CaSeguimiento.es_ofertada == True
+
+def _indice_parcial(nombre: str, *columnas, where) -> Index:
+    return Index(nombre, *columnas, postgresql_where=where, sqlite_where=where)
+
+# Índices compuestos / parciales ajustados a las consultas de los repositorios
+_indice_parcial(
+    "ix_ca_licitacion_abiertas_puntaje",
+    CaLicitacion.puntuacion_final.desc(), CaLicitacion.ca_id,
+    where=CaLicitacion.estado_codigo.in_(ESTADOS_ABIERTOS),
+)
+_indice_parcial(
+    "ix_ca_licitacion_pendientes_fase_2",
+    CaLicitacion.fecha_cierre,
+    where=and_(CaLicitacion.descripcion.is_(None), CaLicitacion.puntuacion_final >= UMBRAL_FASE_2),
+)
+Index("ix_ca_licitacion_estado_cierre", CaLicitacion.estado_codigo, CaLicitacion.fecha_cierre)
+# Contención JSONB (productos_solicitados @> '[{"codigo_producto": ...}]'); solo PostgreSQL
+Index(
+    "ix_ca_licitacion_productos_gin", CaLicitacion.productos_solicitados,
+    postgresql_using="gin", postgresql_ops={"productos_solicitados": "jsonb_path_ops"},
+).ddl_if(dialect="postgresql")
+# Destino del ON CONFLICT del ETL: en la tabla particionada la unicidad debe incluir la clave de partición
+Index("ux_ca_licitacion_codigo_mes", CaLicitacion.codigo_ca, CaLicitacion.mes_particion, unique=True)
+_indice_parcial("ix_ca_seguimiento_marcadas", CaSeguimiento.ca_id, where=filtro_seguimiento_marcado())
+_indice_parcial("ix_ca_seguimiento_favoritas", CaSeguimiento.ca_id, where=filtro_seguimiento_favorito())
+_indice_parcial("ix_ca_seguimiento_ofertadas", CaSeguimiento.ca_id, where=filtro_seguimiento_ofertado())
+
+# --- Read Model de las Pestañas de Trabajo ---
+
+class CaVistaTrabajo(Base):
+    """
+    Tabla resumen de las pestañas Candidatas, Seguimiento y Ofertadas: una fila por
+    compra visible en alguna de ellas, con las columnas del listado ya resueltas
+    (organismo, marcas, nota). La mantiene VistaTrabajoRepository dentro de las
+    mismas transacciones que escriben ca_licitacion y ca_seguimiento.
+    """
+    __tablename__ = "ca_vista_trabajo"
+
+    # Sin FK: ca_licitacion puede estar particionada
+    ca_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    codigo_ca: Mapped[str] = mapped_column(String(50), index=True)
+    nombre: Mapped[Optional[str]] = mapped_column(String(1000))
+    estado_ca_texto: Mapped[Optional[str]] = mapped_column(String(255))
+    puntuacion_final: Mapped[int] = mapped_column(Integer, default=0)
+    puntaje_detalle: Mapped[Optional[List[str]]] = mapped_column(JSON_DOC, nullable=True)
+    fecha_publicacion: Mapped[Optional[datetime.date]] = mapped_column()
+    fecha_cierre: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True))
+    fecha_cierre_segundo_llamado: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    proveedores_cotizando: Mapped[Optional[int]] = mapped_column(Integer)
+    monto_clp: Mapped[Optional[float]] = mapped_column(Float)
+    organismo_nombre: Mapped[str] = mapped_column(String(1000), default="N/A")
+    es_favorito: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    es_ofertada: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    tiene_nota: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # Abierta y sin marcas del usuario; el umbral de puntaje se aplica al leer
+    es_candidata: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+def filtro_vista_candidata():
+    return CaVistaTrabajo.es_candidata == True
+
+def filtro_vista_seguimiento():
+    return and_(CaVistaTrabajo.es_favorito == True, CaVistaTrabajo.es_ofertada == False)
+
+def filtro_vista_ofertada():
+    return CaVistaTrabajo.es_ofertada == True
+
+# Cada pestaña es un recorrido de su índice parcial, ya en el orden de la vista
+_indice_parcial(
+    "ix_ca_vista_trabajo_candidatas", CaVistaTrabajo.puntuacion_final.desc(), CaVistaTrabajo.ca_id,
+    where=filtro_vista_candidata(),
+)
+_indice_parcial(
+    "ix_ca_vista_trabajo_seguimiento", CaVistaTrabajo.fecha_cierre, CaVistaTrabajo.ca_id,
+    where=filtro_vista_seguimiento(),
+)
+_indice_parcial(
+    "ix_ca_vista_trabajo_ofertadas", CaVistaTrabajo.fecha_cierre, CaVistaTrabajo.ca_id,
+    where=filtro_vista_ofertada(),
+)
+
+# --- Líneas de Producto (Fase 2) ---
+
+class CaProducto(Base):
+    """
+    Una línea de 'productos_solicitados' de la ficha, normalizada al guardar la
+    Fase 2 (ver src/utils/productos.py). Permite puntuar y consultar por código
+    de producto con un índice entero en vez de recorrer el JSON. Sin FK a
+    ca_licitacion: particionada, su clave única incluye mes_particion.
+    """
+    __tablename__ = "ca_producto"
+
+    ca_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    linea: Mapped[int] = mapped_column(SmallInteger, primary_key=True, autoincrement=False)
+    codigo_producto: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    # "nombre descripcion" normalizado: el texto que evalúa el masking de productos
+    nombre_norm: Mapped[str] = mapped_column(String, default="", nullable=False)
+    cantidad: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    unidad: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
 
 # --- Tablas de Configuración (Reglas de Negocio) ---
 
@@ -148,4 +405,22 @@ class CaOrganismoRegla(Base):
     tipo: Mapped[TipoReglaOrganismo] = mapped_column(Enum(TipoReglaOrganismo, name='tipo_regla_organismo_enum', native_enum=False), nullable=False, index=True)
     puntos: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     
-    organismo: Mapped["CaOrganismo"] = relationship(lazy="joined")
\ No newline at end of file
+    organismo: Mapped["CaOrganismo"] = relationship(lazy=CARGA_POR_DEFECTO)
+
+class CaProductoRegla(Base):
+    """
+    Puntos por código de producto ONU (UNSPSC): código exacto de 8 dígitos o
+    prefijo (segmento, familia, clase). 'codigo_desde'/'codigo_hasta' guardan el
+    rango del prefijo para cruzarlo con ca_producto.codigo_producto por índice.
+    """
+    __tablename__ = "ca_producto_regla"
+
+    regla_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    prefijo: Mapped[str] = mapped_column(String(8), unique=True, index=True)
+    codigo_desde: Mapped[int] = mapped_column(Integer, nullable=False)
+    codigo_hasta: Mapped[int] = mapped_column(Integer, nullable=False)
+    puntos: Mapped[int] = mapped_column(Integer, default=0)
+    descripcion: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
+    def __repr__(self):
+        return f"<CaProductoRegla('{self.prefijo}', {self.puntos})>"
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
-from typing import List, Dict, Tuple, Optional
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, List, Dict, Tuple, Optional, Set
 from sqlalchemy.orm import sessionmaker, Session
 from src.db.db_models import CaLicitacion
+from config.config import (
+    UMBRAL_FASE_2, DIAS_GRACIA_CIERRE, DIAS_RETENCION, ARCHIVO_HISTORICO, DIR_ARCHIVO, DIR_ESTADISTICAS_SQL
+)
 from src.utils.logger import configurar_logger
 
 # Importamos los nuevos repositorios
@@ -9,9 +15,17 @@ from src.db.repositories.keyword_repository import KeywordRepository
 from src.db.repositories.organismo_repository import OrganismoRepository
 from src.db.repositories.licitacion_repository import LicitacionRepository
 from src.db.repositories.etl_repository import EtlRepository
+from src.db.repositories.puntaje_sql_repository import PuntajeSqlRepository
+from src.db.repositories.mantenimiento_repository import MantenimientoRepository
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+from src.db.repositories.producto_repository import ProductoRepository
+from src.db.archivo_historico import ArchivoHistorico
+from src.db.instrumentacion import instrumentacion, instrumentar_metodos
 
 logger = configurar_logger(__name__)
 
+# Cada método público es una operación en la instrumentación SQL ('DbService.<método>')
+@instrumentar_metodos("DbService")
 class DbService:
     def __init__(self, session_factory: sessionmaker[Session]):
         self.session_factory = session_factory
@@ -21,6 +35,11 @@ class DbService:
         self.organismo_repo = OrganismoRepository(session_factory)
         self.licitacion_repo = LicitacionRepository(session_factory)
         self.etl_repo = EtlRepository(session_factory)
+        self.puntaje_sql_repo = PuntajeSqlRepository(session_factory)
+        self.archivo = ArchivoHistorico(DIR_ARCHIVO) if ARCHIVO_HISTORICO else None
+        self.mantenimiento_repo = MantenimientoRepository(session_factory, self.archivo)
+        self.vista_trabajo_repo = VistaTrabajoRepository(session_factory)
+        self.producto_repo = ProductoRepository(session_factory)
         
         logger.info("DbService (Fachada) inicializado con repositorios.")
 
@@ -28,29 +47,71 @@ class DbService:
     # SECCIÓN 1: INGESTIÓN Y MANTENIMIENTO (Delega a EtlRepo)
     # =========================================================================
     
-    def insertar_o_actualizar_masivo(self, compras: List[Dict]):
-        self.etl_repo.insertar_o_actualizar_masivo(compras)
+    def insertar_o_actualizar_masivo(self, compras: List[Dict]) -> Dict[str, Set[str]]:
+        return self.etl_repo.insertar_o_actualizar_masivo(compras)
 
     def actualizar_fase_2_detalle(self, codigo_ca: str, datos_fase_2: Dict, puntuacion_total: int, detalle_completo: List[str]):
         self.etl_repo.actualizar_fase_2_detalle(codigo_ca, datos_fase_2, puntuacion_total, detalle_completo)
 
+    def actualizar_fase_2_lote(self, fichas: List[Dict]) -> int:
+        return self.etl_repo.actualizar_fase_2_lote(fichas)
+
+    def precargar_organismos(self) -> int:
+        return self.etl_repo.precargar_organismos()
+
+    def unidad_de_trabajo(self, **kwargs):
+        """
+        Una conexión y commits por lotes para las llamadas de este hilo (ETL).
+        Sin un session_factory que la soporte no cambia nada.
+        """
+        crear = getattr(self.session_factory, "unidad_de_trabajo", None)
+        return crear(**kwargs) if crear is not None else nullcontext()
+
+    def obtener_huellas_ficha(self, codigos: List[str]) -> Dict[str, Optional[str]]:
+        return self.etl_repo.obtener_huellas_ficha(codigos)
+
     def actualizar_puntajes_en_lote(self, lista_actualizaciones: List[Tuple[int, int, List[str]]]):
         self.etl_repo.actualizar_puntajes_en_lote(lista_actualizaciones)
 
-    def obtener_datos_para_recalculo_puntajes(self) -> List[Dict]:
-        return self.etl_repo.obtener_datos_recalculo()
+    def obtener_datos_para_recalculo_puntajes(self, codigos: Optional[Set[str]] = None) -> List[Dict]:
+        return self.etl_repo.obtener_datos_recalculo(codigos)
+
+    def soporta_puntaje_sql(self) -> bool:
+        return self.puntaje_sql_repo.soportado()
 
-    def obtener_candidatas_para_fase_2(self, umbral_minimo: int = 10) -> List[CaLicitacion]:
+    def recalcular_puntajes_en_servidor(self, palabras_clave: List[Dict], puntos_segundo_llamado: int,
+                                        terminos_filtro: Optional[List[str]] = None,
+                                        codigos: Optional[Set[str]] = None) -> int:
+        return self.puntaje_sql_repo.recalcular(palabras_clave, puntos_segundo_llamado, terminos_filtro, codigos)
+
+    def obtener_candidatas_para_fase_2(self, umbral_minimo: int = UMBRAL_FASE_2) -> List[CaLicitacion]:
         return self.etl_repo.obtener_candidatas_fase_2(umbral_minimo)
 
     def obtener_rango_fechas_candidatas_activas(self) -> Tuple[Optional[object], Optional[object]]:
         return self.etl_repo.obtener_rango_fechas_activas()
 
-    def limpiar_registros_antiguos(self) -> int:
-        return self.etl_repo.limpiar_registros_antiguos()
+    def limpiar_registros_antiguos(self, dias_retencion: int = DIAS_RETENCION) -> int:
+        return self.mantenimiento_repo.purgar_antiguas(dias_retencion)["filas"]
+
+    def cerrar_licitaciones_vencidas_localmente(self, dias_gracia: int = DIAS_GRACIA_CIERRE) -> int:
+        return self.mantenimiento_repo.cerrar_vencidas(dias_gracia)["filas"]
+
+    def ejecutar_mantenimiento(self, dias_gracia: int = DIAS_GRACIA_CIERRE, dias_retencion: int = DIAS_RETENCION) -> List[Dict]:
+        """Cierre local + purga, retornando el reporte (filas, lotes, filas/s) de cada etapa."""
+        return [
+            self.mantenimiento_repo.cerrar_vencidas(dias_gracia),
+            self.mantenimiento_repo.purgar_antiguas(dias_retencion),
+        ]
 
-    def cerrar_licitaciones_vencidas_localmente(self) -> int:
-        return self.etl_repo.cerrar_vencidas_localmente()
+    def consultar_archivo(self, desde=None, hasta=None, texto: Optional[str] = None, codigo_ca: Optional[str] = None,
+                          columnas: Optional[List[str]] = None, limite: Optional[int] = None) -> List[Dict]:
+        """Compras ya purgadas de la base (archivo Parquet). Vacío si el archivo está desactivado."""
+        if self.archivo is None or not self.archivo.disponible(): return []
+        return self.archivo.consultar(desde, hasta, texto, codigo_ca, columnas, limite)
+
+    def resumen_archivo(self) -> List[Dict]:
+        if self.archivo is None or not self.archivo.disponible(): return []
+        return self.archivo.resumen_por_mes()
 
     def marcar_organismos_como_vistos(self):
         self.organismo_repo.marcar_organismos_como_vistos()
@@ -62,7 +123,15 @@ class DbService:
     def obtener_licitacion_por_id(self, ca_id: int):
         return self.licitacion_repo.obtener_por_id(ca_id)
 
+    def obtener_ca_ids(self, codigos: List[str]) -> Dict[str, int]:
+        return self.licitacion_repo.obtener_ca_ids(codigos)
+
     # --- Acciones del Usuario ---
+    def actualizar_seguimiento(self, ca_id: int, es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None,
+                               es_oculta: Optional[bool] = None) -> bool:
+        """Varias marcas de seguimiento en una transacción (las None no cambian)."""
+        return self.licitacion_repo.actualizar_seguimiento(ca_id, es_favorito, es_ofertada, es_oculta)
+
     def gestionar_favorito(self, ca_id: int, es_favorito: bool):
         self.licitacion_repo.gestionar_favorito(ca_id, es_favorito)
 
@@ -72,22 +141,88 @@ class DbService:
     def ocultar_licitacion(self, ca_id: int, ocultar: bool = True):
         self.licitacion_repo.ocultar_licitacion(ca_id, ocultar)
 
-    def guardar_nota_usuario(self, ca_id: int, nota: str):
-        self.licitacion_repo.guardar_nota_usuario(ca_id, nota)
-
-    # --- Consultas para Exportación / UI ---
-    # Aquí mantenemos la conversión a diccionario para no romper el Controller
+    def guardar_nota_usuario(self, ca_id: int, nota: str) -> bool:
+        return self.licitacion_repo.guardar_nota_usuario(ca_id, nota)
+
+    def obtener_nota_usuario(self, ca_id: int) -> str:
+        return self.licitacion_repo.obtener_nota(ca_id)
+
+    def marcar_seguimiento_en_lote(self, ca_ids: List[int], es_favorito: Optional[bool] = None,
+                                   es_ofertada: Optional[bool] = None, es_oculta: Optional[bool] = None) -> int:
+        """Marcas para muchas compras en un upsert por lote. Retorna las compras escritas."""
+        return self.licitacion_repo.marcar_en_lote(ca_ids, es_favorito, es_ofertada, es_oculta)
+
+    def anotar_en_lote(self, ca_ids: List[int], nota: str) -> int:
+        return self.licitacion_repo.anotar_en_lote(ca_ids, nota)
+
+    def aplicar_seguimiento(self, cambios: Dict[int, Dict[str, Any]]) -> List[int]:
+        """Cambios por compra en una transacción; propaga errores (ver ColaEscrituraDiferida)."""
+        return self.licitacion_repo.aplicar_seguimiento(cambios)
+
+    # --- Consultas para Vistas (proyecciones livianas) ---
+    # Filas de solo lectura (RowMapping: acceso por clave y .get) con las columnas
+    # de LicitacionesTable, leídas del read model ca_vista_trabajo; no cargan
+    # descripción ni productos.
+    def obtener_listado_candidatas(self, umbral_minimo: int = 5) -> List[Dict]:
+        return self.licitacion_repo.listar_candidatas(umbral_minimo)
+
+    def obtener_listado_seguimiento(self) -> List[Dict]:
+        return self.licitacion_repo.listar_seguimiento()
+
+    def obtener_listado_ofertadas(self) -> List[Dict]:
+        return self.licitacion_repo.listar_ofertadas()
+
+    def reconstruir_vista_trabajo(self) -> int:
+        """Regenera ca_vista_trabajo desde cero (normalmente se mantiene sola)."""
+        return self.vista_trabajo_repo.reconstruir()
+
+    def obtener_detalle_licitacion(self, codigo_ca: str) -> Optional[Dict]:
+        """Campos pesados (descripción, productos, dirección, nota) para el panel de detalle."""
+        fila = self.licitacion_repo.obtener_detalle(codigo_ca)
+        if fila is None: return None
+        detalle = dict(fila)
+        detalle["nota_usuario"] = detalle.pop("notas") or ""
+        return detalle
+
+    def obtener_pagina_listado(self, vista: str, cursor: Optional[Tuple[Any, int]] = None,
+                               tamano: Optional[int] = None, orden: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ventana de 'vista' ('candidatas', 'seguimiento', 'ofertadas') paginada por
+        keyset. Retorna {'filas', 'cursor', 'hay_mas'}; el cursor se pasa tal cual
+        para pedir la página siguiente.
+        """
+        kwargs = {"tamano": tamano} if tamano else {}
+        return self.licitacion_repo.listar_pagina(vista, cursor, orden=orden, **kwargs)
+
+    def estimar_total_listado(self, vista: str) -> int:
+        """Total aproximado de filas de una vista (estimación del planner en PostgreSQL)."""
+        return self.licitacion_repo.estimar_total(vista)
+
+    def buscar_licitaciones(self, texto: str, cursor: Optional[int] = None, vista: Optional[str] = None) -> Dict[str, Any]:
+        """Búsqueda por relevancia en todas las compras (o en 'vista'), paginada como obtener_pagina_listado."""
+        return self.licitacion_repo.buscar(texto, cursor, vista=vista)
+
+    def buscar_por_producto(self, codigo_producto: Optional[int] = None, texto: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Compras que piden el producto 'codigo_producto' y/o cuyo texto de productos contiene 'texto'."""
+        return [dict(fila) for fila in self.licitacion_repo.buscar_por_producto(codigo_producto, texto)]
+
+    def _iterar_paginas(self, vista: str) -> Iterator:
+        """Recorre una vista completa (con detalle) por páginas, sin una consulta gigante."""
+        cursor, hay_mas = None, True
+        while hay_mas:
+            pagina = self.licitacion_repo.listar_pagina(vista, cursor, con_detalle=True)
+            yield from pagina["filas"]
+            cursor, hay_mas = pagina["cursor"], pagina["hay_mas"]
+
+    # --- Consultas para Exportación ---
     def exportar_candidatas(self) -> List[Dict]:
-        data = self.licitacion_repo.obtener_candidatas_filtradas()
-        return self._convertir_a_diccionario_seguro(data)
+        return self._convertir_a_diccionario_seguro(self._iterar_paginas("candidatas"))
 
     def exportar_seguimiento(self) -> List[Dict]:
-        data = self.licitacion_repo.obtener_seguimiento()
-        return self._convertir_a_diccionario_seguro(data)
+        return self._convertir_a_diccionario_seguro(self._iterar_paginas("seguimiento"))
 
     def exportar_ofertadas(self) -> List[Dict]:
-        data = self.licitacion_repo.obtener_ofertadas()
-        return self._convertir_a_diccionario_seguro(data)
+        return self._convertir_a_diccionario_seguro(self._iterar_paginas("ofertadas"))
     
     def obtener_licitaciones_seguimiento(self):
         # Necesario para el ETL service que pide objetos directos
@@ -96,33 +231,14 @@ class DbService:
     def obtener_licitaciones_ofertadas(self):
         return self.licitacion_repo.obtener_ofertadas()
 
-    def _convertir_a_diccionario_seguro(self, licitaciones: List[CaLicitacion]) -> List[Dict]:
-        """Helper visual (se mantiene aquí porque es lógica de presentación)."""
+    def _convertir_a_diccionario_seguro(self, filas) -> List[Dict]:
+        """Helper de exportación: filas de la proyección con detalle a diccionarios planos."""
         resultados = []
-        for ca in licitaciones:
-            tiene_nota = False
-            if ca.seguimiento and ca.seguimiento.notas and ca.seguimiento.notas.strip():
-                tiene_nota = True
-
-            resultados.append({
-                "puntuacion_final": ca.puntuacion_final,
-                "puntaje_detalle": ca.puntaje_detalle,
-                "codigo_ca": ca.codigo_ca,
-                "nombre": ca.nombre,
-                "descripcion": ca.descripcion,
-                "organismo_nombre": ca.organismo.nombre if ca.organismo else "N/A",
-                "direccion_entrega": ca.direccion_entrega,
-                "estado_ca_texto": ca.estado_ca_texto,
-                "fecha_publicacion": ca.fecha_publicacion,
-                "fecha_cierre": ca.fecha_cierre,
-                "fecha_cierre_segundo_llamado": ca.fecha_cierre_segundo_llamado,
-                "proveedores_cotizando": ca.proveedores_cotizando,
-                "productos_solicitados": str(ca.productos_solicitados) if ca.productos_solicitados else "",
-                "es_favorito": ca.seguimiento.es_favorito if ca.seguimiento else False,
-                "es_ofertada": ca.seguimiento.es_ofertada if ca.seguimiento else False,
-                "tiene_nota": tiene_nota,
-                "monto_clp": ca.monto_clp
-            })
+        for fila in filas:
+            registro = {k: v for k, v in fila.items() if k != "ca_id"}
+            registro["productos_solicitados"] = str(fila["productos_solicitados"]) if fila["productos_solicitados"] else ""
+            registro["tiene_nota"] = bool(fila["tiene_nota"])
+            resultados.append(registro)
         return resultados
 
     # =========================================================================
@@ -170,6 +286,20 @@ class DbService:
     def eliminar_regla_organismo(self, org_id):
         self.organismo_repo.eliminar_regla(org_id)
 
+    # --- Códigos de producto (ONU/UNSPSC) ---
+    def obtener_reglas_producto(self):
+        return self.producto_repo.obtener_reglas()
+
+    def establecer_regla_producto(self, prefijo, puntos, descripcion=None):
+        """'prefijo': código de 8 dígitos o prefijo (segmento, familia, clase)."""
+        self.producto_repo.establecer_regla(prefijo, puntos, descripcion)
+
+    def eliminar_regla_producto(self, regla_id):
+        self.producto_repo.eliminar_regla(regla_id)
+
+    def reconstruir_lineas_producto(self) -> int:
+        return self.producto_repo.reconstruir()
+
     def exportar_config_organismos(self, sector_filter=None):
         return self.organismo_repo.exportar_config(sector_filter)
 
@@ -183,4 +313,21 @@ class DbService:
         self.organismo_repo.renombrar_sector(old_name, new_name)
 
     def eliminar_sector(self, sector_name):
-        self.organismo_repo.eliminar_sector(sector_name)
\ No newline at end of file
+        self.organismo_repo.eliminar_sector(sector_name)
+
+    # =========================================================================
+    # SECCIÓN 4: DIAGNÓSTICO (Instrumentación SQL)
+    # =========================================================================
+
+    def obtener_estadisticas_sql(self) -> Dict[str, List[Dict]]:
+        return {
+            "operaciones": instrumentacion.resumen_operaciones(),
+            "sentencias": instrumentacion.resumen_sentencias(),
+        }
+
+    def exportar_estadisticas_sql(self, ruta: Optional[Path] = None) -> Path:
+        """Vuelca lo medido por la instrumentación SQL ('.json' completo o '.csv' por sentencia)."""
+        ruta = ruta or DIR_ESTADISTICAS_SQL / f"estadisticas_sql_{datetime.now():%Y%m%d_%H%M%S}.json"
+        ruta = instrumentacion.exportar(ruta)
+        logger.info(f"Estadísticas SQL exportadas a {ruta}")
+        return ruta
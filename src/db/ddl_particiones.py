@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+DDL de Particionamiento (solo PostgreSQL).
+
+Convierte 'ca_licitacion' en una tabla particionada por rango sobre
+'mes_particion' (una partición por mes de publicación más la partición fija:
+compras sin fecha y lo que la retención conserva al retirar un mes) y la revierte a tabla plana. Lo usa la migración
+opcional (alembic -x particionar=true) y sirve para hacerlo a mano más tarde.
+
+Restricciones de PostgreSQL que explican el diseño:
+- Toda clave única debe incluir la clave de partición: la PK pasa a ser
+  (ca_id, mes_particion) y 'codigo_ca' deja de ser único por sí solo (el ETL
+  hace ON CONFLICT sobre (codigo_ca, mes_particion) con el mes ya guardado
+  de cada código, no el calculado desde el listado).
+- Una FK no puede apuntar a una tabla particionada sin esa misma clave, por lo
+  que ca_seguimiento pierde su FK y el borrado en cascada lo hace un trigger.
+"""
+import datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from src.db.db_models import MES_FIJADO
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+TABLA = "ca_licitacion"
+TABLA_PLANA_TEMPORAL = "ca_licitacion_plana"
+PARTICION_FIJA = "ca_licitacion_fijadas"
+SECUENCIA_ID = "ca_licitacion_ca_id_seq"
+FK_SEGUIMIENTO = "ca_seguimiento_ca_id_fkey"
+FK_ORGANISMO = "ca_licitacion_organismo_id_fkey"
+# Índice que en la tabla plana es único y en la particionada no puede serlo
+INDICE_CODIGO = "ix_ca_licitacion_codigo_ca"
+
+SQL_TRIGGER_SEGUIMIENTO = [
+    """
+    CREATE OR REPLACE FUNCTION public.ca_seguimiento_borrar_huerfano() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        -- Mover una fila de partición (UPDATE de mes_particion) también dispara DELETE:
+        -- solo se borra el seguimiento si el ca_id ya no existe en ninguna partición.
+        IF NOT EXISTS (SELECT 1 FROM ca_licitacion WHERE ca_id = OLD.ca_id) THEN
+            DELETE FROM ca_seguimiento WHERE ca_id = OLD.ca_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS tg_ca_licitacion_borrar_seguimiento ON ca_licitacion",
+    """
+    CREATE TRIGGER tg_ca_licitacion_borrar_seguimiento
+    AFTER DELETE ON ca_licitacion FOR EACH ROW
+    EXECUTE FUNCTION public.ca_seguimiento_borrar_huerfano()
+    """,
+]
+
+
+def nombre_particion(mes: datetime.date) -> str:
+    return f"{TABLA}_p{mes:%Y%m}"
+
+
+def siguiente_mes(mes: datetime.date) -> datetime.date:
+    return datetime.date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def sql_crear_particion(mes: datetime.date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {nombre_particion(mes)} PARTITION OF {TABLA} "
+        f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente_mes(mes).isoformat()}')"
+    )
+
+
+def esta_particionada(conexion: Connection) -> bool:
+    return bool(conexion.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla))"
+    ), {"tabla": TABLA}).scalar())
+
+
+def _definiciones_indices(conexion: Connection, tabla: str) -> List[Tuple[str, str]]:
+    """(nombre, CREATE INDEX ...) de los índices de 'tabla', excepto la PK."""
+    return conexion.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = :tabla AND indexname <> :pk"
+    ), {"tabla": tabla, "pk": f"{TABLA}_pkey"}).all()
+
+
+def _recrear_indices(conexion: Connection, indices: List[Tuple[str, str]], particionada: bool):
+    for nombre, definicion in indices:
+        definicion = definicion.replace(" ON ONLY ", " ON ", 1)
+        if particionada and definicion.startswith("CREATE UNIQUE") and "mes_particion" not in definicion:
+            definicion = definicion.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)
+        elif not particionada and nombre == INDICE_CODIGO:
+            definicion = definicion.replace("CREATE INDEX", "CREATE UNIQUE INDEX", 1)
+        conexion.exec_driver_sql(definicion)
+
+
+def _reemplazar_tabla(conexion: Connection, particionada: bool, select_copia: str):
+    """
+    Renombra la tabla actual, crea la nueva con las mismas columnas/defaults,
+    copia los datos y rehace índices, PK, FK a organismo y la secuencia de ca_id.
+    """
+    indices = _definiciones_indices(conexion, TABLA)
+    conexion.exec_driver_sql(f"ALTER TABLE {TABLA} RENAME TO {TABLA_PLANA_TEMPORAL}")
+    conexion.exec_driver_sql(f"ALTER SEQUENCE {SECUENCIA_ID} OWNED BY NONE")
+    particion = " PARTITION BY RANGE (mes_particion)" if particionada else ""
+    conexion.exec_driver_sql(
+        f"CREATE TABLE {TABLA} (LIKE {TABLA_PLANA_TEMPORAL} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){particion}"
+    )
+
+    if particionada:
+        conexion.exec_driver_sql(
+            f"CREATE TABLE {PARTICION_FIJA} PARTITION OF {TABLA} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{siguiente_mes(MES_FIJADO).isoformat()}')"
+        )
+        meses = conexion.execute(text(
+            f"SELECT DISTINCT mes_particion FROM {TABLA_PLANA_TEMPORAL} WHERE mes_particion > :fijo"
+        ), {"fijo": MES_FIJADO}).scalars().all()
+        hoy = datetime.date.today().replace(day=1)
+        for mes in set(meses) | {hoy, siguiente_mes(hoy)}:
+            conexion.exec_driver_sql(sql_crear_particion(mes))
+
+    conexion.exec_driver_sql(f"INSERT INTO {TABLA} {select_copia}")
+    conexion.exec_driver_sql(f"DROP TABLE {TABLA_PLANA_TEMPORAL}")
+
+    clave = "ca_id, mes_particion" if particionada else "ca_id"
+    conexion.exec_driver_sql(f"ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY ({clave})")
+    _recrear_indices(conexion, indices, particionada)
+    conexion.exec_driver_sql(
+        f"ALTER TABLE {TABLA} ADD CONSTRAINT {FK_ORGANISMO} "
+        "FOREIGN KEY (organismo_id) REFERENCES ca_organismo (organismo_id)"
+    )
+    conexion.exec_driver_sql(f"ALTER SEQUENCE {SECUENCIA_ID} OWNED BY {TABLA}.ca_id")
+
+
+def convertir_a_particionada(conexion: Connection):
+    """Convierte ca_licitacion en tabla particionada por mes. Idempotente."""
+    if esta_particionada(conexion):
+        return
+    conexion.exec_driver_sql(f"ALTER TABLE ca_seguimiento DROP CONSTRAINT IF EXISTS {FK_SEGUIMIENTO}")
+    # Cada fila queda en el mes de su publicación; solo se fija al retirar ese mes
+    _reemplazar_tabla(conexion, particionada=True, select_copia=f"SELECT * FROM {TABLA_PLANA_TEMPORAL}")
+    for sentencia in SQL_TRIGGER_SEGUIMIENTO:
+        conexion.exec_driver_sql(sentencia)
+    logger.info("ca_licitacion convertida a tabla particionada por mes de publicación.")
+
+
+def revertir_a_tabla_plana(conexion: Connection):
+    """Deshace convertir_a_particionada (restaura PK, unicidad de codigo_ca y la FK de seguimiento)."""
+    if not esta_particionada(conexion):
+        return
+    conexion.exec_driver_sql("DROP TRIGGER IF EXISTS tg_ca_licitacion_borrar_seguimiento ON ca_licitacion")
+    conexion.exec_driver_sql("DROP FUNCTION IF EXISTS public.ca_seguimiento_borrar_huerfano()")
+    columnas = conexion.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :tabla ORDER BY ordinal_position"
+    ), {"tabla": TABLA}).scalars().all()
+    # Las filas fijadas vuelven a su mes real (las sin fecha siguen en MES_FIJADO, como en mes_particion_de)
+    seleccion = ", ".join(
+        f"coalesce(CAST(date_trunc('month', fecha_publicacion) AS date), DATE '{MES_FIJADO.isoformat()}')"
+        if c == "mes_particion" else c
+        for c in columnas
+    )
+    _reemplazar_tabla(
+        conexion, particionada=False,
+        select_copia=f"({', '.join(columnas)}) SELECT {seleccion} FROM {TABLA_PLANA_TEMPORAL}",
+    )
+    conexion.exec_driver_sql(f"DELETE FROM ca_seguimiento WHERE ca_id NOT IN (SELECT ca_id FROM {TABLA})")
+    conexion.exec_driver_sql(
+        f"ALTER TABLE ca_seguimiento ADD CONSTRAINT {FK_SEGUIMIENTO} "
+        f"FOREIGN KEY (ca_id) REFERENCES {TABLA} (ca_id) ON DELETE CASCADE"
+    )
+    logger.info("ca_licitacion revertida a tabla plana.")
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+DDL auxiliar exclusivo de PostgreSQL.
+
+Funciones SQL e índices que replican en el servidor la normalización de texto
+de MotorPuntajes (minúsculas, sin tildes, espacios colapsados), la búsqueda de
+texto completo y el masking de palabras clave del backend de puntajes SQL.
+
+Los instala la migración 7c2d9e4f1a35 (extensiones y funciones en su
+transacción, índices con CREATE INDEX CONCURRENTLY fuera de ella): crear un
+índice GIN sobre ca_licitacion sin CONCURRENTLY bloquea las escrituras del ETL
+y de la cola durante todo el build, y las extensiones piden privilegios que el
+rol de la aplicación no suele tener. En tiempo de ejecución los repositorios
+solo preguntan si están disponibles ('busqueda_disponible',
+'puntaje_sql_disponible') y si no, usan ILIKE / el cálculo en Python.
+"""
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+DDL_EXTENSIONES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+]
+
+# Equivalente SQL de MotorPuntajes._normalizar_texto.
+# Se declara IMMUTABLE (unaccent no lo es) para poder indexar expresiones.
+DDL_NORMALIZACION = [
+    r"""
+    CREATE OR REPLACE FUNCTION public.ca_normalizar(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT btrim(regexp_replace(
+            public.unaccent('public.unaccent'::regdictionary, lower(coalesce(texto, ''))),
+            '\s+', ' ', 'g'))
+    $$
+    """,
+    # Texto de productos tal como lo arma calcular_puntaje_fase_2: "nombre descripcion | ..."
+    """
+    CREATE OR REPLACE FUNCTION public.ca_texto_productos(productos jsonb) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT coalesce(string_agg(
+            public.ca_normalizar(coalesce(e.p->>'nombre', '') || ' ' || coalesce(e.p->>'descripcion', '')),
+            ' | ' ORDER BY e.n), '')
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(productos) = 'array' THEN productos ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS e(p, n)
+        WHERE jsonb_typeof(e.p) = 'object'
+    $$
+    """,
+]
+
+# Búsqueda de texto completo: configuración española que ignora tildes y documento
+# indexable (nombre y productos pesan más que la descripción). El organismo y el
+# código se buscan por trigram en sus propias columnas.
+CONFIG_BUSQUEDA = "public.es_sin_acentos"
+
+DDL_BUSQUEDA = [
+    f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_sin_acentos') THEN
+            CREATE TEXT SEARCH CONFIGURATION {CONFIG_BUSQUEDA} (COPY = pg_catalog.spanish);
+            ALTER TEXT SEARCH CONFIGURATION {CONFIG_BUSQUEDA}
+                ALTER MAPPING FOR hword, hword_part, word WITH public.unaccent, spanish_stem;
+        END IF;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION public.ca_documento_busqueda(nombre text, descripcion text, productos jsonb)
+    RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT setweight(to_tsvector('{CONFIG_BUSQUEDA}', coalesce(nombre, '')), 'A')
+            || setweight(to_tsvector('{CONFIG_BUSQUEDA}', public.ca_texto_productos(productos)), 'B')
+            || setweight(to_tsvector('{CONFIG_BUSQUEDA}', coalesce(descripcion, '')), 'C')
+    $$
+    """,
+]
+
+# Réplica en PL/pgSQL de MotorPuntajes._evaluar_con_masking: recorre las keywords
+# (ya ordenadas por largo DESC) y "tacha" cada coincidencia para no puntuarla dos veces.
+DDL_MASKING = [
+    """
+    CREATE OR REPLACE FUNCTION public.ca_puntaje_masking(
+        texto text, terminos text[], etiquetas text[], puntos int[], campo text,
+        OUT total int, OUT detalle text[])
+    LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+    DECLARE
+        i int;
+    BEGIN
+        total := 0;
+        detalle := ARRAY[]::text[];
+        IF texto IS NULL OR texto = '' THEN
+            RETURN;
+        END IF;
+        FOR i IN 1 .. coalesce(array_length(terminos, 1), 0) LOOP
+            IF puntos[i] <> 0 AND terminos[i] <> '' AND strpos(texto, terminos[i]) > 0 THEN
+                total := total + puntos[i];
+                detalle := detalle || format('KW %s: ''%s'' (%s%s)', campo, etiquetas[i],
+                                             CASE WHEN puntos[i] > 0 THEN '+' ELSE '' END, puntos[i]);
+                texto := replace(texto, terminos[i], repeat('#', length(terminos[i])));
+            END IF;
+        END LOOP;
+    END
+    $$
+    """,
+]
+
+# (nombre, tabla, definición) de los índices sobre las funciones anteriores.
+# Trigram sobre título, descripción y productos normalizados: filtro de puntajes
+# (LIKE '%kw%'), búsqueda y consulta por producto. El resto, búsqueda.
+INDICES_TEXTO: List[Tuple[str, str, str]] = [
+    ("ix_ca_licitacion_busqueda", "ca_licitacion",
+     "USING gin (public.ca_documento_busqueda(nombre, descripcion, productos_solicitados::jsonb))"),
+    ("ix_ca_licitacion_nombre_trgm", "ca_licitacion", "USING gin (public.ca_normalizar(nombre) gin_trgm_ops)"),
+    ("ix_ca_licitacion_descripcion_trgm", "ca_licitacion",
+     "USING gin (public.ca_normalizar(descripcion) gin_trgm_ops)"),
+    ("ix_ca_licitacion_productos_trgm", "ca_licitacion",
+     "USING gin (public.ca_texto_productos(productos_solicitados::jsonb) gin_trgm_ops)"),
+    ("ix_ca_licitacion_codigo_trgm", "ca_licitacion", "USING gin (codigo_ca gin_trgm_ops)"),
+    ("ix_ca_licitacion_organismo", "ca_licitacion", "(organismo_id)"),
+    ("ix_ca_organismo_nombre_trgm", "ca_organismo", "USING gin (public.ca_normalizar(nombre) gin_trgm_ops)"),
+]
+
+DDL_FUNCIONES = DDL_NORMALIZACION + DDL_BUSQUEDA + DDL_MASKING
+
+SQL_PARTICIONES_DE = """
+SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(:tabla) ORDER BY c.relname
+"""
+
+
+def busqueda_disponible(conexion: Connection) -> bool:
+    """True si la configuración y el documento de búsqueda de texto completo están instalados."""
+    return bool(conexion.execute(text(
+        "SELECT to_regprocedure('public.ca_documento_busqueda(text, text, jsonb)') IS NOT NULL "
+        "AND EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_sin_acentos')"
+    )).scalar())
+
+
+def puntaje_sql_disponible(conexion: Connection) -> bool:
+    """True si las funciones del backend de puntajes SQL están instaladas."""
+    return bool(conexion.execute(text(
+        "SELECT to_regprocedure('public.ca_puntaje_masking(text, text[], text[], integer[], text)') IS NOT NULL "
+        "AND to_regprocedure('public.ca_texto_productos(jsonb)') IS NOT NULL"
+    )).scalar())
+
+
+def crear_funciones(conexion: Connection):
+    """Extensiones y funciones (idempotente, en la transacción de 'conexion')."""
+    for sentencia in DDL_EXTENSIONES + DDL_FUNCIONES:
+        conexion.execute(text(sentencia))
+
+
+def crear_indice(conexion: Connection, nombre: str, tabla: str, definicion: str, concurrente: bool = True):
+    """
+    CREATE INDEX IF NOT EXISTS; con 'concurrente' sin bloquear escrituras
+    ('conexion' en autocommit). Una tabla particionada no admite CONCURRENTLY: se
+    crea el índice del padre con ON ONLY, el de cada partición con CONCURRENTLY
+    y se adjuntan (las particiones nuevas ya lo heredan).
+    """
+    particiones = conexion.execute(text(SQL_PARTICIONES_DE), {"tabla": tabla}).scalars().all()
+    if not concurrente or not particiones:
+        modo = "CONCURRENTLY " if concurrente else ""
+        conexion.exec_driver_sql(f"CREATE INDEX {modo}IF NOT EXISTS {nombre} ON {tabla} {definicion}")
+        return
+    conexion.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {nombre} ON ONLY {tabla} {definicion}")
+    sufijo = nombre.removeprefix(f"ix_{tabla}_")
+    for particion in particiones:
+        indice = f"ix_{particion}_{sufijo}"
+        conexion.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {indice} ON {particion} {definicion}")
+        adjunto = conexion.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:hijo) "
+            "AND inhparent = to_regclass(:padre))"
+        ), {"hijo": indice, "padre": nombre}).scalar()
+        if not adjunto:
+            conexion.exec_driver_sql(f"ALTER INDEX {nombre} ATTACH PARTITION {indice}")
+
+
+def crear_indices_texto(conexion: Connection, concurrente: bool = True):
+    for nombre, tabla, definicion in INDICES_TEXTO:
+        crear_indice(conexion, nombre, tabla, definicion, concurrente)
+
+
+def instalar_esquema_texto(conexion: Connection):
+    """Funciones e índices en una transacción, sin CONCURRENTLY (pruebas y bases vacías)."""
+    crear_funciones(conexion)
+    crear_indices_texto(conexion, concurrente=False)
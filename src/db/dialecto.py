@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Portabilidad entre Motores (PostgreSQL servidor / SQLite embebido).
+
+La aplicación corre contra PostgreSQL en instalaciones compartidas y contra un
+archivo SQLite en instalaciones de un solo puesto (BASE_LOCAL=true): sin
+servidor, consultas locales sin latencia de red. Los repositorios no importan
+dialectos directamente; usan lo de este módulo.
+
+- 'es_postgres' / 'es_sqlite': motor de una sesión, conexión o engine.
+- 'escapar_like': literal para LIKE/ILIKE con escape '\\' (mismo patrón en ambos motores).
+- 'insert_upsert': INSERT con ON CONFLICT del dialecto de la sesión
+  (PostgreSQL y SQLite >= 3.35 comparten on_conflict_do_update/nothing y RETURNING).
+- 'crear_engine': Engine con las opciones del motor. En SQLite aplica los PRAGMA
+  de un puesto único: WAL (lectores no bloquean al escritor), synchronous=NORMAL,
+  caché y mmap grandes, temporales en memoria, llaves foráneas activas y espera
+  ante bloqueo. Además delega BEGIN a SQLAlchemy para que SAVEPOINT funcione.
+"""
+from typing import Any, Dict, Union
+
+from sqlalchemy import Table, create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+PRAGMAS_SQLITE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": "-65536",       # 64 MB (negativo = KiB)
+    "mmap_size": "268435456",     # 256 MB
+    "busy_timeout": "30000",      # ms esperando al otro escritor antes de 'database is locked'
+}
+
+_DIALECTOS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+def nombre_dialecto(origen: Union[Session, Connection, Engine]) -> str:
+    bind = origen.get_bind() if isinstance(origen, Session) else origen
+    return bind.dialect.name
+
+
+def es_sqlite(origen: Union[Session, Connection, Engine]) -> bool:
+    return nombre_dialecto(origen) == "sqlite"
+
+
+def es_postgres(origen: Union[Session, Connection, Engine]) -> bool:
+    return nombre_dialecto(origen) == "postgresql"
+
+
+def escapar_like(termino: str) -> str:
+    """Escapa '%', '_' y '\\' para buscar 'termino' literal con LIKE ... ESCAPE '\\'."""
+    return termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def soporta_upsert(origen: Union[Session, Connection, Engine]) -> bool:
+    """True si el motor tiene INSERT ... ON CONFLICT ... RETURNING."""
+    return nombre_dialecto(origen) in _DIALECTOS
+
+
+def insert_upsert(session: Session, tabla: Table):
+    """INSERT del dialecto de la sesión, con on_conflict_do_update / on_conflict_do_nothing."""
+    dialecto = _DIALECTOS.get(nombre_dialecto(session))
+    if dialecto is None:
+        raise NotImplementedError(f"El motor '{nombre_dialecto(session)}' no soporta INSERT ... ON CONFLICT.")
+    return dialecto.insert(tabla)
+
+
+def es_url_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def opciones_engine(url: str) -> Dict[str, Any]:
+    """Argumentos de create_engine según el motor de 'url'."""
+    if not es_url_sqlite(url):
+        # Verifica la conexión antes de usarla: se recupera de desconexiones del servidor
+        return {"pool_pre_ping": True}
+    # La GUI, los workers y la cola de escritura comparten el pool desde hilos distintos
+    opciones: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+    if make_url(url).database in (None, "", ":memory:"):
+        # En memoria cada conexión sería una base distinta
+        opciones["poolclass"] = StaticPool
+    return opciones
+
+
+def crear_engine(url: str, **kwargs) -> Engine:
+    engine = create_engine(url, **{**opciones_engine(url), **kwargs})
+    if engine.dialect.name == "sqlite":
+        configurar_sqlite(engine)
+    return engine
+
+
+def configurar_sqlite(engine: Engine):
+    """PRAGMA por conexión y transacciones manejadas por SQLAlchemy (no por pysqlite)."""
+
+    @event.listens_for(engine, "connect")
+    def _al_conectar(conexion_dbapi, _registro):
+        # Sin esto pysqlite abre/cierra transacciones por su cuenta y rompe SAVEPOINT
+        conexion_dbapi.isolation_level = None
+        cursor = conexion_dbapi.cursor()
+        try:
+            for pragma, valor in PRAGMAS_SQLITE.items():
+                cursor.execute(f"PRAGMA {pragma}={valor}")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _al_iniciar(conexion):
+        conexion.exec_driver_sql("BEGIN")
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Enrutamiento de Sesiones Lectura / Escritura.
+
+'EnrutadorSesiones' reemplaza a SessionLocal como session_factory: llamarlo
+entrega una sesión del primario (escrituras, ETL y todo lo que no se declare
+lectura) y 'lectura()' una sesión del engine de lectura, que puede ser una
+réplica (DATABASE_URL_LECTURA) o un pool aparte de solo lectura sobre el mismo
+servidor. Así los listados y exportaciones pesadas de la GUI no compiten por
+las conexiones del ETL.
+
+Leer lo propio (read-your-writes): cada commit en el primario deja pendiente
+su posición de WAL (pg_current_wal_lsn). La siguiente lectura pregunta a la
+réplica si ya la reprodujo (pg_last_wal_replay_lsn); mientras no, la lectura va
+al primario. Sin escrituras recientes no hay consultas extra. Cuenta el commit
+de cada sesión suelta y el de cada lote de una unidad de trabajo, no los
+SAVEPOINT que esta libera. Con replica=False (pool de solo lectura sobre el
+primario) no hay retraso posible y no se hace ningún seguimiento.
+
+Los repositorios piden sesiones de lectura con 'sesion_lectura(factory)': con
+un sessionmaker común (pruebas, SQLite embebido) es la misma sesión de siempre.
+Dentro de una unidad de trabajo (ETL) lecturas y escrituras usan su conexión.
+"""
+import threading
+from typing import Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.db.unidad_trabajo import CLAVE_UNIDAD, UnidadTrabajo, unidad_actual
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+
+class EnrutadorSesiones:
+    def __init__(self, escritura: sessionmaker[Session], lectura: Optional[sessionmaker[Session]] = None,
+                 replica: bool = True):
+        """
+        lectura=None: todo va al primario (motores sin réplica, p. ej. SQLite).
+        replica=False: 'lectura' apunta al mismo primario y siempre está al día.
+        """
+        self.escritura = escritura
+        self._lectura = lectura
+        self._lock = threading.Lock()
+        self._lock_objetivo = threading.Lock()
+        self._commit_pendiente = False
+        # Posición de WAL del último commit propio que la réplica aún no confirmó
+        self._lsn_objetivo: Optional[str] = None
+        self._leer_lo_propio = lectura is not None and replica
+        if self._leer_lo_propio:
+            event.listen(escritura, "after_commit", self._al_confirmar)
+
+    def __call__(self) -> Session:
+        unidad = self._unidad()
+        return unidad.sesion() if unidad is not None else self.escritura()
+
+    def lectura(self) -> Session:
+        """Sesión para consultas: réplica/pool de lectura si ya refleja los commits propios; si no, el primario."""
+        unidad = self._unidad()
+        if unidad is not None:
+            # Dentro de una unidad de trabajo se lee lo aún no confirmado del lote
+            return unidad.sesion()
+        if self._lectura is None:
+            return self.escritura()
+        if not self._leer_lo_propio:
+            return self._lectura()
+        objetivo = self._objetivo()
+        session = self._lectura()
+        if objetivo is None:
+            return session
+        try:
+            if self._replica_al_dia(session, objetivo):
+                with self._lock:
+                    if self._lsn_objetivo == objetivo:
+                        self._lsn_objetivo = None
+                return session
+        except Exception as e:
+            logger.warning(f"No se pudo verificar el retraso de la réplica: {e}")
+        session.close()
+        logger.debug(f"Réplica sin el commit {objetivo}: la lectura va al primario.")
+        return self.escritura()
+
+    # --- Unidad de trabajo ---
+
+    def unidad_de_trabajo(self, **kwargs) -> UnidadTrabajo:
+        """Una conexión y commits por lotes para lo que se haga en este hilo (ver src/db/unidad_trabajo.py)."""
+        unidad = UnidadTrabajo(self.escritura, **kwargs)
+        if self._leer_lo_propio:
+            unidad.al_confirmar_lote = self._marcar_commit
+        return unidad
+
+    def _unidad(self) -> Optional[UnidadTrabajo]:
+        unidad = unidad_actual()
+        return unidad if unidad is not None and unidad.session_factory is self.escritura else None
+
+    # --- Leer lo propio ---
+
+    def _al_confirmar(self, session: Session):
+        # En una unidad de trabajo el commit de la sesión solo libera un SAVEPOINT:
+        # cuenta el del lote (al_confirmar_lote)
+        if CLAVE_UNIDAD in session.info:
+            return
+        self._marcar_commit()
+
+    def _marcar_commit(self):
+        # En after_commit no se puede emitir SQL: el LSN se consulta en la próxima lectura
+        with self._lock:
+            self._commit_pendiente = True
+
+    def _objetivo(self) -> Optional[str]:
+        # Un solo lector consulta el LSN; los demás esperan a que lo publique en vez
+        # de ver el commit ya descontado y leer de una réplica que no lo tiene
+        with self._lock_objetivo:
+            with self._lock:
+                pendiente, self._commit_pendiente = self._commit_pendiente, False
+            if pendiente:
+                try:
+                    lsn = self._lsn_actual()
+                except Exception:
+                    with self._lock:
+                        self._commit_pendiente = True
+                    raise
+                with self._lock:
+                    self._lsn_objetivo = lsn
+            return self._lsn_objetivo
+
+    def _lsn_actual(self) -> str:
+        with self.escritura() as session:
+            return session.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+
+    @staticmethod
+    def _replica_al_dia(session: Session, lsn: str) -> bool:
+        al_dia = session.execute(
+            text("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)"), {"lsn": lsn}
+        ).scalar()
+        # NULL: el servidor no es standby (pool de solo lectura sobre el primario)
+        return al_dia is None or al_dia
+
+
+def sesion_lectura(session_factory) -> Session:
+    """Sesión de lectura del factory (o una normal si el factory no enruta)."""
+    lectura = getattr(session_factory, "lectura", None)
+    return lectura() if lectura is not None else session_factory()
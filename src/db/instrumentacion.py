@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación de Consultas SQL.
+
+Hooks de eventos del Engine (before/after_cursor_execute) que registran cada
+sentencia con su duración, filas y punto de llamada (primer frame de 'src/'
+fuera de SQLAlchemy). Las sentencias se agrupan por operación lógica: cada
+método público de DbService y cada etapa del ETL abre una con 'operacion()'.
+Las operaciones se anidan (una etapa del ETL contiene llamadas a DbService);
+el detalle queda en la más interna y los totales suman en toda la cadena.
+
+- Sentencia lenta: sobre SQL_LENTA_MS se registra un warning con su origen.
+- N+1: si una misma sentencia (normalizada, sin parámetros) se repite más de
+  SQL_UMBRAL_N_MAS_1 veces en una ejecución de una operación, se avisa una vez.
+- 'exportar(ruta)' escribe lo acumulado en JSON o CSV para analizarlo aparte.
+
+El estado es por proceso; la operación en curso es por hilo (contextvars).
+"""
+import csv
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.config import SQL_LENTA_MS, SQL_UMBRAL_N_MAS_1
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+SIN_OPERACION = "(sin operación)"
+# Raíz del repositorio, para mostrar el origen como ruta relativa
+_RAIZ = str(Path(__file__).resolve().parents[2])
+_ESTE_ARCHIVO = __file__
+
+_PARAMETRO = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_LISTA_PARAMETROS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_FILAS_PARAMETROS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_ESPACIOS = re.compile(r"\s+")
+_CONTROL_TRANSACCION = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def normalizar_sentencia(sql: str) -> str:
+    """Texto de la sentencia sin parámetros: listas IN y VALUES multi-fila de cualquier largo quedan iguales."""
+    sql = _PARAMETRO.sub("?", sql)
+    sql = _LISTA_PARAMETROS.sub("(?)", sql)
+    sql = _FILAS_PARAMETROS.sub("(?)", sql)
+    return _ESPACIOS.sub(" ", sql).strip()
+
+
+def _origen() -> str:
+    """Primer frame del código de la aplicación que llevó a esta sentencia."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if archivo.startswith(_RAIZ) and archivo != _ESTE_ARCHIVO and "site-packages" not in archivo:
+            return f"{archivo[len(_RAIZ) + 1:]}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "?"
+
+
+class _Operacion:
+    """Una ejecución de una operación lógica (p. ej. una llamada a un método de DbService)."""
+    __slots__ = ("nombre", "padre", "sentencias", "segundos", "repeticiones", "avisadas")
+
+    def __init__(self, nombre: str, padre: Optional["_Operacion"]):
+        self.nombre = nombre
+        self.padre = padre
+        self.sentencias = 0
+        self.segundos = 0.0
+        self.repeticiones: Counter = Counter()
+        self.avisadas: set = set()
+
+
+_operacion_actual: ContextVar[Optional[_Operacion]] = ContextVar("operacion_sql", default=None)
+
+
+class InstrumentacionSql:
+    def __init__(self, lenta_ms: float = SQL_LENTA_MS, umbral_n_mas_1: int = SQL_UMBRAL_N_MAS_1):
+        self.lenta_ms = lenta_ms
+        self.umbral_n_mas_1 = umbral_n_mas_1
+        self._lock = threading.Lock()
+        self._operaciones: Dict[str, Dict[str, Any]] = {}
+        self._sentencias: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    # --- Instalación y operaciones ---
+
+    def instalar(self, engine: Engine):
+        if not event.contains(engine, "before_cursor_execute", self._antes):
+            event.listen(engine, "before_cursor_execute", self._antes)
+            event.listen(engine, "after_cursor_execute", self._despues)
+
+    def desinstalar(self, engine: Engine):
+        if event.contains(engine, "before_cursor_execute", self._antes):
+            event.remove(engine, "before_cursor_execute", self._antes)
+            event.remove(engine, "after_cursor_execute", self._despues)
+
+    @contextmanager
+    def operacion(self, nombre: str):
+        """Agrupa bajo 'nombre' las sentencias ejecutadas dentro del bloque (en este hilo)."""
+        actual = _Operacion(nombre, _operacion_actual.get())
+        token = _operacion_actual.set(actual)
+        inicio = time.perf_counter()
+        try:
+            yield actual
+        finally:
+            _operacion_actual.reset(token)
+            self._cerrar(actual, time.perf_counter() - inicio)
+
+    def _cerrar(self, op: _Operacion, duracion: float):
+        with self._lock:
+            datos = self._operaciones.setdefault(op.nombre, {
+                "operacion": op.nombre, "llamadas": 0, "sentencias": 0, "segundos_sql": 0.0,
+                "segundos_total": 0.0, "max_sentencias": 0,
+            })
+            datos["llamadas"] += 1
+            datos["sentencias"] += op.sentencias
+            datos["segundos_sql"] += op.segundos
+            datos["segundos_total"] += duracion
+            datos["max_sentencias"] = max(datos["max_sentencias"], op.sentencias)
+        if op.sentencias:
+            logger.debug(f"SQL [{op.nombre}]: {op.sentencias} sentencias, {op.segundos * 1000:.1f} ms en base.")
+
+    # --- Eventos del Engine ---
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("instrumentacion_inicio", []).append(time.perf_counter())
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("instrumentacion_inicio")
+        if not inicios: return
+        segundos = time.perf_counter() - inicios.pop()
+        filas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else 0
+        sql = normalizar_sentencia(statement)
+        origen = _origen()
+        op = _operacion_actual.get()
+        nombre = op.nombre if op else SIN_OPERACION
+
+        with self._lock:
+            datos = self._sentencias.setdefault((nombre, sql), {
+                "operacion": nombre, "sentencia": sql, "veces": 0, "segundos": 0.0, "max_segundos": 0.0,
+                "filas": 0, "origen": origen,
+            })
+            datos["veces"] += 1
+            datos["segundos"] += segundos
+            datos["max_segundos"] = max(datos["max_segundos"], segundos)
+            datos["filas"] += filas
+
+        if segundos * 1000 >= self.lenta_ms:
+            logger.warning(f"SQL lenta ({segundos * 1000:.0f} ms) en [{nombre}] desde {origen}: {sql[:300]}")
+
+        # El control de transacción suma tiempo (un COMMIT puede costar) pero no cuenta como consulta
+        control = sql.upper().startswith(_CONTROL_TRANSACCION)
+        while op is not None:
+            op.segundos += segundos
+            if control:
+                op = op.padre
+                continue
+            op.sentencias += 1
+            op.repeticiones[sql] += 1
+            if op.repeticiones[sql] > self.umbral_n_mas_1 and sql not in op.avisadas:
+                op.avisadas.add(sql)
+                logger.warning(
+                    f"Posible N+1 en [{op.nombre}]: la misma sentencia ya se ejecutó {op.repeticiones[sql]} veces "
+                    f"(última desde {origen}): {sql[:200]}"
+                )
+            op = op.padre
+
+    # --- Resultados ---
+
+    def resumen_operaciones(self) -> List[Dict[str, Any]]:
+        """Totales por operación, de la que más tiempo pasó en la base a la que menos."""
+        with self._lock:
+            filas = [dict(d) for d in self._operaciones.values()]
+        return sorted(filas, key=lambda d: d["segundos_sql"], reverse=True)
+
+    def resumen_sentencias(self) -> List[Dict[str, Any]]:
+        """Totales por (operación, sentencia normalizada), de la más costosa a la menos."""
+        with self._lock:
+            filas = [dict(d) for d in self._sentencias.values()]
+        return sorted(filas, key=lambda d: d["segundos"], reverse=True)
+
+    def reiniciar(self):
+        with self._lock:
+            self._operaciones.clear()
+            self._sentencias.clear()
+
+    def exportar(self, ruta: Path) -> Path:
+        """Escribe lo acumulado: '.json' con operaciones y sentencias, '.csv' con las sentencias."""
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if ruta.suffix.lower() == ".csv":
+            sentencias = self.resumen_sentencias()
+            with open(ruta, "w", newline="", encoding="utf-8") as f:
+                escritor = csv.DictWriter(f, fieldnames=[
+                    "operacion", "sentencia", "veces", "segundos", "max_segundos", "filas", "origen"
+                ])
+                escritor.writeheader()
+                escritor.writerows(sentencias)
+        else:
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump({
+                    "operaciones": self.resumen_operaciones(), "sentencias": self.resumen_sentencias()
+                }, f, ensure_ascii=False, indent=2)
+        return ruta
+
+
+# Instancia del proceso: session.py la instala en el Engine de la aplicación
+instrumentacion = InstrumentacionSql()
+operacion = instrumentacion.operacion
+
+
+def instrumentar_metodos(prefijo: str):
+    """Decorador de clase: cada método público corre dentro de operacion('<prefijo>.<método>')."""
+    def decorar(cls):
+        for nombre, metodo in list(vars(cls).items()):
+            if nombre.startswith("_") or not callable(metodo):
+                continue
+            setattr(cls, nombre, _en_operacion(f"{prefijo}.{nombre}", metodo))
+        return cls
+    return decorar
+
+
+def _en_operacion(nombre: str, metodo):
+    @wraps(metodo)
+    def envoltura(*args, **kwargs):
+        with operacion(nombre):
+            return metodo(*args, **kwargs)
+    return envoltura
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Perfiles de Carga (loader strategies) por caso de uso.
+
+Las relaciones de los modelos no se cargan solas (CARGA_POR_DEFECTO =
+'raise_on_sql'): cada consulta que trae entidades ORM aplica uno de estos
+perfiles con '.options(*PERFIL_...)'. Todo lo que el perfil no nombra queda en
+raiseload, así un acceso no previsto falla en vez de disparar una consulta
+por fila (N+1).
+
+- LISTADO: solo columnas de la compra. Las pestañas usan proyecciones; este
+  perfil es para listas de entidades sin relaciones.
+- DETALLE: una compra con organismo, sector y seguimiento (JOIN, una fila).
+- ETL: compras a re-puntuar; el organismo se trae con selectinload (una
+  consulta IN para todo el lote, sin multiplicar filas).
+- EXPORTACION: grafo completo por lotes (selectinload) para volcados.
+- REGLAS: reglas de organismo sin el organismo (el motor usa organismo_id).
+"""
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from src.db.db_models import CaLicitacion, CaOrganismo, CaOrganismoRegla
+
+PERFIL_LISTADO = (raiseload("*"),)
+
+PERFIL_DETALLE = (
+    joinedload(CaLicitacion.organismo).joinedload(CaOrganismo.sector),
+    joinedload(CaLicitacion.seguimiento),
+    raiseload("*"),
+)
+
+PERFIL_ETL = (
+    selectinload(CaLicitacion.organismo).raiseload("*"),
+    raiseload("*"),
+)
+
+PERFIL_EXPORTACION = (
+    selectinload(CaLicitacion.organismo).selectinload(CaOrganismo.sector),
+    selectinload(CaLicitacion.seguimiento),
+    raiseload("*"),
+)
+
+PERFIL_REGLAS = (raiseload(CaOrganismoRegla.organismo),)
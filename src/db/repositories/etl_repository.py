@@ -1,105 +1,364 @@
+import csv
+import io
 from typing import List, Dict, Tuple, Optional, Set
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import select, or_, update, func, bindparam, and_, not_
-from sqlalchemy.dialects.postgresql import insert
-from src.db.db_models import CaLicitacion, CaOrganismo, CaSector, CaSeguimiento
+from sqlalchemy import select, or_, update, func, bindparam
+from src.db.db_models import (
+    CaLicitacion, CaOrganismo, CaSeguimiento,
+    derivar_estado_codigo, fecha_de, fecha_hora_de, mes_particion_de,
+    filtro_estado_abierto, filtro_pendiente_fase_2, filtro_seguimiento_marcado
+)
+from src.db.cache_organismos import CacheOrganismos, SQL_SECTOR_POR_DEFECTO
+from src.db.dialecto import es_postgres, insert_upsert, soporta_upsert
+from src.db.perfiles_carga import PERFIL_ETL
+from src.db.repositories.particion_repository import ParticionRepository
+from src.db.repositories.producto_repository import ProductoRepository
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+from src.utils.huellas import huella_ficha
 from src.utils.logger import configurar_logger
 
 logger = configurar_logger(__name__)
 
+# Columnas que un re-barrido del listado puede modificar
+COLUMNAS_ACTUALIZABLES = [
+    "proveedores_cotizando", "estado_ca_texto", "fecha_cierre",
+    "estado_convocatoria", "estado_codigo", "monto_clp",
+]
+
+# Bajo este volumen un INSERT multi-fila es más barato que crear la tabla staging
+FILAS_MINIMAS_COPY = 500
+TAMANO_LOTE_UPSERT = 1000
+
+# --- Carga masiva vía COPY (solo PostgreSQL) ---
+COLUMNAS_STAGING = [
+    ("codigo_ca", "varchar(50)"),
+    ("nombre", "varchar(1000)"),
+    ("monto_clp", "double precision"),
+    ("fecha_publicacion", "date"),
+    ("mes_particion", "date"),
+    ("fecha_cierre", "timestamptz"),
+    ("proveedores_cotizando", "integer"),
+    ("estado_ca_texto", "varchar(255)"),
+    ("estado_convocatoria", "integer"),
+    ("estado_codigo", "smallint"),
+    ("organismo_nombre", "varchar(1000)"),
+]
+NULO_COPY = r"\N"
+
+SQL_CREAR_STAGING = (
+    "CREATE TEMP TABLE IF NOT EXISTS tmp_ca_listado ("
+    + ", ".join(f"{col} {tipo}" for col, tipo in COLUMNAS_STAGING)
+    + ") ON COMMIT DROP"
+)
+SQL_COPY_STAGING = (
+    f"COPY tmp_ca_listado ({', '.join(col for col, _ in COLUMNAS_STAGING)}) "
+    f"FROM STDIN WITH (FORMAT csv, NULL '{NULO_COPY}')"
+)
+SQL_ORGANISMOS_DESDE_STAGING = """
+INSERT INTO ca_organismo (nombre, sector_id, es_nuevo)
+SELECT DISTINCT s.organismo_nombre, (SELECT min(sector_id) FROM ca_sector), true
+FROM tmp_ca_listado s
+WHERE s.organismo_nombre IS NOT NULL
+ON CONFLICT (nombre) DO NOTHING
+"""
+# Los CTE de una misma sentencia ven la tabla antes del INSERT: 'previas' distingue
+# insertadas de modificadas (xmax no se puede leer en tablas particionadas) y
+# aporta el mes_particion ya guardado, que es el que usa la llave del conflicto
+# (la fila pudo quedar fijada o publicarse sin fecha en otro mes).
+SQL_MERGE_STAGING = f"""
+WITH previas AS (
+    SELECT l.codigo_ca, l.mes_particion FROM ca_licitacion l JOIN tmp_ca_listado s ON s.codigo_ca = l.codigo_ca
+), escritas AS (
+    INSERT INTO ca_licitacion (
+        codigo_ca, nombre, monto_clp, fecha_publicacion, mes_particion, fecha_cierre, proveedores_cotizando,
+        estado_ca_texto, estado_convocatoria, estado_codigo, organismo_id, puntuacion_final
+    )
+    SELECT s.codigo_ca, s.nombre, s.monto_clp, s.fecha_publicacion, coalesce(p.mes_particion, s.mes_particion),
+           s.fecha_cierre, s.proveedores_cotizando, s.estado_ca_texto, s.estado_convocatoria, s.estado_codigo,
+           o.organismo_id, 0
+    FROM tmp_ca_listado s
+    LEFT JOIN previas p ON p.codigo_ca = s.codigo_ca
+    LEFT JOIN ca_organismo o ON o.nombre = s.organismo_nombre
+    ON CONFLICT (codigo_ca, mes_particion) DO UPDATE SET
+        {", ".join(f"{col} = EXCLUDED.{col}" for col in COLUMNAS_ACTUALIZABLES)}
+    WHERE {" OR ".join(f"ca_licitacion.{col} IS DISTINCT FROM EXCLUDED.{col}" for col in COLUMNAS_ACTUALIZABLES)}
+    RETURNING codigo_ca
+)
+SELECT e.codigo_ca, p.codigo_ca IS NULL AS insertado
+FROM escritas e LEFT JOIN previas p ON p.codigo_ca = e.codigo_ca
+"""
+
+
+def _resultado_upsert(insertados: Set[str], modificados: Set[str], sin_cambios: Set[str]) -> Dict[str, Set[str]]:
+    return {"insertados": insertados, "modificados": modificados, "sin_cambios": sin_cambios}
+
 class EtlRepository:
     def __init__(self, session_factory: sessionmaker[Session]):
         self.session_factory = session_factory
+        self.particiones = ParticionRepository(session_factory)
+        # nombre -> organismo_id en memoria: el upsert del listado no consulta ca_organismo en régimen
+        self.organismos = CacheOrganismos()
+
+    def precargar_organismos(self) -> int:
+        """Llena la caché de organismos (al iniciar la app, en segundo plano)."""
+        with self.session_factory() as session:
+            return self.organismos.precargar(session)
 
     def _asegurar_organismos_existen(self, session: Session, nombres_organismos: Set[str]) -> Dict[str, int]:
-        if not nombres_organismos: return {}
-        nombres_norm = {n.strip() for n in nombres_organismos if n}
-        
-        stmt = select(CaOrganismo.nombre, CaOrganismo.organismo_id).where(CaOrganismo.nombre.in_(nombres_norm))
-        existentes = {nombre: oid for nombre, oid in session.execute(stmt).all()}
-        
-        faltantes = nombres_norm - set(existentes.keys())
-        if faltantes:
-            sector_default = session.scalars(select(CaSector).limit(1)).first()
-            if not sector_default:
-                sector_default = CaSector(nombre="General")
-                session.add(sector_default)
-                session.flush()
-            
-            nuevos_orgs = [{"nombre": nombre, "sector_id": sector_default.sector_id, "es_nuevo": True} for nombre in faltantes]
-            session.execute(insert(CaOrganismo), nuevos_orgs)
-            
-            stmt_nuevos = select(CaOrganismo.nombre, CaOrganismo.organismo_id).where(CaOrganismo.nombre.in_(faltantes))
-            for nombre, oid in session.execute(stmt_nuevos).all():
-                existentes[nombre] = oid
-        return existentes
-
-    def insertar_o_actualizar_masivo(self, compras: List[Dict]):
-        if not compras: return
+        return self.organismos.resolver(session, nombres_organismos)
+
+    def _preparar_registros(self, compras: List[Dict]) -> List[Dict]:
+        """Convierte el listado del scraper en filas de ca_licitacion (sin duplicados)."""
+        registros = []
+        codigos_vistos = set()
+        for item in compras:
+            codigo = item.get("codigo", item.get("id"))
+            if not codigo or codigo in codigos_vistos: continue
+            codigos_vistos.add(codigo)
+
+            # La API entrega las fechas como texto ISO; SQLite solo acepta date/datetime
+            fecha_publicacion = fecha_de(item.get("fecha_publicacion"))
+            registros.append({
+                "codigo_ca": codigo,
+                "nombre": item.get("nombre"),
+                "monto_clp": item.get("monto_disponible_CLP"),
+                "fecha_publicacion": fecha_publicacion,
+                "mes_particion": mes_particion_de(fecha_publicacion),
+                "fecha_cierre": fecha_hora_de(item.get("fecha_cierre")),
+                "proveedores_cotizando": item.get("cantidad_provedores_cotizando"),
+                "estado_ca_texto": item.get("estado"),
+                "estado_convocatoria": item.get("estado_convocatoria"),
+                "estado_codigo": int(derivar_estado_codigo(item.get("estado"), item.get("estado_convocatoria"))),
+                "organismo_nombre": (item.get("organismo") or "No Especificado").strip(),
+            })
+        return registros
+
+    def insertar_o_actualizar_masivo(self, compras: List[Dict]) -> Dict[str, Set[str]]:
+        """
+        Upsert del listado (Fase 1). Elige la estrategia según motor y volumen:
+        COPY a tabla staging en barridos grandes de PostgreSQL, INSERT ... ON CONFLICT
+        multi-fila en lotes chicos y en SQLite, y executemany por lotes en otros motores.
+
+        Solo reescribe filas cuyos valores cambiaron y retorna los códigos agrupados
+        en 'insertados', 'modificados' y 'sin_cambios'.
+        """
+        registros = self._preparar_registros(compras or [])
+        if not registros: return _resultado_upsert(set(), set(), set())
         with self.session_factory() as session:
             try:
-                nombres_orgs = {c.get("organismo", "No Especificado") for c in compras}
-                mapa_orgs = self._asegurar_organismos_existen(session, nombres_orgs)
-                
-                data_to_upsert = []
-                codigos_vistos = set()
-                
-                for item in compras:
-                    codigo = item.get("codigo", item.get("id"))
-                    if not codigo or codigo in codigos_vistos: continue
-                    codigos_vistos.add(codigo)
-                    
-                    org_nombre = (item.get("organismo") or "No Especificado").strip()
-                    
-                    record = {
-                        "codigo_ca": codigo,
-                        "nombre": item.get("nombre"),
-                        "monto_clp": item.get("monto_disponible_CLP"),
-                        "fecha_publicacion": item.get("fecha_publicacion"),
-                        "fecha_cierre": item.get("fecha_cierre"),
-                        "proveedores_cotizando": item.get("cantidad_provedores_cotizando"),
-                        "estado_ca_texto": item.get("estado"),
-                        "estado_convocatoria": item.get("estado_convocatoria"),
-                        "organismo_id": mapa_orgs.get(org_nombre),
-                    }
-                    data_to_upsert.append(record)
-                
-                if data_to_upsert:
-                    stmt = insert(CaLicitacion).values(data_to_upsert)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=['codigo_ca'],
-                        set_={
-                            "proveedores_cotizando": stmt.excluded.proveedores_cotizando,
-                            "estado_ca_texto": stmt.excluded.estado_ca_texto, 
-                            "fecha_cierre": stmt.excluded.fecha_cierre,       
-                            "estado_convocatoria": stmt.excluded.estado_convocatoria,
-                            "monto_clp": stmt.excluded.monto_clp
-                        }
-                    )
-                    session.execute(stmt)
-                    session.commit()
+                if es_postgres(session):
+                    self.particiones.asegurar_particiones(session, {r["mes_particion"] for r in registros})
+                    if len(registros) >= FILAS_MINIMAS_COPY and self._soporta_copy(session):
+                        insertados, modificados = self._upsert_via_copy(session, registros)
+                    else:
+                        insertados, modificados = self._upsert_on_conflict(session, registros)
+                elif soporta_upsert(session):
+                    # SQLite embebido: la única llave es codigo_ca (sin particiones)
+                    insertados, modificados = self._upsert_on_conflict(session, registros, llave=("codigo_ca",))
+                else:
+                    insertados, modificados = self._upsert_generico(session, registros)
+                VistaTrabajoRepository.refrescar(session, codigos=insertados | modificados)
+                session.commit()
             except Exception as e:
                 session.rollback()
+                # Un id en caché pudo quedar obsoleto (p. ej. FK rota): el próximo intento relee
+                self.organismos.invalidar()
                 raise e
 
+        sin_cambios = {r["codigo_ca"] for r in registros} - insertados - modificados
+        logger.info(f"Upsert listado: {len(insertados)} nuevas, {len(modificados)} modificadas, {len(sin_cambios)} sin cambios.")
+        return _resultado_upsert(insertados, modificados, sin_cambios)
+
+    def _filas_con_organismo(self, session: Session, registros: List[Dict]) -> List[Dict]:
+        mapa_orgs = self._asegurar_organismos_existen(session, {r["organismo_nombre"] for r in registros})
+        filas = []
+        for r in registros:
+            fila = {k: v for k, v in r.items() if k != "organismo_nombre"}
+            fila["organismo_id"] = mapa_orgs.get(r["organismo_nombre"])
+            filas.append(fila)
+        return filas
+
+    def _upsert_on_conflict(self, session: Session, registros: List[Dict],
+                            llave: Tuple[str, ...] = ("codigo_ca", "mes_particion")) -> Tuple[Set[str], Set[str]]:
+        filas = self._filas_con_organismo(session, registros)
+        tabla = CaLicitacion.__table__
+        insertados, modificados = set(), set()
+        for inicio in range(0, len(filas), TAMANO_LOTE_UPSERT):
+            lote = filas[inicio:inicio + TAMANO_LOTE_UPSERT]
+            # Sin xmax (no disponible en tablas particionadas) lo previo se consulta antes,
+            # con su mes_particion guardado: la llave del conflicto es la de la fila existente
+            previas = dict(session.execute(
+                select(tabla.c.codigo_ca, tabla.c.mes_particion).where(tabla.c.codigo_ca.in_([f["codigo_ca"] for f in lote]))
+            ).all())
+            for fila in lote:
+                if fila["codigo_ca"] in previas:
+                    fila["mes_particion"] = previas[fila["codigo_ca"]]
+            stmt = insert_upsert(session, tabla).values(lote)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(llave),
+                set_={col: stmt.excluded[col] for col in COLUMNAS_ACTUALIZABLES},
+                # Sin cambios reales no se toca la fila (evita tuplas muertas y WAL)
+                where=or_(*[tabla.c[col].is_distinct_from(stmt.excluded[col]) for col in COLUMNAS_ACTUALIZABLES])
+            ).returning(tabla.c.codigo_ca)
+            for codigo in session.scalars(stmt):
+                (modificados if codigo in previas else insertados).add(codigo)
+        return insertados, modificados
+
+    def _upsert_generico(self, session: Session, registros: List[Dict]) -> Tuple[Set[str], Set[str]]:
+        """Fallback portable: compara contra lo guardado por lote y usa executemany para insertar/actualizar."""
+        filas = self._filas_con_organismo(session, registros)
+        tabla = CaLicitacion.__table__
+        conexion = session.connection()
+        stmt_update = update(tabla).where(
+            tabla.c.codigo_ca == bindparam("b_codigo_ca")
+        ).values({col: bindparam(f"b_{col}") for col in COLUMNAS_ACTUALIZABLES})
+        insertados, modificados = set(), set()
+
+        for inicio in range(0, len(filas), TAMANO_LOTE_UPSERT):
+            lote = filas[inicio:inicio + TAMANO_LOTE_UPSERT]
+            guardadas = {
+                fila.codigo_ca: fila for fila in conexion.execute(
+                    select(tabla.c.codigo_ca, *[tabla.c[col] for col in COLUMNAS_ACTUALIZABLES])
+                    .where(tabla.c.codigo_ca.in_([f["codigo_ca"] for f in lote]))
+                )
+            }
+
+            nuevas = [f for f in lote if f["codigo_ca"] not in guardadas]
+            if nuevas:
+                conexion.execute(tabla.insert(), nuevas)
+                insertados.update(f["codigo_ca"] for f in nuevas)
+
+            cambios = [
+                f for f in lote if f["codigo_ca"] in guardadas
+                and any(getattr(guardadas[f["codigo_ca"]], col) != f[col] for col in COLUMNAS_ACTUALIZABLES)
+            ]
+            if cambios:
+                conexion.execute(stmt_update, [
+                    {"b_codigo_ca": f["codigo_ca"], **{f"b_{col}": f[col] for col in COLUMNAS_ACTUALIZABLES}}
+                    for f in cambios
+                ])
+                modificados.update(f["codigo_ca"] for f in cambios)
+        return insertados, modificados
+
+    @staticmethod
+    def _soporta_copy(session: Session) -> bool:
+        # COPY FROM STDIN vía cursor.copy_expert (psycopg2)
+        return session.get_bind().dialect.driver == "psycopg2"
+
+    @staticmethod
+    def _valor_copy(valor):
+        if valor is None: return NULO_COPY
+        if isinstance(valor, (date, datetime)): return valor.isoformat()
+        return valor
+
+    def _upsert_via_copy(self, session: Session, registros: List[Dict]) -> Tuple[Set[str], Set[str]]:
+        """
+        Carga masiva para PostgreSQL: COPY a una tabla temporal y merge set-based.
+        Los organismos nuevos se crean con un único INSERT ... SELECT en la misma transacción.
+        """
+        conexion = session.connection()
+        conexion.exec_driver_sql(SQL_CREAR_STAGING)
+
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for r in registros:
+            escritor.writerow([self._valor_copy(r[col]) for col, _ in COLUMNAS_STAGING])
+        buffer.seek(0)
+
+        cursor = conexion.connection.cursor()
+        try:
+            cursor.copy_expert(SQL_COPY_STAGING, buffer)
+        finally:
+            cursor.close()
+
+        conexion.exec_driver_sql(SQL_SECTOR_POR_DEFECTO)
+        conexion.exec_driver_sql(SQL_ORGANISMOS_DESDE_STAGING)
+        insertados, modificados = set(), set()
+        for codigo, insertado in conexion.exec_driver_sql(SQL_MERGE_STAGING):
+            (insertados if insertado else modificados).add(codigo)
+        logger.info(f"Carga masiva vía COPY: {len(registros)} registros.")
+        return insertados, modificados
+
     def actualizar_fase_2_detalle(self, codigo_ca: str, datos_fase_2: Dict, puntuacion_total: int, detalle_completo: List[str]):
+        self.actualizar_fase_2_lote([{
+            "codigo_ca": codigo_ca, "datos_fase_2": datos_fase_2,
+            "puntuacion_total": puntuacion_total, "detalle_completo": detalle_completo,
+        }])
+
+    def obtener_huellas_ficha(self, codigos: List[str]) -> Dict[str, Optional[str]]:
+        """Huella de la ficha guardada por código (None si nunca se descargó)."""
+        huellas = {}
+        with self.session_factory() as session:
+            for inicio in range(0, len(codigos), TAMANO_LOTE_UPSERT):
+                stmt = select(CaLicitacion.codigo_ca, CaLicitacion.huella_ficha).where(
+                    CaLicitacion.codigo_ca.in_(codigos[inicio:inicio + TAMANO_LOTE_UPSERT])
+                )
+                huellas.update((codigo, huella) for codigo, huella in session.execute(stmt))
+        return huellas
+
+    def actualizar_fase_2_lote(self, fichas: List[Dict]) -> int:
+        """
+        Guarda varias fichas (Fase 2) en una transacción con un UPDATE Core ejecutado
+        en modo executemany. Cada elemento trae 'codigo_ca', 'datos_fase_2',
+        'puntuacion_total', 'detalle_completo' y opcionalmente 'huella'.
+        Retorna la cantidad de fichas escritas.
+        """
+        if not fichas: return 0
+        tabla = CaLicitacion.__table__
+        stmt = update(tabla).where(tabla.c.codigo_ca == bindparam("b_codigo_ca")).values(
+            descripcion=bindparam("b_descripcion"),
+            productos_solicitados=bindparam("b_productos"),
+            direccion_entrega=bindparam("b_direccion"),
+            plazo_entrega=bindparam("b_plazo"),
+            fecha_cierre_segundo_llamado=bindparam("b_cierre_p2"),
+            estado_ca_texto=bindparam("b_estado"),
+            estado_convocatoria=bindparam("b_convocatoria"),
+            estado_codigo=bindparam("b_estado_codigo"),
+            puntuacion_final=bindparam("b_puntuacion"),
+            puntaje_detalle=bindparam("b_detalle"),
+            huella_ficha=bindparam("b_huella"),
+        )
+
         with self.session_factory() as session:
             try:
-                lic = session.scalars(select(CaLicitacion).where(CaLicitacion.codigo_ca == codigo_ca)).first()
-                if not lic: return
-                
-                lic.descripcion = datos_fase_2.get("descripcion")
-                lic.productos_solicitados = datos_fase_2.get("productos_solicitados")
-                lic.direccion_entrega = datos_fase_2.get("direccion_entrega")
-                lic.puntuacion_final = puntuacion_total
-                lic.plazo_entrega = datos_fase_2.get("plazo_entrega")
-                lic.puntaje_detalle = detalle_completo 
-                lic.fecha_cierre_segundo_llamado = datos_fase_2.get("fecha_cierre_p2")
-                if datos_fase_2.get("estado"): lic.estado_ca_texto = datos_fase_2.get("estado")
-                if datos_fase_2.get("estado_convocatoria") is not None: lic.estado_convocatoria = datos_fase_2.get("estado_convocatoria")
-                
+                # Estado actual: la ficha puede no traer estado y se conserva el guardado
+                estados = {
+                    fila.codigo_ca: fila for fila in session.execute(
+                        select(CaLicitacion.ca_id, CaLicitacion.codigo_ca, CaLicitacion.estado_ca_texto,
+                               CaLicitacion.estado_convocatoria)
+                        .where(CaLicitacion.codigo_ca.in_([f["codigo_ca"] for f in fichas]))
+                    )
+                }
+                parametros, productos_por_ca = [], {}
+                for ficha in fichas:
+                    actual = estados.get(ficha["codigo_ca"])
+                    if actual is None: continue
+                    datos = ficha["datos_fase_2"]
+                    estado = datos.get("estado") or actual.estado_ca_texto
+                    convocatoria = datos.get("estado_convocatoria")
+                    if convocatoria is None: convocatoria = actual.estado_convocatoria
+                    parametros.append({
+                        "b_codigo_ca": ficha["codigo_ca"],
+                        "b_descripcion": datos.get("descripcion"),
+                        "b_productos": datos.get("productos_solicitados"),
+                        "b_direccion": datos.get("direccion_entrega"),
+                        "b_plazo": datos.get("plazo_entrega"),
+                        "b_cierre_p2": datos.get("fecha_cierre_p2"),
+                        "b_estado": estado,
+                        "b_convocatoria": convocatoria,
+                        "b_estado_codigo": int(derivar_estado_codigo(estado, convocatoria)),
+                        "b_puntuacion": ficha["puntuacion_total"],
+                        "b_detalle": ficha["detalle_completo"],
+                        "b_huella": ficha.get("huella") or huella_ficha(datos),
+                    })
+                    productos_por_ca[actual.ca_id] = datos.get("productos_solicitados")
+                if parametros:
+                    session.connection().execute(stmt, parametros)
+                    ProductoRepository.reemplazar_lineas(session, productos_por_ca)
+                    VistaTrabajoRepository.refrescar(session, codigos=[p["b_codigo_ca"] for p in parametros])
                 session.commit()
+                return len(parametros)
             except Exception:
                 session.rollback()
                 raise
@@ -112,58 +371,48 @@ class EtlRepository:
         with self.session_factory() as session:
             try:
                 session.connection().execute(stmt, datos_para_update)
+                VistaTrabajoRepository.refrescar(session, ca_ids=[d["b_ca_id"] for d in datos_para_update])
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
 
-    def obtener_datos_recalculo(self) -> List[Dict]:
+    def obtener_datos_recalculo(self, codigos: Optional[Set[str]] = None) -> List[Dict]:
+        """
+        Datos para puntuar. Con 'codigos' se limita a esas compras (ej: las que cambiaron en el upsert).
+        Los productos salen ya normalizados de ca_producto ('lineas_producto'), sin leer el JSON.
+        """
         with self.session_factory() as session:
             stmt = select(
                 CaLicitacion.ca_id, CaLicitacion.codigo_ca, CaLicitacion.nombre, CaLicitacion.estado_ca_texto, 
-                CaLicitacion.descripcion, CaLicitacion.productos_solicitados, CaLicitacion.puntuacion_final, 
+                CaLicitacion.descripcion, CaLicitacion.puntuacion_final, 
                 CaOrganismo.nombre.label("organismo_nombre")
             ).outerjoin(CaOrganismo, CaLicitacion.organismo_id == CaOrganismo.organismo_id)
-            rows = session.execute(stmt).all()
+            if codigos is None:
+                rows = session.execute(stmt).all()
+            else:
+                lista = list(codigos)
+                rows = []
+                for inicio in range(0, len(lista), TAMANO_LOTE_UPSERT):
+                    rows.extend(session.execute(stmt.where(CaLicitacion.codigo_ca.in_(lista[inicio:inicio + TAMANO_LOTE_UPSERT]))).all())
+            lineas = ProductoRepository.lineas_por_compra(session, None if codigos is None else [r.ca_id for r in rows])
             return [{
                 "ca_id": r.ca_id, "codigo_ca": r.codigo_ca, "nombre": r.nombre, "estado_ca_texto": r.estado_ca_texto, 
                 "organismo_nombre": r.organismo_nombre or "", "descripcion": r.descripcion, 
-                "productos_solicitados": r.productos_solicitados, "puntuacion_final_actual": r.puntuacion_final or 0 
+                "lineas_producto": lineas.get(r.ca_id, []), "puntuacion_final_actual": r.puntuacion_final or 0 
             } for r in rows]
 
     def obtener_candidatas_fase_2(self, umbral: int) -> List[CaLicitacion]:
         with self.session_factory() as session:
-            stmt = select(CaLicitacion).filter(CaLicitacion.puntuacion_final >= umbral, CaLicitacion.descripcion.is_(None)).order_by(CaLicitacion.fecha_cierre.asc())
+            stmt = select(CaLicitacion).options(*PERFIL_ETL).filter(
+                filtro_pendiente_fase_2(umbral)
+            ).order_by(CaLicitacion.fecha_cierre.asc())
             return session.scalars(stmt).all()
 
     def obtener_rango_fechas_activas(self) -> Tuple[Optional[datetime], Optional[datetime]]:
         with self.session_factory() as session:
-            subq = select(CaSeguimiento.ca_id).where(or_(CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == True, CaSeguimiento.es_oculta == True))
+            subq = select(CaSeguimiento.ca_id).where(filtro_seguimiento_marcado())
             stmt = select(func.min(CaLicitacion.fecha_publicacion), func.max(CaLicitacion.fecha_publicacion)).filter(
-                CaLicitacion.ca_id.notin_(subq), or_(CaLicitacion.estado_ca_texto.ilike('%Publicada%'), CaLicitacion.estado_ca_texto.ilike('%Segundo%'))
+                CaLicitacion.ca_id.notin_(subq), filtro_estado_abierto()
             )
             return session.execute(stmt).first()
-
-    def limpiar_registros_antiguos(self) -> int:
-        with self.session_factory() as session:
-            fecha_corte = date.today() - timedelta(days=30)
-            criterios = and_(
-                not_(CaLicitacion.estado_ca_texto.ilike("%Publicada%")),
-                or_(and_(CaLicitacion.fecha_cierre_segundo_llamado.isnot(None), CaLicitacion.fecha_cierre_segundo_llamado < fecha_corte),
-                    and_(CaLicitacion.fecha_cierre_segundo_llamado.is_(None), CaLicitacion.fecha_cierre < fecha_corte)),
-                ~CaLicitacion.seguimiento.has(CaSeguimiento.es_favorito == True),
-                ~CaLicitacion.seguimiento.has(CaSeguimiento.es_ofertada == True)
-            )
-            eliminadas = session.query(CaLicitacion).filter(criterios).delete(synchronize_session=False)
-            if eliminadas > 0: session.commit()
-            return eliminadas
-
-    def cerrar_vencidas_localmente(self) -> int:
-        with self.session_factory() as session:
-            fecha_limite = date.today() - timedelta(days=14)
-            filtro = or_(and_(CaLicitacion.fecha_cierre_segundo_llamado.isnot(None), CaLicitacion.fecha_cierre_segundo_llamado < fecha_limite),
-                         and_(CaLicitacion.fecha_cierre_segundo_llamado.is_(None), CaLicitacion.fecha_cierre < fecha_limite))
-            registros = session.query(CaLicitacion).filter(CaLicitacion.estado_ca_texto.ilike("%Publicada%"), filtro).all()
-            for lic in registros: lic.estado_ca_texto = "Cerrada (Vencida Local)"
-            if registros: session.commit()
-            return len(registros)
\ No newline at end of file
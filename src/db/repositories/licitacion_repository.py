@@ -1,59 +1,385 @@
-from typing import List, Optional
-from sqlalchemy.orm import sessionmaker, Session, joinedload
-from sqlalchemy import select, or_
-from src.db.db_models import CaLicitacion, CaSeguimiento, CaOrganismo
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, func, and_, or_, text, cast, case, exists, literal, literal_column, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import RowMapping
+from src.db.db_models import (
+    CaLicitacion, CaSeguimiento, CaOrganismo, CaVistaTrabajo,
+    filtro_estado_abierto, filtro_seguimiento_marcado, filtro_seguimiento_favorito, filtro_seguimiento_ofertado,
+    filtro_vista_candidata, filtro_vista_seguimiento, filtro_vista_ofertada
+)
+from src.db.perfiles_carga import PERFIL_DETALLE, PERFIL_ETL, PERFIL_EXPORTACION
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+from src.db.dialecto import es_postgres, escapar_like, insert_upsert
+from src.db.enrutador_sesiones import sesion_lectura
+from src.db.ddl_postgres import CONFIG_BUSQUEDA, busqueda_disponible
 from src.utils.logger import configurar_logger
 
 logger = configurar_logger(__name__)
 
+# Columnas que muestra LicitacionesTable. Las pesadas (descripción, productos,
+# dirección) solo se leen al exportar o al abrir el detalle.
+COLUMNAS_LISTADO = (
+    CaLicitacion.ca_id, CaLicitacion.codigo_ca, CaLicitacion.nombre, CaLicitacion.estado_ca_texto,
+    CaLicitacion.puntuacion_final, CaLicitacion.puntaje_detalle,
+    CaLicitacion.fecha_publicacion, CaLicitacion.fecha_cierre, CaLicitacion.fecha_cierre_segundo_llamado,
+    CaLicitacion.proveedores_cotizando, CaLicitacion.monto_clp,
+    func.coalesce(CaOrganismo.nombre, "N/A").label("organismo_nombre"),
+    func.coalesce(CaSeguimiento.es_favorito, False).label("es_favorito"),
+    func.coalesce(CaSeguimiento.es_ofertada, False).label("es_ofertada"),
+    and_(CaSeguimiento.notas.isnot(None), func.trim(CaSeguimiento.notas) != "").label("tiene_nota"),
+)
+COLUMNAS_DETALLE = (CaLicitacion.descripcion, CaLicitacion.direccion_entrega, CaLicitacion.productos_solicitados)
+
+
+def _select_listado(con_detalle: bool = False):
+    columnas = COLUMNAS_LISTADO + (COLUMNAS_DETALLE if con_detalle else ())
+    return select(*columnas).outerjoin(
+        CaOrganismo, CaLicitacion.organismo_id == CaOrganismo.organismo_id
+    ).outerjoin(CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id)
+
+
+def _filtro_vista(vista: str, umbral_minimo: int = 5):
+    if vista == "candidatas":
+        subq = select(CaSeguimiento.ca_id).where(filtro_seguimiento_marcado())
+        return and_(CaLicitacion.puntuacion_final >= umbral_minimo, CaLicitacion.ca_id.notin_(subq), filtro_estado_abierto())
+    if vista == "seguimiento":
+        return filtro_seguimiento_favorito()
+    if vista == "ofertadas":
+        return filtro_seguimiento_ofertado()
+    raise ValueError(f"Vista desconocida: {vista}")
+
+
+# --- Paginación por keyset ---
+# Cada orden termina en ca_id para que el cursor (valor, ca_id) sea único. El de
+# puntaje coincide con el índice parcial ix_ca_licitacion_abiertas_puntaje.
+ORDEN_POR_VISTA = {"candidatas": "puntaje", "seguimiento": "cierre", "ofertadas": "cierre"}
+TAMANO_PAGINA = 200
+# Compras por sentencia en las marcas en lote (límite de parámetros de SQLite)
+TAMANO_LOTE_SEGUIMIENTO = 500
+
+
+def _orden(orden: str, t=CaLicitacion):
+    """'t' es la entidad consultada: CaLicitacion o el read model CaVistaTrabajo (mismas columnas de orden)."""
+    if orden == "puntaje":
+        return (t.puntuacion_final.desc(), t.ca_id)
+    if orden == "cierre":
+        return (t.fecha_cierre.asc().nulls_last(), t.ca_id)
+    raise ValueError(f"Orden desconocido: {orden}")
+
+
+def _despues_de(orden: str, cursor: Tuple[Any, int], t=CaLicitacion):
+    """Predicado keyset: filas estrictamente posteriores a 'cursor' en el orden dado."""
+    valor, ca_id = cursor
+    if orden == "puntaje":
+        return or_(t.puntuacion_final < valor, and_(t.puntuacion_final == valor, t.ca_id > ca_id))
+    # Fechas nulas al final: tras un cursor nulo solo quedan nulas con mayor id
+    if valor is None:
+        return and_(t.fecha_cierre.is_(None), t.ca_id > ca_id)
+    return or_(t.fecha_cierre > valor, and_(t.fecha_cierre == valor, t.ca_id > ca_id), t.fecha_cierre.is_(None))
+
+
+def _filtro_vista_trabajo(vista: str, umbral_minimo: int = 5):
+    if vista == "candidatas":
+        return and_(filtro_vista_candidata(), CaVistaTrabajo.puntuacion_final >= umbral_minimo)
+    if vista == "seguimiento":
+        return filtro_vista_seguimiento()
+    if vista == "ofertadas":
+        return filtro_vista_ofertada()
+    raise ValueError(f"Vista desconocida: {vista}")
+
+
+def _select_vista_trabajo(vista: str, umbral_minimo: int = 5):
+    """Filas livianas de una pestaña leídas del read model (sin joins)."""
+    return select(*[CaVistaTrabajo.__table__.c[c.key] for c in COLUMNAS_LISTADO]).where(
+        _filtro_vista_trabajo(vista, umbral_minimo)
+    )
+
+
+def _elementos_productos(postgres: bool):
+    """Cada producto de productos_solicitados como fila (tabla correlacionada con ca_licitacion)."""
+    if postgres:
+        # Un JSON 'null' o escalar no es arreglo: jsonb_array_elements fallaría
+        productos = cast(CaLicitacion.productos_solicitados, JSONB)
+        arreglo = case((func.jsonb_typeof(productos) == "array", productos), else_=cast(literal("[]"), JSONB))
+        return func.jsonb_array_elements(arreglo).table_valued("value").alias("producto")
+    return func.json_each(CaLicitacion.productos_solicitados).table_valued("value").alias("producto")
+
+
+def _campo_producto(producto, clave: str, postgres: bool):
+    if postgres:
+        return producto.c.value.op("->>", return_type=String)(clave)
+    return func.json_extract(producto.c.value, f"$.{clave}")
+
+
+def _pagina(filas: List[RowMapping], tamano: int, siguiente) -> Dict[str, Any]:
+    """Recorta la fila extra pedida para saber si hay más. 'siguiente(ultima)' arma el cursor."""
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    return {"filas": filas, "cursor": siguiente(filas[-1]) if filas else None, "hay_mas": hay_mas}
+
+
 class LicitacionRepository:
     def __init__(self, session_factory: sessionmaker[Session]):
         self.session_factory = session_factory
+        # None: aún no verificado; False: motor sin texto completo o migración 7c2d9e4f1a35 omitida
+        self._busqueda_fts: Optional[bool] = None
+
+    def _lectura(self) -> Session:
+        # Consultas sin escritura: réplica o pool de lectura si el factory enruta
+        return sesion_lectura(self.session_factory)
+
+    # --- Proyecciones para vistas (filas livianas, sin entidades ORM) ---
+
+    def _listar(self, stmt) -> List[RowMapping]:
+        with self._lectura() as session:
+            return session.execute(stmt).mappings().all()
+
+    def _listar_vista(self, vista: str, con_detalle: bool = False, umbral_minimo: int = 5) -> List[RowMapping]:
+        orden = ORDEN_POR_VISTA[vista]
+        if con_detalle:
+            stmt = _select_listado(True).where(_filtro_vista(vista, umbral_minimo)).order_by(*_orden(orden))
+        else:
+            stmt = _select_vista_trabajo(vista, umbral_minimo).order_by(*_orden(orden, CaVistaTrabajo))
+        return self._listar(stmt)
+
+    def listar_candidatas(self, umbral_minimo: int = 5, con_detalle: bool = False) -> List[RowMapping]:
+        return self._listar_vista("candidatas", con_detalle, umbral_minimo)
+
+    def listar_seguimiento(self, con_detalle: bool = False) -> List[RowMapping]:
+        return self._listar_vista("seguimiento", con_detalle)
+
+    def listar_ofertadas(self, con_detalle: bool = False) -> List[RowMapping]:
+        return self._listar_vista("ofertadas", con_detalle)
+
+    def listar_pagina(self, vista: str, cursor: Optional[Tuple[Any, int]] = None, tamano: int = TAMANO_PAGINA,
+                      orden: Optional[str] = None, con_detalle: bool = False, umbral_minimo: int = 5) -> Dict[str, Any]:
+        """
+        Ventana de una vista ordenada por 'orden' ('puntaje' o 'cierre'; por defecto
+        el de la vista). Retorna {'filas', 'cursor', 'hay_mas'}: para la página
+        siguiente se pasa de vuelta 'cursor' (valor de orden, ca_id de la última fila).
+        """
+        orden = orden or ORDEN_POR_VISTA[vista]
+        # Sin detalle se lee el read model; el detalle (exportaciones) sale de las tablas vivas
+        if con_detalle:
+            t, stmt = CaLicitacion, _select_listado(True).where(_filtro_vista(vista, umbral_minimo))
+        else:
+            t, stmt = CaVistaTrabajo, _select_vista_trabajo(vista, umbral_minimo)
+        if cursor is not None:
+            stmt = stmt.where(_despues_de(orden, cursor, t))
+        # Una fila extra indica si hay más páginas sin un COUNT
+        filas = self._listar(stmt.order_by(*_orden(orden, t)).limit(tamano + 1))
+        campo = "puntuacion_final" if orden == "puntaje" else "fecha_cierre"
+        return _pagina(filas, tamano, lambda ultima: (ultima[campo], ultima["ca_id"]))
+
+    def estimar_total(self, vista: str, umbral_minimo: int = 5) -> int:
+        """
+        Total de filas de una vista. En PostgreSQL es la estimación del planner
+        (EXPLAIN, sin recorrer la tabla); en otros motores un COUNT exacto.
+        """
+        stmt = select(CaVistaTrabajo.ca_id).where(_filtro_vista_trabajo(vista, umbral_minimo))
+        with self._lectura() as session:
+            if es_postgres(session):
+                sql = stmt.compile(dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+                plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+                return int(plan[0]["Plan"]["Plan Rows"])
+            return session.scalar(select(func.count()).select_from(stmt.subquery()))
+
+    # --- Búsqueda ---
+
+    def _hay_busqueda(self, session: Session) -> bool:
+        """Si la búsqueda de texto completo está instalada (se verifica una vez por proceso, sin DDL)."""
+        if self._busqueda_fts is None:
+            self._busqueda_fts = es_postgres(session) and busqueda_disponible(session.connection())
+            if es_postgres(session) and not self._busqueda_fts:
+                logger.warning("Búsqueda de texto completo no instalada (migración 7c2d9e4f1a35): se usará ILIKE.")
+        return self._busqueda_fts
+
+    @staticmethod
+    def _filtrar_texto_completo(session: Session, stmt, texto: str, terminos: List[str]):
+        """Texto completo (prefijos, sin tildes, ranking) + trigram para código y organismo."""
+        normalizar = func.public.ca_normalizar
+        patron = f"%{escapar_like(texto.strip())}%"
+
+        def contiene(columna):
+            return normalizar(columna).like(normalizar(literal(patron)), escape="\\")
+
+        documento = func.public.ca_documento_busqueda(
+            CaLicitacion.nombre, CaLicitacion.descripcion, cast(CaLicitacion.productos_solicitados, JSONB)
+        )
+        consulta = func.to_tsquery(
+            literal_column(f"'{CONFIG_BUSQUEDA}'::regconfig"), " & ".join(f"{t}:*" for t in terminos)
+        )
+        # Tabla chica: se resuelve antes para que el filtro principal use el índice de organismo_id
+        organismos = session.scalars(
+            select(CaOrganismo.organismo_id).where(contiene(CaOrganismo.nombre))
+        ).all()
+
+        condiciones = [
+            documento.op("@@")(consulta),
+            contiene(CaLicitacion.nombre),
+            CaLicitacion.codigo_ca.ilike(patron, escape="\\"),
+        ]
+        if organismos:
+            condiciones.append(CaLicitacion.organismo_id.in_(organismos))
+        relevancia = func.ts_rank(documento, consulta) + func.similarity(
+            normalizar(CaLicitacion.nombre), normalizar(literal(texto))
+        )
+        return stmt.where(or_(*condiciones)).order_by(
+            CaLicitacion.codigo_ca.ilike(patron, escape="\\").desc(), relevancia.desc(),
+            CaLicitacion.puntuacion_final.desc(), CaLicitacion.ca_id,
+        )
+
+    @staticmethod
+    def _filtrar_ilike(stmt, terminos: List[str]):
+        """Respaldo portable: cada término debe aparecer en algún campo (sin ranking ni tildes)."""
+        campos = (
+            CaLicitacion.codigo_ca, CaLicitacion.nombre, CaOrganismo.nombre, CaLicitacion.descripcion,
+            cast(CaLicitacion.productos_solicitados, String),
+        )
+        for termino in terminos:
+            patron = f"%{escapar_like(termino)}%"
+            stmt = stmt.where(or_(*(campo.ilike(patron, escape="\\") for campo in campos)))
+        en_nombre = CaLicitacion.nombre.ilike(f"%{escapar_like(terminos[0])}%", escape="\\")
+        return stmt.order_by(en_nombre.desc(), CaLicitacion.puntuacion_final.desc(), CaLicitacion.ca_id)
+
+    def buscar(self, texto: str, cursor: Optional[int] = None, tamano: int = TAMANO_PAGINA,
+               vista: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Busca en todas las compras (o solo en 'vista') por código, nombre, organismo,
+        descripción y productos, ordenando por relevancia. En PostgreSQL usa texto
+        completo en español sin tildes e índices trigram; en otros motores, ILIKE.
+        Mismo formato que listar_pagina; aquí 'cursor' es el desplazamiento siguiente.
+        """
+        terminos = re.findall(r"\w+", texto.lower())
+        if not terminos:
+            return {"filas": [], "cursor": None, "hay_mas": False}
+        desde = cursor or 0
+        with self._lectura() as session:
+            stmt = _select_listado()
+            if vista:
+                stmt = stmt.where(_filtro_vista(vista))
+            if self._hay_busqueda(session):
+                stmt = self._filtrar_texto_completo(session, stmt, texto, terminos)
+            else:
+                stmt = self._filtrar_ilike(stmt, terminos)
+            filas = session.execute(stmt.offset(desde).limit(tamano + 1)).mappings().all()
+        return _pagina(filas, tamano, lambda _: desde + tamano)
+
+    # --- Consultas por producto ---
+
+    def _filtro_codigo_producto(self, session: Session, codigo_producto: int):
+        if es_postgres(session):
+            # Contención JSONB: la resuelve el índice GIN ix_ca_licitacion_productos_gin
+            return cast(CaLicitacion.productos_solicitados, JSONB).contains([{"codigo_producto": codigo_producto}])
+        producto = _elementos_productos(False)
+        return exists(select(1).select_from(producto).where(
+            _campo_producto(producto, "codigo_producto", False) == codigo_producto
+        ))
+
+    def _filtro_texto_producto(self, session: Session, texto: str):
+        patron = f"%{escapar_like(texto)}%"
+        if self._hay_busqueda(session):
+            # Texto normalizado de productos: usa el índice trigram ix_ca_licitacion_productos_trgm
+            normalizar = func.public.ca_normalizar
+            return func.public.ca_texto_productos(cast(CaLicitacion.productos_solicitados, JSONB)).like(
+                normalizar(literal(patron)), escape="\\"
+            )
+        postgres = es_postgres(session)
+        producto = _elementos_productos(postgres)
+        return exists(select(1).select_from(producto).where(or_(
+            _campo_producto(producto, "nombre", postgres).ilike(patron, escape="\\"),
+            _campo_producto(producto, "descripcion", postgres).ilike(patron, escape="\\"),
+        )))
+
+    def buscar_por_producto(self, codigo_producto: Optional[int] = None, texto: Optional[str] = None,
+                            limite: int = TAMANO_PAGINA) -> List[RowMapping]:
+        """
+        Compras cuyos productos solicitados tienen el código 'codigo_producto' y/o
+        contienen 'texto' en nombre o descripción, por puntaje. El filtro corre en
+        la base: en PostgreSQL por contención JSONB e índice trigram; en SQLite
+        recorriendo el arreglo con json_each.
+        """
+        texto = (texto or "").strip()
+        if codigo_producto is None and not texto:
+            return []
+        with self._lectura() as session:
+            stmt = _select_listado()
+            if codigo_producto is not None:
+                stmt = stmt.where(self._filtro_codigo_producto(session, codigo_producto))
+            if texto:
+                stmt = stmt.where(self._filtro_texto_producto(session, texto))
+            stmt = stmt.order_by(CaLicitacion.puntuacion_final.desc(), CaLicitacion.ca_id).limit(limite)
+            return session.execute(stmt).mappings().all()
+
+    def obtener_detalle(self, codigo_ca: str) -> Optional[RowMapping]:
+        """Campos pesados de una compra, para el panel de detalle."""
+        stmt = select(
+            CaLicitacion.codigo_ca, CaLicitacion.nombre, CaLicitacion.descripcion, CaLicitacion.estado_ca_texto,
+            CaLicitacion.monto_clp, CaLicitacion.fecha_publicacion, CaLicitacion.fecha_cierre,
+            CaLicitacion.fecha_cierre_segundo_llamado, CaLicitacion.direccion_entrega, CaLicitacion.plazo_entrega,
+            CaLicitacion.productos_solicitados,
+            func.coalesce(CaOrganismo.nombre, "N/A").label("organismo_nombre"),
+            CaSeguimiento.notas,
+        ).outerjoin(
+            CaOrganismo, CaLicitacion.organismo_id == CaOrganismo.organismo_id
+        ).outerjoin(CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id).where(CaLicitacion.codigo_ca == codigo_ca)
+        with self._lectura() as session:
+            return session.execute(stmt).mappings().first()
 
     def obtener_por_id(self, ca_id: int) -> Optional[CaLicitacion]:
-        with self.session_factory() as session:
-            stmt = select(CaLicitacion).options(
-                joinedload(CaLicitacion.organismo), 
-                joinedload(CaLicitacion.seguimiento)
-            ).where(CaLicitacion.ca_id == ca_id)
+        with self._lectura() as session:
+            stmt = select(CaLicitacion).options(*PERFIL_DETALLE).where(CaLicitacion.ca_id == ca_id)
             return session.scalars(stmt).first()
 
     def obtener_candidatas_filtradas(self, umbral_minimo: int = 5) -> List[CaLicitacion]:
-        with self.session_factory() as session:
-            subq = select(CaSeguimiento.ca_id).where(
-                or_(CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == True, CaSeguimiento.es_oculta == True)
-            )
-            stmt = select(CaLicitacion).options(
-                joinedload(CaLicitacion.seguimiento), 
-                joinedload(CaLicitacion.organismo).joinedload(CaOrganismo.sector)
-            ).filter(
+        with self._lectura() as session:
+            subq = select(CaSeguimiento.ca_id).where(filtro_seguimiento_marcado())
+            stmt = select(CaLicitacion).options(*PERFIL_EXPORTACION).filter(
                 CaLicitacion.puntuacion_final >= umbral_minimo, 
                 CaLicitacion.ca_id.notin_(subq),
-                or_(CaLicitacion.estado_ca_texto == 'Publicada', CaLicitacion.estado_ca_texto == 'Publicada - Segundo llamado')
-            ).order_by(CaLicitacion.puntuacion_final.desc())
+                filtro_estado_abierto()
+            ).order_by(CaLicitacion.puntuacion_final.desc(), CaLicitacion.ca_id)
             return session.scalars(stmt).all()
 
     def obtener_seguimiento(self) -> List[CaLicitacion]:
-        with self.session_factory() as session:
-            stmt = select(CaLicitacion).options(
-                joinedload(CaLicitacion.seguimiento), 
-                joinedload(CaLicitacion.organismo).joinedload(CaOrganismo.sector)
-            ).join(CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id).filter(
-                CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == False
+        with self._lectura() as session:
+            # Para el ETL (re-descarga de fichas): solo el nombre del organismo
+            stmt = select(CaLicitacion).options(*PERFIL_ETL).join(
+                CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id
+            ).filter(
+                filtro_seguimiento_favorito()
             ).order_by(CaLicitacion.fecha_cierre.asc())
             return session.scalars(stmt).all()
 
     def obtener_ofertadas(self) -> List[CaLicitacion]:
-        with self.session_factory() as session:
-            stmt = select(CaLicitacion).options(
-                joinedload(CaLicitacion.seguimiento), 
-                joinedload(CaLicitacion.organismo).joinedload(CaOrganismo.sector)
-            ).join(CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id).filter(
-                CaSeguimiento.es_ofertada == True
+        with self._lectura() as session:
+            # Para el ETL (re-descarga de fichas): solo el nombre del organismo
+            stmt = select(CaLicitacion).options(*PERFIL_ETL).join(
+                CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id
+            ).filter(
+                filtro_seguimiento_ofertado()
             ).order_by(CaLicitacion.fecha_cierre.asc())
             return session.scalars(stmt).all()
 
-    def _actualizar_seguimiento(self, ca_id: int, es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None, es_oculta: Optional[bool] = None):
+    def obtener_ca_ids(self, codigos: List[str]) -> Dict[str, int]:
+        """codigo_ca -> ca_id (solo la clave, sin cargar la compra)."""
+        if not codigos: return {}
+        with self._lectura() as session:
+            stmt = select(CaLicitacion.codigo_ca, CaLicitacion.ca_id).where(CaLicitacion.codigo_ca.in_(codigos))
+            return dict(session.execute(stmt).all())
+
+    def obtener_nota(self, ca_id: int) -> str:
+        with self._lectura() as session:
+            return session.scalar(select(CaSeguimiento.notas).where(CaSeguimiento.ca_id == ca_id)) or ""
+
+    def actualizar_seguimiento(self, ca_id: int, es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None,
+                               es_oculta: Optional[bool] = None) -> bool:
+        """Cambia varias marcas en una sola transacción. False si no se pudo guardar."""
+        return self._actualizar_seguimiento(ca_id, es_favorito, es_ofertada, es_oculta)
+
+    def _actualizar_seguimiento(self, ca_id: int, es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None, es_oculta: Optional[bool] = None) -> bool:
         with self.session_factory() as session:
             try:
                 seguimiento = session.get(CaSeguimiento, ca_id)
@@ -73,10 +399,14 @@ class LicitacionRepository:
                         es_oculta=es_oculta or False
                     )
                     session.add(nuevo)
+                session.flush()
+                VistaTrabajoRepository.refrescar(session, ca_ids=[ca_id])
                 session.commit()
+                return True
             except Exception as e:
                 logger.error(f"Error seguimiento {ca_id}: {e}")
                 session.rollback()
+                return False
 
     def gestionar_favorito(self, ca_id: int, es_favorito: bool): 
         self._actualizar_seguimiento(ca_id, es_favorito=es_favorito)
@@ -87,7 +417,7 @@ class LicitacionRepository:
     def ocultar_licitacion(self, ca_id: int, ocultar: bool = True):
         self._actualizar_seguimiento(ca_id, es_oculta=ocultar)
 
-    def guardar_nota_usuario(self, ca_id: int, nota: str):
+    def guardar_nota_usuario(self, ca_id: int, nota: str) -> bool:
         with self.session_factory() as session:
             try:
                 seguimiento = session.get(CaSeguimiento, ca_id)
@@ -95,7 +425,96 @@ class LicitacionRepository:
                 else: 
                     nuevo = CaSeguimiento(ca_id=ca_id, notas=nota)
                     session.add(nuevo)
+                session.flush()
+                VistaTrabajoRepository.refrescar(session, ca_ids=[ca_id])
                 session.commit()
+                return True
             except Exception as e:
                 logger.error(f"Error nota {ca_id}: {e}")
-                session.rollback()
\ No newline at end of file
+                session.rollback()
+                return False
+
+    # --- Operaciones en lote (selección múltiple) ---
+
+    @staticmethod
+    def marcas_seguimiento(es_favorito: Optional[bool], es_ofertada: Optional[bool], es_oculta: Optional[bool]) -> Dict[str, bool]:
+        """Columnas a escribir con las mismas reglas que '_actualizar_seguimiento'."""
+        marcas = {
+            col: valor for col, valor in
+            (("es_favorito", es_favorito), ("es_ofertada", es_ofertada), ("es_oculta", es_oculta))
+            if valor is not None
+        }
+        if es_ofertada: marcas["es_favorito"] = True
+        if es_oculta: marcas.update(es_favorito=False, es_ofertada=False)
+        return marcas
+
+    @staticmethod
+    def _upsert_seguimiento(session: Session, ca_ids: List[int], valores: Dict[str, Any]) -> List[int]:
+        """
+        INSERT ... SELECT ... ON CONFLICT (ca_id) DO UPDATE sobre ca_seguimiento.
+        El SELECT sobre ca_licitacion descarta ids inexistentes. En un conflicto
+        solo se pisan las columnas de 'valores'; una fila nueva lleva False en
+        las marcas que no vienen. Retorna los ca_id escritos.
+        """
+        tabla = CaSeguimiento.__table__
+        columnas = {"es_favorito": False, "es_ofertada": False, "es_oculta": False, **valores}
+        escritos = []
+        for inicio in range(0, len(ca_ids), TAMANO_LOTE_SEGUIMIENTO):
+            lote = ca_ids[inicio:inicio + TAMANO_LOTE_SEGUIMIENTO]
+            origen = select(
+                CaLicitacion.ca_id, *[literal(valor, tabla.c[col].type).label(col) for col, valor in columnas.items()]
+            ).where(CaLicitacion.ca_id.in_(lote))
+            stmt = insert_upsert(session, tabla).from_select(["ca_id", *columnas], origen)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[tabla.c.ca_id], set_={col: stmt.excluded[col] for col in valores}
+            ).returning(tabla.c.ca_id)
+            escritos.extend(session.scalars(stmt).all())
+        VistaTrabajoRepository.refrescar(session, ca_ids=escritos)
+        return escritos
+
+    def _en_lote(self, ca_ids: List[int], valores: Dict[str, Any]) -> int:
+        ids = list(dict.fromkeys(ca_ids))
+        if not ids or not valores: return 0
+        with self.session_factory() as session:
+            try:
+                escritos = self._upsert_seguimiento(session, ids, valores)
+                session.commit()
+                return len(escritos)
+            except Exception as e:
+                logger.error(f"Error seguimiento en lote ({len(ids)} compras): {e}")
+                session.rollback()
+                return 0
+
+    def marcar_en_lote(self, ca_ids: List[int], es_favorito: Optional[bool] = None, es_ofertada: Optional[bool] = None,
+                       es_oculta: Optional[bool] = None) -> int:
+        """
+        Seguir, ofertar u ocultar muchas compras con un upsert por lote y una
+        sola transacción. Retorna las compras escritas (0 si falló).
+        """
+        return self._en_lote(ca_ids, self.marcas_seguimiento(es_favorito, es_ofertada, es_oculta))
+
+    def anotar_en_lote(self, ca_ids: List[int], nota: str) -> int:
+        """Misma nota para muchas compras; las marcas existentes no cambian."""
+        return self._en_lote(ca_ids, {"notas": nota})
+
+    def aplicar_seguimiento(self, cambios: Dict[int, Dict[str, Any]]) -> List[int]:
+        """
+        Cambios distintos por compra ({ca_id: {columna: valor}}) en una sola
+        transacción: un upsert por cada combinación de valores. A diferencia de
+        'marcar_en_lote', propaga el error para que quien encola pueda reintentar.
+        Retorna los ca_id escritos (los que ya no existen se omiten).
+        """
+        grupos: Dict[Tuple, List[int]] = {}
+        for ca_id, valores in cambios.items():
+            if valores: grupos.setdefault(tuple(sorted(valores.items())), []).append(ca_id)
+        if not grupos: return []
+        with self.session_factory() as session:
+            try:
+                escritos = []
+                for valores, ca_ids in grupos.items():
+                    escritos.extend(self._upsert_seguimiento(session, ca_ids, dict(valores)))
+                session.commit()
+                return escritos
+            except Exception:
+                session.rollback()
+                raise
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date, timedelta
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, update, delete, or_, and_, text
+from src.db.db_models import (
+    CaLicitacion, CaSeguimiento, CaOrganismo, CaVistaTrabajo, CaProducto, EstadoCa, ESTADOS_ABIERTOS, MES_FIJADO,
+    TEXTO_VENCIDA_LOCAL,
+    filtro_estado_abierto
+)
+from src.db.archivo_historico import ArchivoHistorico
+from src.db.dialecto import es_postgres
+from src.db.ddl_particiones import siguiente_mes
+from src.db.repositories.particion_repository import ParticionRepository
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+from config.config import RETENCION_DESACOPLAR_PARTICIONES
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Filas borradas por transacción: acota la duración de los locks
+TAMANO_LOTE_PURGA = 5000
+# Sobre este volumen se refrescan estadísticas y se evalúa sugerir VACUUM
+FILAS_PARA_ANALYZE = 10000
+# Proporción de tuplas muertas desde la que se sugiere VACUUM (PostgreSQL)
+RATIO_TUPLAS_MUERTAS_VACUUM = 0.2
+# Holgura entre publicación y cierre (incluido 2° llamado) al retirar una partición mensual completa
+DIAS_PUBLICACION_A_CIERRE = 30
+
+
+def _reporte(operacion: str, filas: int, lotes: int, inicio: float) -> Dict[str, Any]:
+    segundos = time.perf_counter() - inicio
+    return {
+        "operacion": operacion,
+        "filas": filas,
+        "lotes": lotes,
+        "segundos": round(segundos, 3),
+        "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else float(filas),
+    }
+
+
+class MantenimientoRepository:
+    """
+    Tareas de housekeeping sobre ca_licitacion: cierre local de compras vencidas
+    (un UPDATE set-based) y purga de registros antiguos (DELETE por lotes con
+    keyset sobre ca_id y commit por lote). Cada tarea retorna un reporte con
+    filas, lotes, duración y filas/s.
+
+    Si ca_licitacion está particionada por mes, la purga retira particiones
+    completas en vez de borrar fila a fila (ver ParticionRepository); lo que la
+    purga fila a fila conservaría pasa antes a la partición fija. Con un
+    'archivo' disponible, lo purgado se escribe antes en Parquet.
+    """
+    def __init__(self, session_factory: sessionmaker[Session], archivo: Optional[ArchivoHistorico] = None):
+        self.session_factory = session_factory
+        self.particiones = ParticionRepository(session_factory)
+        self.archivo = archivo if archivo is not None and archivo.disponible() else None
+        if archivo is not None and self.archivo is None:
+            logger.warning("Archivo histórico activado pero 'pyarrow' no está instalado: la purga no archivará.")
+
+    @staticmethod
+    def _vencida_antes_de(fecha_limite: date):
+        """La compra cerró (2° llamado si existe, si no el 1°) antes de 'fecha_limite'."""
+        return or_(
+            and_(CaLicitacion.fecha_cierre_segundo_llamado.isnot(None), CaLicitacion.fecha_cierre_segundo_llamado < fecha_limite),
+            and_(CaLicitacion.fecha_cierre_segundo_llamado.is_(None), CaLicitacion.fecha_cierre < fecha_limite),
+        )
+
+    def cerrar_vencidas(self, dias_gracia: int = 14) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        fecha_limite = date.today() - timedelta(days=dias_gracia)
+        stmt = update(CaLicitacion.__table__).where(
+            filtro_estado_abierto(), self._vencida_antes_de(fecha_limite)
+        ).values(estado_ca_texto=TEXTO_VENCIDA_LOCAL, estado_codigo=EstadoCa.VENCIDA_LOCAL.value).returning(CaLicitacion.ca_id)
+
+        with self.session_factory() as session:
+            try:
+                cerradas = session.execute(stmt).scalars().all()
+                VistaTrabajoRepository.refrescar(session, ca_ids=cerradas)
+                filas = len(cerradas)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        return _reporte("cerrar_vencidas", filas, 1, inicio)
+
+    @classmethod
+    def _purgables(cls, dias_retencion: int):
+        """Cerradas hace más de 'dias_retencion' días que no están en favoritos ni ofertadas."""
+        fecha_corte = date.today() - timedelta(days=dias_retencion)
+        protegidas = select(CaSeguimiento.ca_id).where(
+            or_(CaSeguimiento.es_favorito == True, CaSeguimiento.es_ofertada == True)
+        )
+        return and_(
+            # Sin estado conocido no se borra: podría seguir abierta
+            CaLicitacion.estado_codigo.notin_(ESTADOS_ABIERTOS + (EstadoCa.DESCONOCIDO.value,)),
+            cls._vencida_antes_de(fecha_corte),
+            CaLicitacion.ca_id.notin_(protegidas),
+        )
+
+    def purgar_antiguas(self, dias_retencion: int = 30, tamano_lote: int = TAMANO_LOTE_PURGA) -> Dict[str, Any]:
+        """
+        Borra compras cerradas hace más de 'dias_retencion' días que no están en
+        favoritos ni ofertadas. Trabaja por lotes de 'tamano_lote' ids ascendentes.
+        """
+        if self.particiones.esta_particionada():
+            return self.purgar_particiones(dias_retencion, tamano_lote=tamano_lote)
+        inicio = time.perf_counter()
+        with self.session_factory() as session:
+            total, lotes, archivos = self._purgar_por_lotes(session, self._purgables(dias_retencion), tamano_lote)
+            if total >= FILAS_PARA_ANALYZE:
+                self._despues_de_purga_masiva(session, total)
+
+        reporte = _reporte("purgar_antiguas", total, lotes, inicio)
+        reporte["archivos"] = archivos
+        if total:
+            logger.info(
+                f"Purga: {total} filas en {lotes} lotes, {reporte['segundos']}s ({reporte['filas_por_segundo']} filas/s)."
+            )
+        return reporte
+
+    def _purgar_por_lotes(self, session: Session, criterios, tamano_lote: int) -> Tuple[int, int, int]:
+        """DELETE de lo que cumple 'criterios' por lotes de ids ascendentes, commit por lote. (filas, lotes, archivos)."""
+        total, lotes, ultimo_id, archivos = 0, 0, 0, 0
+        while True:
+            ids: List[int] = session.scalars(
+                select(CaLicitacion.ca_id).where(criterios, CaLicitacion.ca_id > ultimo_id)
+                .order_by(CaLicitacion.ca_id).limit(tamano_lote)
+            ).all()
+            if not ids: break
+            archivados = []
+            try:
+                archivados = self._archivar(session, CaLicitacion.ca_id.in_(ids))
+                # Explícito: SQLite no aplica ON DELETE CASCADE sin PRAGMA foreign_keys
+                session.execute(delete(CaSeguimiento.__table__).where(CaSeguimiento.ca_id.in_(ids)))
+                session.execute(delete(CaVistaTrabajo.__table__).where(CaVistaTrabajo.ca_id.in_(ids)))
+                session.execute(delete(CaProducto.__table__).where(CaProducto.ca_id.in_(ids)))
+                total += session.execute(delete(CaLicitacion.__table__).where(CaLicitacion.ca_id.in_(ids))).rowcount
+                session.commit()
+                archivos += len(archivados)
+            except Exception:
+                session.rollback()
+                # Sin borrado no debe quedar archivado: el próximo intento lo vuelve a escribir
+                ArchivoHistorico.descartar(archivados)
+                raise
+            lotes += 1
+            ultimo_id = ids[-1]
+        return total, lotes, archivos
+
+    def purgar_particiones(self, dias_retencion: int = 30, desacoplar: bool = RETENCION_DESACOPLAR_PARTICIONES,
+                           tamano_lote: int = TAMANO_LOTE_PURGA) -> Dict[str, Any]:
+        """
+        Retención por particiones, con el mismo criterio que purgar_antiguas:
+        retira cada mes publicado hace más de 'dias_retencion' (+ holgura hasta
+        el cierre) días, moviendo antes a la partición fija lo que no se puede
+        borrar (favoritas, ofertadas, abiertas, sin estado o cerradas hace poco).
+        Un lote (y una transacción) por partición. Lo fijado se purga después
+        fila a fila cuando cumple el criterio.
+        """
+        inicio = time.perf_counter()
+        limite = date.today() - timedelta(days=dias_retencion + DIAS_PUBLICACION_A_CIERRE)
+        purgables = self._purgables(dias_retencion)
+        total, lotes, archivos, fijadas = 0, 0, 0, 0
+        with self.session_factory() as session:
+            vencidas = [mes for _, mes in self.particiones.listar_particiones_mensuales(session) if siguiente_mes(mes) <= limite]
+            for mes in vencidas:
+                archivados = []
+                try:
+                    # IS NOT TRUE: un criterio NULL (p. ej. sin fecha de cierre) también se conserva
+                    fijadas += self.particiones.fijar(session, mes, purgables.is_not(True))
+                    archivados = self._archivar(session, CaLicitacion.mes_particion == mes)
+                    total += self.particiones.retirar_particion(session, mes, desacoplar)
+                    session.commit()
+                    archivos += len(archivados)
+                except Exception:
+                    session.rollback()
+                    ArchivoHistorico.descartar(archivados)
+                    raise
+                lotes += 1
+
+            filas_fijas, lotes_fijas, archivos_fijas = self._purgar_por_lotes(
+                session, and_(CaLicitacion.mes_particion == MES_FIJADO, purgables), tamano_lote
+            )
+
+        reporte = _reporte("purgar_particiones", total + filas_fijas, lotes + lotes_fijas, inicio)
+        reporte["archivos"] = archivos + archivos_fijas
+        reporte["fijadas"] = fijadas
+        if lotes:
+            accion = "desacopladas" if desacoplar else "eliminadas"
+            logger.info(
+                f"Purga: {lotes} particiones {accion} ({total} filas, {fijadas} conservadas en la partición fija) "
+                f"en {reporte['segundos']}s."
+            )
+        if filas_fijas:
+            logger.info(f"Purga: {filas_fijas} filas de la partición fija en {lotes_fijas} lotes.")
+        return reporte
+
+    def _archivar(self, session: Session, criterio) -> list:
+        """Escribe en el archivo histórico las compras que cumplen 'criterio'. Retorna las rutas creadas."""
+        if self.archivo is None: return []
+        stmt = select(
+            *[c for c in CaLicitacion.__table__.c if c.name in ArchivoHistorico.COLUMNAS_ORIGEN],
+            CaOrganismo.nombre.label("organismo_nombre"),
+        ).outerjoin(CaOrganismo, CaLicitacion.organismo_id == CaOrganismo.organismo_id).where(criterio)
+
+        rutas = []
+        try:
+            resultado = session.execute(stmt.execution_options(yield_per=TAMANO_LOTE_PURGA)).mappings()
+            for bloque in resultado.partitions():
+                rutas.extend(self.archivo.archivar(dict(fila) for fila in bloque))
+        except Exception:
+            ArchivoHistorico.descartar(rutas)
+            raise
+        return rutas
+
+    def _despues_de_purga_masiva(self, session: Session, filas: int):
+        """Refresca estadísticas del planner y sugiere VACUUM si quedaron muchas tuplas muertas."""
+        try:
+            if es_postgres(session):
+                session.execute(text("ANALYZE ca_licitacion"))
+                session.execute(text("ANALYZE ca_seguimiento"))
+                session.commit()
+                muertas, vivas = session.execute(text(
+                    "SELECT n_dead_tup, n_live_tup FROM pg_stat_user_tables WHERE relname = 'ca_licitacion'"
+                )).one()
+                if vivas and muertas / (muertas + vivas) >= RATIO_TUPLAS_MUERTAS_VACUUM:
+                    logger.warning(
+                        f"ca_licitacion tiene {muertas} tuplas muertas ({muertas / (muertas + vivas):.0%}). "
+                        "Se recomienda ejecutar VACUUM (ANALYZE) ca_licitacion fuera del horario de uso."
+                    )
+            else:
+                session.execute(text("ANALYZE"))
+                session.commit()
+                logger.info(f"Purga de {filas} filas: considere ejecutar VACUUM para recuperar espacio en disco.")
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"No se pudo actualizar estadísticas tras la purga: {e}")
@@ -1,7 +1,8 @@
 from typing import List, Dict, Optional
-from sqlalchemy.orm import sessionmaker, Session, joinedload
+from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy import select, update, delete
 from src.db.db_models import CaOrganismo, CaSector, CaOrganismoRegla, TipoReglaOrganismo
+from src.db.perfiles_carga import PERFIL_LISTADO, PERFIL_REGLAS
 from src.utils.logger import configurar_logger
 
 logger = configurar_logger(__name__)
@@ -12,11 +13,11 @@ class OrganismoRepository:
 
     def obtener_todos(self) -> List[CaOrganismo]:
         with self.session_factory() as session: 
-            return session.scalars(select(CaOrganismo).order_by(CaOrganismo.nombre)).all()
+            return session.scalars(select(CaOrganismo).options(*PERFIL_LISTADO).order_by(CaOrganismo.nombre)).all()
 
     def obtener_reglas(self) -> List[CaOrganismoRegla]:
         with self.session_factory() as session: 
-            return session.scalars(select(CaOrganismoRegla).options(joinedload(CaOrganismoRegla.organismo))).all()
+            return session.scalars(select(CaOrganismoRegla).options(*PERFIL_REGLAS)).all()
 
     def establecer_regla(self, org_id: int, rule_type: str, points: int):
         rule_type = str(rule_type).upper() 
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import text, update
+from src.db.db_models import CaLicitacion, MES_FIJADO
+from src.db.dialecto import es_postgres
+from src.db.ddl_particiones import (
+    TABLA, PARTICION_FIJA, esta_particionada, sql_crear_particion, nombre_particion
+)
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Particiones hijas de ca_licitacion con su límite inferior ('FROM (...)')
+SQL_PARTICIONES = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(:tabla)
+ORDER BY c.relname
+"""
+
+
+class ParticionRepository:
+    """
+    Administra las particiones mensuales de ca_licitacion cuando la tabla fue
+    particionada (ver src/db/ddl_particiones.py). En motores o esquemas sin
+    particiones todos los métodos son no-op.
+    """
+    def __init__(self, session_factory: sessionmaker[Session]):
+        self.session_factory = session_factory
+        self._particionada: Optional[bool] = None
+        self._meses_existentes: set = set()
+
+    def esta_particionada(self, session: Optional[Session] = None) -> bool:
+        if self._particionada is None:
+            if session is not None:
+                self._particionada = es_postgres(session) and esta_particionada(session.connection())
+            else:
+                with self.session_factory() as nueva:
+                    self._particionada = es_postgres(nueva) and esta_particionada(nueva.connection())
+        return self._particionada
+
+    def asegurar_particiones(self, session: Session, meses: Iterable[datetime.date]):
+        """
+        Crea (dentro de la transacción de 'session') las particiones de los meses
+        que aún no existen, antes de insertar filas en ellos.
+        """
+        if not self.esta_particionada(session): return
+        faltantes = {m for m in meses if m and m != MES_FIJADO} - self._meses_existentes
+        if not faltantes: return
+        for mes in sorted(faltantes):
+            session.execute(text(sql_crear_particion(mes)))
+        self._meses_existentes.update(faltantes)
+
+    def listar_particiones_mensuales(self, session: Session) -> List[Tuple[str, datetime.date]]:
+        """(nombre, mes) de las particiones por mes, sin la partición fija."""
+        particiones = []
+        for nombre, limites in session.execute(text(SQL_PARTICIONES), {"tabla": TABLA}):
+            if nombre == PARTICION_FIJA: continue
+            # Formato: FOR VALUES FROM ('2026-07-01') TO ('2026-08-01')
+            desde = limites.split("'")[1]
+            particiones.append((nombre, datetime.date.fromisoformat(desde)))
+        return particiones
+
+    def fijar(self, session: Session, mes: datetime.date, criterio) -> int:
+        """Mueve a la partición fija las filas de 'mes' que cumplen 'criterio'. Retorna las filas movidas."""
+        return session.execute(
+            update(CaLicitacion.__table__)
+            .where(CaLicitacion.mes_particion == mes, criterio)
+            .values(mes_particion=MES_FIJADO)
+        ).rowcount
+
+    def retirar_particion(self, session: Session, mes: datetime.date, desacoplar: bool = False) -> int:
+        """
+        Retira la partición de 'mes' en la transacción de 'session': borra el
+        seguimiento de sus filas y la desacopla (DETACH, queda como tabla suelta)
+        o la elimina (DROP). Llamar antes a 'fijar' con lo que se conserva.
+        Retorna las filas retiradas.
+        """
+        nombre = nombre_particion(mes)
+        # DETACH/DROP no disparan el trigger de borrado: seguimiento, vista de trabajo y productos se limpian aquí
+        for dependiente in ("ca_seguimiento", "ca_vista_trabajo", "ca_producto"):
+            session.execute(text(f"DELETE FROM {dependiente} WHERE ca_id IN (SELECT ca_id FROM {nombre})"))
+        filas = session.execute(text(f"SELECT count(*) FROM {nombre}")).scalar()
+        session.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+        if not desacoplar:
+            session.execute(text(f"DROP TABLE {nombre}"))
+        self._meses_existentes.discard(mes)
+        return filas
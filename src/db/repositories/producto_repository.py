@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, insert, delete
+from src.db.db_models import CaLicitacion, CaProducto, CaProductoRegla
+from src.utils.productos import lineas_producto, validar_prefijo, rango_prefijo
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Compras por sentencia (límite de parámetros de SQLite)
+TAMANO_LOTE_PRODUCTOS = 1000
+
+
+class ProductoRepository:
+    """
+    Líneas de producto normalizadas (ca_producto) y reglas de puntaje por código
+    ONU (ca_producto_regla). EtlRepository llama a 'reemplazar_lineas' con su
+    propia sesión al guardar fichas: las líneas cambian en la misma transacción
+    que productos_solicitados.
+    """
+    def __init__(self, session_factory: sessionmaker[Session]):
+        self.session_factory = session_factory
+
+    # --- Líneas de producto ---
+
+    @staticmethod
+    def reemplazar_lineas(session: Session, productos_por_ca: Dict[int, Any]) -> int:
+        """Reescribe las líneas de cada compra desde su lista de productos. Retorna las líneas insertadas."""
+        ids = list(productos_por_ca)
+        for inicio in range(0, len(ids), TAMANO_LOTE_PRODUCTOS):
+            session.execute(delete(CaProducto.__table__).where(CaProducto.ca_id.in_(ids[inicio:inicio + TAMANO_LOTE_PRODUCTOS])))
+        filas = [
+            {"ca_id": ca_id, **linea}
+            for ca_id, productos in productos_por_ca.items() for linea in lineas_producto(productos)
+        ]
+        if filas:
+            session.execute(insert(CaProducto.__table__), filas)
+        return len(filas)
+
+    @staticmethod
+    def lineas_por_compra(session: Session, ca_ids: Optional[Iterable[int]] = None) -> Dict[int, List[Tuple[Optional[int], str]]]:
+        """(codigo_producto, nombre_norm) de cada compra en el orden de la ficha. Sin 'ca_ids', de todas."""
+        base = select(CaProducto.ca_id, CaProducto.codigo_producto, CaProducto.nombre_norm).order_by(
+            CaProducto.ca_id, CaProducto.linea
+        )
+        if ca_ids is None:
+            consultas = [base]
+        else:
+            ids = list(ca_ids)
+            consultas = [
+                base.where(CaProducto.ca_id.in_(ids[inicio:inicio + TAMANO_LOTE_PRODUCTOS]))
+                for inicio in range(0, len(ids), TAMANO_LOTE_PRODUCTOS)
+            ]
+        lineas: Dict[int, List[Tuple[Optional[int], str]]] = {}
+        for stmt in consultas:
+            for ca_id, codigo, nombre in session.execute(stmt):
+                lineas.setdefault(ca_id, []).append((codigo, nombre))
+        return lineas
+
+    def reconstruir(self) -> int:
+        """Regenera ca_producto desde productos_solicitados (reparación). Retorna las líneas escritas."""
+        total, ultimo_id = 0, 0
+        with self.session_factory() as session:
+            try:
+                session.execute(delete(CaProducto.__table__))
+                while True:
+                    filas = session.execute(
+                        select(CaLicitacion.ca_id, CaLicitacion.productos_solicitados)
+                        .where(CaLicitacion.ca_id > ultimo_id).order_by(CaLicitacion.ca_id).limit(TAMANO_LOTE_PRODUCTOS)
+                    ).all()
+                    if not filas: break
+                    total += self.reemplazar_lineas(session, {f.ca_id: f.productos_solicitados for f in filas})
+                    ultimo_id = filas[-1].ca_id
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        logger.info(f"Líneas de producto reconstruidas: {total}.")
+        return total
+
+    # --- Reglas por código de producto ---
+
+    def obtener_reglas(self) -> List[CaProductoRegla]:
+        with self.session_factory() as session:
+            return session.scalars(select(CaProductoRegla).order_by(CaProductoRegla.prefijo)).all()
+
+    def establecer_regla(self, prefijo: Any, puntos: int, descripcion: Optional[str] = None):
+        prefijo = validar_prefijo(prefijo)
+        desde, hasta = rango_prefijo(prefijo)
+        with self.session_factory() as session:
+            try:
+                regla = session.scalars(select(CaProductoRegla).filter_by(prefijo=prefijo)).first()
+                if regla:
+                    regla.puntos = puntos
+                    regla.descripcion = descripcion
+                else:
+                    session.add(CaProductoRegla(
+                        prefijo=prefijo, codigo_desde=desde, codigo_hasta=hasta, puntos=puntos, descripcion=descripcion
+                    ))
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+    def eliminar_regla(self, regla_id: int):
+        with self.session_factory() as session:
+            session.execute(delete(CaProductoRegla).where(CaProductoRegla.regla_id == regla_id))
+            session.commit()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from typing import List, Dict, Any, Optional, Sequence, Set
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker, Session
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+from src.db.ddl_postgres import puntaje_sql_disponible
+from src.db.dialecto import es_postgres, escapar_like
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Fase 1 (organismo + 2° llamado + título) y Fase 2 (descripción + productos + códigos ONU)
+# calculadas en un solo UPDATE. Solo escribe filas cuyo puntaje cambió (dirty checking).
+SQL_RECALCULO = """
+WITH orgs AS MATERIALIZED (
+    SELECT organismo_id, nombre, public.ca_normalizar(nombre) AS norm
+    FROM ca_organismo
+    WHERE nombre <> ''
+),
+claves AS (
+    -- Igual que MotorPuntajes.mapa_nombre_id_organismo: nombre normalizado exacto o, si no,
+    -- el primero (por nombre) cuyo nombre normalizado está contenido en el del organismo
+    SELECT o.organismo_id,
+           coalesce(
+               (SELECT x.norm FROM orgs x WHERE x.norm = public.ca_normalizar(o.nombre) LIMIT 1),
+               (SELECT x.norm FROM orgs x WHERE strpos(public.ca_normalizar(o.nombre), x.norm) > 0
+                ORDER BY x.nombre LIMIT 1)
+           ) AS clave
+    FROM ca_organismo o
+),
+reglas_organismo AS (
+    -- Con nombres que normalizan igual, el mapa de Python se queda con el último
+    SELECT c.organismo_id, r.tipo, r.puntos
+    FROM claves c
+    CROSS JOIN LATERAL (
+        SELECT x.organismo_id FROM orgs x WHERE x.norm = c.clave ORDER BY x.nombre DESC LIMIT 1
+    ) m
+    JOIN ca_organismo_regla r ON r.organismo_id = m.organismo_id
+),
+base AS (
+    SELECT l.ca_id,
+           public.ca_normalizar(l.nombre) AS nom,
+           public.ca_normalizar(l.estado_ca_texto) AS est,
+           public.ca_normalizar(l.descripcion) AS descr,
+           public.ca_texto_productos(l.productos_solicitados::jsonb) AS prods,
+           r.tipo AS regla_tipo,
+           r.puntos AS regla_puntos
+    FROM ca_licitacion l
+    LEFT JOIN reglas_organismo r ON r.organismo_id = l.organismo_id
+    WHERE {filtro}
+),
+calc AS (
+    SELECT b.ca_id,
+           CASE
+               WHEN b.nom = '' THEN 0
+               WHEN b.regla_tipo = 'NO_DESEADO' THEN coalesce(b.regla_puntos, -100)
+               ELSE greatest(0,
+                   CASE WHEN b.regla_tipo = 'PRIORITARIO' THEN coalesce(b.regla_puntos, 0) ELSE 0 END
+                   + CASE WHEN strpos(b.est, 'segundo llamado') > 0 THEN :pts_2l ELSE 0 END
+                   + kn.total)
+           END AS pts1,
+           CASE
+               WHEN b.nom = '' THEN ARRAY['Error: Sin nombre']
+               WHEN b.regla_tipo = 'NO_DESEADO' THEN
+                   ARRAY[format('Organismo No Deseado (%s)', coalesce(b.regla_puntos, -100))]
+               ELSE
+                   CASE WHEN b.regla_tipo = 'PRIORITARIO' THEN
+                       ARRAY[format('Org. Prioritario (%s%s)',
+                                    CASE WHEN coalesce(b.regla_puntos, 0) > 0 THEN '+' ELSE '' END,
+                                    coalesce(b.regla_puntos, 0))]
+                   ELSE ARRAY[]::text[] END
+                   || CASE WHEN strpos(b.est, 'segundo llamado') > 0 AND :pts_2l <> 0 THEN
+                       ARRAY[format('2° Llamado (+%s)', :pts_2l)]
+                   ELSE ARRAY[]::text[] END
+                   || kn.detalle
+           END AS det1,
+           kd.total + kp.total + kc.total AS pts2,
+           kd.detalle || kp.detalle || kc.detalle AS det2
+    FROM base b
+    CROSS JOIN LATERAL public.ca_puntaje_masking(b.nom, :terminos, :etiquetas, :p_nom, 'Título') kn
+    CROSS JOIN LATERAL public.ca_puntaje_masking(b.descr, :terminos, :etiquetas, :p_desc, 'Desc.') kd
+    CROSS JOIN LATERAL public.ca_puntaje_masking(b.prods, :terminos, :etiquetas, :p_prod, 'Prod.') kp
+    CROSS JOIN LATERAL (
+        -- Reglas por código ONU: por línea, la de prefijo más largo; cada regla suma una vez
+        SELECT coalesce(sum(r.puntos), 0) AS total,
+               coalesce(array_agg(
+                   format('Cód. Prod.: %s (%s%s)', r.prefijo, CASE WHEN r.puntos > 0 THEN '+' ELSE '' END, r.puntos)
+                   ORDER BY r.prefijo COLLATE "C"), ARRAY[]::text[]) AS detalle
+        FROM ca_producto_regla r
+        WHERE r.puntos <> 0 AND r.regla_id IN (
+            SELECT (SELECT r2.regla_id FROM ca_producto_regla r2
+                    WHERE p.codigo_producto BETWEEN r2.codigo_desde AND r2.codigo_hasta
+                    ORDER BY length(r2.prefijo) DESC LIMIT 1)
+            FROM ca_producto p
+            WHERE p.ca_id = b.ca_id AND p.codigo_producto IS NOT NULL
+        )
+    ) kc
+)
+UPDATE ca_licitacion l
+SET puntuacion_final = c.pts1 + c.pts2,
+    puntaje_detalle = to_jsonb(c.det1 || c.det2)
+FROM calc c
+WHERE l.ca_id = c.ca_id
+  AND l.puntuacion_final IS DISTINCT FROM c.pts1 + c.pts2
+RETURNING l.ca_id
+"""
+
+
+class PuntajeSqlRepository:
+    """
+    Backend opcional de puntuación en el servidor (solo PostgreSQL).
+    Reproduce la semántica de MotorPuntajes con sentencias set-based, evitando
+    traer cada licitación a Python en un recálculo masivo.
+    """
+    def __init__(self, session_factory: sessionmaker[Session]):
+        self.session_factory = session_factory
+        self._soportado: Optional[bool] = None
+
+    def soportado(self) -> bool:
+        """PostgreSQL con las funciones de la migración 7c2d9e4f1a35 (se verifica una vez por proceso, sin DDL)."""
+        if self._soportado is None:
+            with self.session_factory() as session:
+                self._soportado = es_postgres(session) and puntaje_sql_disponible(session.connection())
+        return self._soportado
+
+    def recalcular(self, palabras_clave: Sequence[Dict[str, Any]], puntos_segundo_llamado: int,
+                   terminos_filtro: Optional[List[str]] = None, codigos: Optional[Set[str]] = None) -> int:
+        """
+        Recalcula puntajes en el servidor y retorna cuántas filas cambiaron.
+
+        'palabras_clave' es la caché de MotorPuntajes (normalizada y ordenada por
+        largo DESC), así el orden del masking es idéntico al de Python.
+        Con 'terminos_filtro' solo se evalúan filas que contienen alguno de esos
+        términos (ej: keyword recién agregada), usando los índices trigram.
+        Con 'codigos' se limita a esas compras (ej: las que cambió el último upsert).
+        """
+        if not self.soportado():
+            raise RuntimeError("Backend de puntajes SQL no instalado (migración 7c2d9e4f1a35).")
+
+        params = {
+            "terminos": [kw["norm"] for kw in palabras_clave],
+            "etiquetas": [kw["keyword"] for kw in palabras_clave],
+            "p_nom": [kw["p_nom"] for kw in palabras_clave],
+            "p_desc": [kw["p_desc"] for kw in palabras_clave],
+            "p_prod": [kw["p_prod"] for kw in palabras_clave],
+            "pts_2l": puntos_segundo_llamado,
+        }
+
+        filtro = "TRUE"
+        if terminos_filtro:
+            condiciones = []
+            for i, termino in enumerate(t for t in terminos_filtro if t):
+                params[f"pat_{i}"] = f"%{escapar_like(termino)}%"
+                condiciones.append(
+                    f"(public.ca_normalizar(l.nombre) LIKE :pat_{i} "
+                    f"OR public.ca_normalizar(l.descripcion) LIKE :pat_{i} "
+                    f"OR public.ca_texto_productos(l.productos_solicitados::jsonb) LIKE :pat_{i})"
+                )
+            if condiciones:
+                filtro = "(" + " OR ".join(condiciones) + ")"
+
+        if codigos is not None:
+            params["codigos"] = list(codigos)
+            filtro += " AND l.codigo_ca = ANY(:codigos)"
+
+        with self.session_factory() as session:
+            try:
+                cambiadas = session.execute(text(SQL_RECALCULO.format(filtro=filtro)), params).scalars().all()
+                VistaTrabajoRepository.refrescar(session, ca_ids=cambiadas)
+                session.commit()
+                return len(cambiadas)
+            except Exception:
+                session.rollback()
+                raise
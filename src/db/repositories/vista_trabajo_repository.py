@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from typing import Iterable, Optional
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, insert, delete, func, and_, or_
+from src.db.dialecto import insert_upsert
+from src.db.db_models import (
+    CaLicitacion, CaSeguimiento, CaOrganismo, CaVistaTrabajo,
+    filtro_estado_abierto, filtro_seguimiento_marcado, filtro_seguimiento_favorito, filtro_seguimiento_ofertado
+)
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Ids/códigos por sentencia al refrescar (límite de parámetros de SQLite)
+TAMANO_LOTE_REFRESCO = 1000
+
+COLUMNAS_VISTA = [
+    "ca_id", "codigo_ca", "nombre", "estado_ca_texto", "puntuacion_final", "puntaje_detalle",
+    "fecha_publicacion", "fecha_cierre", "fecha_cierre_segundo_llamado", "proveedores_cotizando", "monto_clp",
+    "organismo_nombre", "es_favorito", "es_ofertada", "tiene_nota", "es_candidata",
+]
+
+
+def _select_origen():
+    """Filas de ca_vista_trabajo calculadas desde las tablas vivas (mismas reglas que las pestañas)."""
+    es_candidata = and_(
+        filtro_estado_abierto(), or_(CaSeguimiento.ca_id.is_(None), ~filtro_seguimiento_marcado())
+    )
+    return select(
+        CaLicitacion.ca_id, CaLicitacion.codigo_ca, CaLicitacion.nombre, CaLicitacion.estado_ca_texto,
+        func.coalesce(CaLicitacion.puntuacion_final, 0), CaLicitacion.puntaje_detalle,
+        CaLicitacion.fecha_publicacion, CaLicitacion.fecha_cierre, CaLicitacion.fecha_cierre_segundo_llamado,
+        CaLicitacion.proveedores_cotizando, CaLicitacion.monto_clp,
+        func.coalesce(CaOrganismo.nombre, "N/A"),
+        func.coalesce(CaSeguimiento.es_favorito, False),
+        func.coalesce(CaSeguimiento.es_ofertada, False),
+        func.coalesce(and_(CaSeguimiento.notas.isnot(None), func.trim(CaSeguimiento.notas) != ""), False),
+        es_candidata,
+    ).outerjoin(
+        CaOrganismo, CaLicitacion.organismo_id == CaOrganismo.organismo_id
+    ).outerjoin(CaSeguimiento, CaLicitacion.ca_id == CaSeguimiento.ca_id).where(
+        or_(es_candidata, filtro_seguimiento_favorito(), filtro_seguimiento_ofertado())
+    )
+
+
+class VistaTrabajoRepository:
+    """
+    Mantiene ca_vista_trabajo, el read model de las pestañas de trabajo. Los
+    repositorios que escriben compras o seguimiento llaman a 'refrescar' con su
+    propia sesión, antes del commit, solo para las compras que tocaron: la tabla
+    resumen cambia en la misma transacción que los datos de origen.
+    """
+    def __init__(self, session_factory: sessionmaker[Session]):
+        self.session_factory = session_factory
+
+    @staticmethod
+    def refrescar(session: Session, ca_ids: Optional[Iterable[int]] = None, codigos: Optional[Iterable[str]] = None) -> int:
+        """
+        Recalcula las filas de las compras indicadas (por 'ca_ids' o 'codigos') dentro
+        de la transacción de 'session': upsert de las que siguen visibles en alguna
+        pestaña y borrado de las que ya no. Retorna las filas escritas.
+
+        Dos escritores concurrentes sobre la misma compra (ETL, cola de escritura,
+        mantenimiento) se serializan en el lock de las filas de ca_licitacion: el
+        segundo lee recién cuando el primero confirma (READ COMMITTED toma una
+        foto por sentencia) y no reescribe la fila con datos viejos. El upsert
+        evita además el choque con la PK de un DELETE + INSERT que no ve la fila
+        recién insertada por el otro.
+        """
+        if ca_ids is not None:
+            claves, origen, destino = list(ca_ids), CaLicitacion.ca_id, CaVistaTrabajo.ca_id
+        elif codigos is not None:
+            claves, origen, destino = list(codigos), CaLicitacion.codigo_ca, CaVistaTrabajo.codigo_ca
+        else:
+            raise ValueError("Indique 'ca_ids' o 'codigos' (para reconstruir todo use 'reconstruir').")
+
+        escritas = 0
+        for inicio in range(0, len(claves), TAMANO_LOTE_REFRESCO):
+            lote = claves[inicio:inicio + TAMANO_LOTE_REFRESCO]
+            # FOR NO KEY UPDATE (SQLite ya tiene un solo escritor y lo omite)
+            session.execute(
+                select(CaLicitacion.ca_id).where(origen.in_(lote)).order_by(CaLicitacion.ca_id)
+                .with_for_update(key_share=True)
+            )
+            visibles = _select_origen().where(origen.in_(lote))
+            session.execute(delete(CaVistaTrabajo.__table__).where(
+                destino.in_(lote), CaVistaTrabajo.ca_id.notin_(select(visibles.subquery().c.ca_id))
+            ))
+            stmt = insert_upsert(session, CaVistaTrabajo.__table__).from_select(COLUMNAS_VISTA, visibles)
+            escritas += session.execute(stmt.on_conflict_do_update(
+                index_elements=[CaVistaTrabajo.ca_id],
+                set_={c: stmt.excluded[c] for c in COLUMNAS_VISTA if c != "ca_id"},
+            )).rowcount
+        return escritas
+
+    @staticmethod
+    def refrescar_organismos(session: Session, organismo_ids: Iterable[int]) -> int:
+        """Como 'refrescar', para todas las compras de los organismos indicados (nombre cambiado o fusión)."""
+        ids = list(organismo_ids)
+        if not ids: return 0
+        ca_ids = session.scalars(select(CaLicitacion.ca_id).where(CaLicitacion.organismo_id.in_(ids))).all()
+        return VistaTrabajoRepository.refrescar(session, ca_ids=ca_ids)
+
+    def reconstruir(self) -> int:
+        """Regenera la tabla completa en una transacción (carga inicial o reparación)."""
+        with self.session_factory() as session:
+            try:
+                session.execute(delete(CaVistaTrabajo.__table__))
+                filas = session.execute(insert(CaVistaTrabajo.__table__).from_select(COLUMNAS_VISTA, _select_origen())).rowcount
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+        logger.info(f"Vista de trabajo reconstruida: {filas} filas.")
+        return filas
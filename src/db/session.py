@@ -2,26 +2,38 @@
 """
 Configuración de la Sesión de Base de Datos (SQLAlchemy).
 
-Este módulo establece la conexión con la base de datos PostgreSQL y 
-configura la fábrica de sesiones para el manejo de transacciones.
+Este módulo establece la conexión con la base de datos (PostgreSQL o el
+archivo SQLite embebido, ver src/db/dialecto.py) y configura la fábrica
+de sesiones para el manejo de transacciones.
 """
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
-from config.config import DATABASE_URL
+from config.config import DATABASE_URL, DATABASE_URL_LECTURA, INSTRUMENTACION_SQL, POOL_LECTURA
+from src.db.dialecto import crear_engine
+from src.db.enrutador_sesiones import EnrutadorSesiones
+from src.db.instrumentacion import instrumentacion
 from src.utils.logger import configurar_logger
 
 logger = configurar_logger(__name__)
 
 # --- Creación del Motor de Base de Datos (Engine) ---
 try:
-    engine = create_engine(
-        DATABASE_URL,
-        # 'pool_pre_ping': Verifica la conexión antes de usarla, 
-        # recuperándose automáticamente de desconexiones del servidor.
-        pool_pre_ping=True,  
-        echo=False
-    )
-    logger.info("Motor SQLAlchemy (Engine) inicializado correctamente.")
+    # PostgreSQL: 'pool_pre_ping' verifica la conexión antes de usarla, recuperándose
+    # de desconexiones del servidor. SQLite embebido: WAL y PRAGMA de puesto único.
+    engine = crear_engine(DATABASE_URL, echo=False)
+    # Lecturas (PostgreSQL): réplica si hay DATABASE_URL_LECTURA; si no, un pool propio de
+    # solo lectura (los listados no esperan conexiones ocupadas por el ETL). En SQLite
+    # embebido todo usa el mismo engine (WAL ya deja leer mientras se escribe).
+    engine_lectura = None
+    if engine.dialect.name == "postgresql":
+        engine_lectura = crear_engine(
+            DATABASE_URL_LECTURA or DATABASE_URL, echo=False, pool_size=POOL_LECTURA,
+            execution_options={"postgresql_readonly": True},
+        )
+    if INSTRUMENTACION_SQL:
+        # Tiempo, filas y origen de cada sentencia (ver src/db/instrumentacion.py)
+        for motor in filter(None, (engine, engine_lectura)):
+            instrumentacion.instalar(motor)
+    logger.info(f"Motor SQLAlchemy (Engine) inicializado correctamente ({engine.dialect.name}).")
 except Exception as e:
     logger.critical(f"Error crítico al inicializar el motor de base de datos: {e}")
     raise e
@@ -34,4 +46,16 @@ SessionLocal = sessionmaker(
     autoflush=False,
     bind=engine,
     class_=Session,
-)
\ No newline at end of file
+)
+
+SessionLectura = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=engine_lectura,
+    class_=Session,
+) if engine_lectura is not None else None
+
+# session_factory de la aplicación: escrituras al primario, 'lectura()' a la
+# réplica o al pool de solo lectura (ver src/db/enrutador_sesiones.py)
+# Sin DATABASE_URL_LECTURA el pool de lectura es el mismo primario: no hay réplica que esperar
+sesiones = EnrutadorSesiones(SessionLocal, SessionLectura, replica=bool(DATABASE_URL_LECTURA))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Unidad de Trabajo (una conexión y transacciones por lotes) para el ETL.
+
+Fuera de una unidad cada llamada a un repositorio toma una conexión del pool
+(con su pool_pre_ping), abre una transacción y hace commit. Dentro de
+'with UnidadTrabajo(...)' todas las sesiones que el session_factory entrega en
+ese hilo comparten una sola conexión y una transacción externa:
+
+- El commit de cada sesión libera un SAVEPOINT y su rollback vuelve a él
+  (join_transaction_mode='create_savepoint'): un error aísla solo esa llamada.
+- 'item()' agrupa varias llamadas en un SAVEPOINT propio (todo o nada por ítem).
+- La transacción externa se confirma cada 'tamano_transaccion' unidades
+  completadas (llamadas con commit fuera de un ítem, o ítems) o cada
+  'segundos_transaccion', lo que ocurra primero, y al salir. Al salir por una
+  excepción también se confirma lo completado: equivale a los commits por
+  llamada que reemplaza.
+- Ambos límites se revisan al abrir una sesión o un ítem. Antes de esperar
+  fuera de la base (descargas, pausas) el llamador usa 'confirmar_antes_de_esperar()':
+  si no, la transacción queda 'idle in transaction' con los locks de lo escrito.
+- 'al_confirmar(fn)' difiere efectos hasta que el lote llega a la base (p. ej.
+  publicar ids en la caché de organismos); el rollback del lote o del ítem
+  que los registró los descarta. 'al_confirmar_lote' se llama tras cada lote.
+"""
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from config.config import SEGUNDOS_TRANSACCION_ETL, TAMANO_TRANSACCION_ETL
+from src.utils.logger import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# Clave en session.info de las sesiones que pertenecen a una unidad de trabajo
+CLAVE_UNIDAD = "unidad_trabajo"
+
+_unidad_actual: ContextVar[Optional["UnidadTrabajo"]] = ContextVar("unidad_trabajo", default=None)
+
+
+def unidad_actual() -> Optional["UnidadTrabajo"]:
+    """Unidad de trabajo activa en este hilo (None fuera de una)."""
+    return _unidad_actual.get()
+
+
+def aislar_item():
+    """SAVEPOINT por ítem dentro de la unidad activa; sin unidad no hace nada."""
+    unidad = unidad_actual()
+    return unidad.item() if unidad is not None else nullcontext()
+
+
+def confirmar_antes_de_esperar():
+    """Confirma lo completado en la unidad activa antes de una espera larga; sin unidad no hace nada."""
+    unidad = unidad_actual()
+    if unidad is not None:
+        unidad.antes_de_esperar()
+
+
+class UnidadTrabajo:
+    def __init__(self, session_factory: sessionmaker[Session], tamano_transaccion: int = TAMANO_TRANSACCION_ETL,
+                 segundos_transaccion: float = SEGUNDOS_TRANSACCION_ETL):
+        self.session_factory = session_factory
+        self.tamano_transaccion = max(1, tamano_transaccion)
+        self.segundos_transaccion = segundos_transaccion
+        self.confirmaciones = 0
+
+        self._conexion = None
+        self._transaccion = None
+        self._token = None
+        self._inicio_lote = 0.0
+        self._completadas = 0
+        self._profundidad_items = 0
+        self._sesiones = weakref.WeakSet()
+        self._al_confirmar: List[Callable[[], None]] = []
+        # Se llama tras cada commit de la transacción externa (p. ej. leer lo propio del enrutador)
+        self.al_confirmar_lote: Optional[Callable[[], None]] = None
+
+    # --- Ciclo de vida ---
+
+    def __enter__(self) -> "UnidadTrabajo":
+        if _unidad_actual.get() is not None:
+            raise RuntimeError("Ya hay una unidad de trabajo activa en este hilo.")
+        self._conexion = self.session_factory.kw["bind"].connect()
+        self._iniciar_lote()
+        self._token = _unidad_actual.set(self)
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        _unidad_actual.reset(self._token)
+        try:
+            if self._transaccion.is_active:
+                self._confirmar_lote()
+            else:
+                self._revertir_lote()
+        except Exception as e:
+            logger.error(f"Unidad de trabajo: no se pudo confirmar el último lote: {e}")
+            self._revertir_lote()
+            if tipo is None:
+                raise
+        finally:
+            self._conexion.close()
+            self._conexion = None
+        logger.debug(f"Unidad de trabajo cerrada tras {self.confirmaciones} commits.")
+        return False
+
+    # --- API ---
+
+    def sesion(self) -> Session:
+        """Sesión sobre la conexión de la unidad (la entrega el session_factory que la creó)."""
+        self._confirmar_si_corresponde()
+        session = self.session_factory(
+            bind=self._conexion, join_transaction_mode="create_savepoint", info={CLAVE_UNIDAD: self}
+        )
+        event.listen(session, "after_commit", self._al_liberar_savepoint)
+        self._sesiones.add(session)
+        return session
+
+    @contextmanager
+    def item(self):
+        """Agrupa las llamadas del bloque en un SAVEPOINT: si algo falla se deshace el ítem completo."""
+        self._confirmar_si_corresponde()
+        punto = self._conexion.begin_nested()
+        acciones_previas = len(self._al_confirmar)
+        self._profundidad_items += 1
+        try:
+            yield self
+        except BaseException:
+            if punto.is_active:
+                punto.rollback()
+            # Lo diferido por el ítem describe filas que ya no existen
+            del self._al_confirmar[acciones_previas:]
+            raise
+        else:
+            if punto.is_active:
+                punto.commit()
+            if self._profundidad_items == 1:
+                self._completadas += 1
+        finally:
+            self._profundidad_items -= 1
+
+    def al_confirmar(self, funcion: Callable[[], None]):
+        """Ejecuta 'funcion' cuando el lote en curso se confirme (se descarta si se revierte)."""
+        self._al_confirmar.append(funcion)
+
+    def confirmar(self):
+        """Confirma ya el lote en curso (sin sesiones ni ítems abiertos)."""
+        if self._profundidad_items or any(s.in_transaction() for s in self._sesiones):
+            raise RuntimeError("No se puede confirmar con sesiones o ítems abiertos.")
+        self._confirmar_lote()
+        self._iniciar_lote()
+
+    def antes_de_esperar(self):
+        """Confirma lo completado si no hay sesiones ni ítems abiertos (sin escrituras no hace nada)."""
+        if not self._completadas or self._profundidad_items:
+            return
+        if any(s.in_transaction() for s in self._sesiones):
+            return
+        self.confirmar()
+
+    # --- Internos ---
+
+    def _al_liberar_savepoint(self, session: Session):
+        if self._profundidad_items == 0:
+            self._completadas += 1
+
+    def _confirmar_si_corresponde(self):
+        if not self._completadas or self._profundidad_items:
+            return
+        vencido = time.monotonic() - self._inicio_lote >= self.segundos_transaccion
+        if self._completadas < self.tamano_transaccion and not vencido:
+            return
+        # Una sesión con su SAVEPOINT abierto (llamadas anidadas) impide cortar el lote
+        if any(s.in_transaction() for s in self._sesiones):
+            return
+        self.confirmar()
+
+    def _iniciar_lote(self):
+        self._transaccion = self._conexion.begin()
+        self._inicio_lote = time.monotonic()
+        self._completadas = 0
+
+    def _confirmar_lote(self):
+        self._transaccion.commit()
+        self.confirmaciones += 1
+        pendientes, self._al_confirmar = self._al_confirmar, []
+        if self.al_confirmar_lote is not None:
+            pendientes.append(self.al_confirmar_lote)
+        for funcion in pendientes:
+            try:
+                funcion()
+            except Exception as e:
+                logger.error(f"Unidad de trabajo: error en acción posterior al commit: {e}")
+
+    def _revertir_lote(self):
+        self._al_confirmar = []
+        if self._transaccion is not None and self._transaccion.is_active:
+            self._transaccion.rollback()
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import List, Mapping
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import QTableWidgetItem, QHeaderView
 from qfluentwidgets import TableWidget
@@ -14,6 +14,8 @@ class LicitacionesTable(TableWidget):
     """
     # Señales: (data_row, global_position)
     custom_context_menu_requested = Signal(dict, object) 
+    # Señales: (codigos_ca, global_position) cuando el clic derecho cae sobre una selección de varias filas
+    seleccion_context_menu_requested = Signal(list, object)
     # Señales: (codigo_ca)
     row_double_clicked = Signal(str)
 
@@ -28,6 +30,7 @@ class LicitacionesTable(TableWidget):
         
         # Comportamiento de Selección y Edición
         self.setSelectionBehavior(TableWidget.SelectRows)
+        self.setSelectionMode(TableWidget.ExtendedSelection) # Ctrl/Shift para acciones en lote
         self.setEditTriggers(TableWidget.NoEditTriggers) # Bloqueo global de edición
         
         # --- Definición de Columnas ---
@@ -71,15 +74,25 @@ class LicitacionesTable(TableWidget):
         self.customContextMenuRequested.connect(self._on_context_menu)
         
         # Almacén de datos local
-        self.current_data: List[Dict] = []
+        self.current_data: List[Mapping] = []
 
-    def set_data(self, data_list: List[Dict]):
-        """Recibe la lista de diccionarios del Controller y llena la tabla."""
-        self.current_data = data_list
-        self.setRowCount(len(data_list))
+    def set_data(self, data_list: List[Mapping]):
+        """Recibe las filas del Controller (dicts o RowMapping) y llena la tabla."""
+        self.current_data = list(data_list)
+        self.setRowCount(0)
+        self._agregar_filas(self.current_data)
+
+    def append_data(self, data_list: List[Mapping]):
+        """Agrega al final una página más de filas (paginación por keyset)."""
+        self.current_data.extend(data_list)
+        self._agregar_filas(data_list)
+
+    def _agregar_filas(self, data_list: List[Mapping]):
+        inicio = self.rowCount()
+        self.setRowCount(inicio + len(data_list))
         self.setSortingEnabled(False) # Desactivar sorting mientras insertamos masivamente
 
-        for row, item in enumerate(data_list):
+        for row, item in enumerate(data_list, start=inicio):
             # Helper para crear items de SOLO LECTURA
             def create_item(text):
                 it = QTableWidgetItem(str(text))
@@ -150,11 +163,45 @@ class LicitacionesTable(TableWidget):
             if codigo:
                 self.row_double_clicked.emit(codigo)
 
+    def _filas_de(self, codigos) -> List[int]:
+        """Filas visibles cuyo 'Código' está en 'codigos'."""
+        codigos = set(codigos)
+        return [row for row in range(self.rowCount()) if self.item(row, 4) and self.item(row, 4).text() in codigos]
+
+    def quitar_filas(self, codigos: List[str]):
+        """Saca de la tabla (y de current_data) las compras que dejaron esta pestaña, sin recargar."""
+        codigos = set(codigos)
+        for row in reversed(self._filas_de(codigos)):
+            self.removeRow(row)
+        self.current_data = [fila for fila in self.current_data if fila.get('codigo_ca') not in codigos]
+
+    def marcar_nota(self, codigos: List[str], tiene_nota: bool):
+        """Actualiza el icono de nota en memoria."""
+        for row in self._filas_de(codigos):
+            nota_item = self.item(row, 1)
+            nota_item.setText("📝" if tiene_nota else "")
+            nota_item.setToolTip("Esta licitación tiene notas personales." if tiene_nota else "")
+        codigos = set(codigos)
+        self.current_data = [
+            {**fila, 'tiene_nota': tiene_nota} if fila.get('codigo_ca') in codigos else fila
+            for fila in self.current_data
+        ]
+
+    def codigos_seleccionados(self) -> List[str]:
+        """Códigos de las filas seleccionadas, leídos de la columna 'Código' (sirve con la tabla ordenada)."""
+        filas = sorted({index.row() for index in self.selectedIndexes()})
+        return [self.item(row, 4).text() for row in filas if self.item(row, 4)]
+
     def _on_context_menu(self, pos):
         item = self.itemAt(pos)
         if item:
             row = item.row()
             global_pos = self.mapToGlobal(pos)
+            codigos = self.codigos_seleccionados()
+            if len(codigos) > 1 and item.isSelected():
+                self.seleccion_context_menu_requested.emit(codigos, global_pos)
+                return
             if 0 <= row < len(self.current_data):
-                data_row = self.current_data[row]
+                # Las filas pueden venir como RowMapping (solo lectura): la señal espera dict
+                data_row = dict(self.current_data[row])
                 self.custom_context_menu_requested.emit(data_row, global_pos)
\ No newline at end of file
@@ -39,6 +39,11 @@ class MainWindow(FluentWindow):
         # 4. Inicializar Navegación (igual que antes)
         self.init_navigation()
 
+    def closeEvent(self, event):
+        # Guarda lo que quede en la cola de escritura antes de salir
+        self.controller.cerrar()
+        super().closeEvent(event)
+
     def init_navigation(self):
         # A. Home (Opcional, dashboard)
         self.addSubInterface(
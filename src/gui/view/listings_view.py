@@ -1,6 +1,6 @@
 # src/gui/views/listings_view.py
-from PySide6.QtWidgets import QFrame, QVBoxLayout, QHBoxLayout, QMenu
-from PySide6.QtCore import Qt, QUrl
+from PySide6.QtWidgets import QFrame, QVBoxLayout, QHBoxLayout, QMenu, QLabel
+from PySide6.QtCore import Qt, QUrl, QTimer
 from PySide6.QtGui import QAction, QDesktopServices
 from src.gui.componentes.note_dialog import NoteDialog
 from src.gui.componentes.detail_drawer import DetailDrawer
@@ -21,6 +21,10 @@ class ListingsView(QFrame):
         super().__init__(parent)
         self.controller = controller
         self.view_type = view_type
+        self.cursor = None  # Cursor keyset de la última página cargada
+        self.total_estimado = 0
+        self._desactualizada = False  # Cambios guardados desde otra pestaña: recargar al mostrarse
+        self._leida_con_pendientes = False  # Leída antes de que la cola confirmara: le pueden faltar filas
         self.setObjectName(view_type) # Para estilos CSS si fuera necesario
 
         # Layout Principal
@@ -32,8 +36,13 @@ class ListingsView(QFrame):
         self.h_layout = QHBoxLayout()
         
         self.search_box = SearchLineEdit(self)
-        self.search_box.setPlaceholderText("Buscar por código, nombre u organismo...")
-        self.search_box.textChanged.connect(self.filtrar_tabla)
+        self.search_box.setPlaceholderText("Buscar por código, nombre, organismo o producto...")
+        # La búsqueda va al servidor: se espera a que el usuario deje de escribir
+        self.timer_busqueda = QTimer(self)
+        self.timer_busqueda.setSingleShot(True)
+        self.timer_busqueda.setInterval(300)
+        self.timer_busqueda.timeout.connect(self.cargar_datos)
+        self.search_box.textChanged.connect(self.timer_busqueda.start)
         
         self.btn_refresh = PrimaryPushButton("Refrescar Tablas", self)
         self.btn_refresh.setIcon(FIF.SYNC)
@@ -48,19 +57,59 @@ class ListingsView(QFrame):
         self.table = LicitacionesTable(self)
         self.table.row_double_clicked.connect(self.abrir_detalle)
         self.table.custom_context_menu_requested.connect(self.mostrar_menu_contextual)
+        self.table.seleccion_context_menu_requested.connect(self.mostrar_menu_seleccion)
+        self.controller.senales_escritura.guardado.connect(self._al_guardar_cola)
+        self.controller.senales_escritura.fallo.connect(self._al_fallar_cola)
         
         self.v_layout.addWidget(self.table)
 
-        # 3. Cargar datos iniciales
+        # 3. Paginación: las filas se piden por ventanas al llegar al final
+        self.p_layout = QHBoxLayout()
+        self.lbl_conteo = QLabel(self)
+        self.btn_mas = PrimaryPushButton("Cargar más", self)
+        self.btn_mas.clicked.connect(self.cargar_mas)
+        self.p_layout.addWidget(self.lbl_conteo)
+        self.p_layout.addStretch(1)
+        self.p_layout.addWidget(self.btn_mas)
+        self.v_layout.addLayout(self.p_layout)
+
+        # 4. Cargar datos iniciales
         self.cargar_datos()
 
     def cargar_datos(self):
-        """Pide al controlador los datos frescos y actualiza la tabla."""
+        """Pide al controlador la primera página fresca (de la vista o de la búsqueda) y reinicia la tabla."""
+        self._cargar_pagina(primera=True)
+
+    def cargar_mas(self):
+        """Agrega la página siguiente a la tabla."""
+        self._cargar_pagina(primera=False)
+
+    def _cargar_pagina(self, primera: bool):
         # Mostrar loading ligero
         self.btn_refresh.setEnabled(False)
+        self.btn_mas.setEnabled(False)
         try:
-            datos = self.controller.get_data_for_view(self.view_type)
-            self.table.set_data(datos)
+            if primera:
+                self._leida_con_pendientes = self.controller.hay_escrituras_pendientes()
+            cursor = None if primera else self.cursor
+            texto = self.search_box.text().strip()
+            if texto:
+                pagina = self.controller.search_licitaciones(texto, cursor)
+            else:
+                pagina = self.controller.get_page_for_view(self.view_type, cursor)
+            if primera:
+                self.total_estimado = pagina.get("total", 0)
+                self.table.set_data(pagina["filas"])
+            else:
+                self.table.append_data(pagina["filas"])
+            self.cursor = pagina["cursor"]
+            self.btn_mas.setVisible(pagina["hay_mas"])
+            self.btn_mas.setEnabled(pagina["hay_mas"])
+            cargadas = self.table.rowCount()
+            if texto:
+                self.lbl_conteo.setText(f"{cargadas}{'+' if pagina['hay_mas'] else ''} resultados para '{texto}'")
+            else:
+                self.lbl_conteo.setText(f"{cargadas} de ~{max(self.total_estimado, cargadas)}")
         except Exception as e:
             InfoBar.error(
                 title="Error de Carga",
@@ -73,19 +122,6 @@ class ListingsView(QFrame):
         finally:
             self.btn_refresh.setEnabled(True)
 
-    def filtrar_tabla(self, texto):
-        """Filtro rápido en cliente (sin ir a BD)."""
-        texto = texto.lower()
-        for i in range(self.table.rowCount()):
-            ocultar = True
-            # Buscamos en Código (col 2), Organismo (col 3) y Nombre (col 4)
-            for col_idx in [2, 3, 4]:
-                item = self.table.item(i, col_idx)
-                if item and texto in item.text().lower():
-                    ocultar = False
-                    break
-            self.table.setRowHidden(i, ocultar)
-
     def abrir_detalle(self, codigo_ca: str):
         data = self.controller.get_licitacion_detail(codigo_ca)
         if data:
@@ -137,25 +173,57 @@ class ListingsView(QFrame):
 
         menu.exec(global_pos)
 
+    def mostrar_menu_seleccion(self, codigos: list, global_pos):
+        """Menú para varias filas: cada acción es un solo upsert en lote."""
+        menu = QMenu(self)
+        n = len(codigos)
+
+        action_nota = QAction(FIF.EDIT.icon(), f"Agregar nota a {n} compras", self)
+        action_nota.triggered.connect(lambda: self._gestionar_nota_lote(codigos))
+        menu.addAction(action_nota)
+        menu.addSeparator()
+
+        if self.view_type in ("candidatas", "ofertadas"):
+            action_seg = QAction(FIF.HEART.icon(), f"Seguir {n} compras", self)
+            action_seg.triggered.connect(lambda: self._accion_lote(
+                self.controller.move_to_seguimiento_many, codigos, "Movidas a Seguimiento"))
+            menu.addAction(action_seg)
+
+        if self.view_type in ("candidatas", "seguimiento"):
+            action_ofertar = QAction(FIF.SHOPPING_CART.icon(), f"Mover {n} compras a Ofertadas", self)
+            action_ofertar.triggered.connect(lambda: self._accion_lote(
+                self.controller.move_to_ofertar_many, codigos, "Movidas a Ofertadas"))
+            menu.addAction(action_ofertar)
+
+        action_ocultar = QAction(FIF.DELETE.icon(), f"Dejar de seguir / ocultar {n} compras", self)
+        action_ocultar.triggered.connect(lambda: self._accion_lote(
+            self.controller.stop_following_many, codigos, "Ocultadas"))
+        menu.addAction(action_ocultar)
+
+        menu.exec(global_pos)
+
     # --- ACCIONES DEL MENÚ ---
 
     def _abrir_web(self, codigo):
         url = f"{URL_BASE_WEB}/ficha?code={codigo}" # Usamos constante de config.py
         QDesktopServices.openUrl(QUrl(url))
 
+    # Las marcas se guardan en segundo plano (cola del controlador). Toda acción
+    # saca la fila de esta pestaña, así que se quita en memoria sin recargar.
+
     def _mover_seguimiento(self, codigo):
         self.controller.move_to_seguimiento(codigo)
-        self.cargar_datos() # Refrescar para ver cambios
+        self.table.quitar_filas([codigo])
         InfoBar.success("Movido a Seguimiento", f"{codigo} ahora es favorita.", parent=self)
 
     def _mover_ofertar(self, codigo):
         self.controller.move_to_ofertar(codigo)
-        self.cargar_datos()
+        self.table.quitar_filas([codigo])
         InfoBar.success("Movido a Ofertadas", f"{codigo} marcada como ofertada.", parent=self)
 
     def _dejar_seguir(self, codigo):
         self.controller.stop_following(codigo)
-        self.cargar_datos() # Desaparecerá de la lista
+        self.table.quitar_filas([codigo]) # Desaparece de la lista
         InfoBar.warning("Eliminado", f"{codigo} ya no está en seguimiento.", parent=self)
 
     def _gestionar_nota(self, codigo):
@@ -168,4 +236,51 @@ class ListingsView(QFrame):
             # 3. Guardar si el usuario aceptó
             nueva_nota = dlg.get_text()
             self.controller.save_note(codigo, nueva_nota)
-            InfoBar.success("Nota Guardada", f"Nota actualizada para {codigo}", parent=self)
\ No newline at end of file
+            self.table.marcar_nota([codigo], bool(nueva_nota.strip()))
+            InfoBar.success("Nota Guardada", f"Nota actualizada para {codigo}", parent=self)
+
+    # --- ACCIONES EN LOTE ---
+
+    def _accion_lote(self, accion, codigos, titulo):
+        encoladas = accion(codigos)
+        self.table.quitar_filas(codigos)
+        InfoBar.success(titulo, f"{encoladas} de {len(codigos)} compras actualizadas.", parent=self)
+
+    def _gestionar_nota_lote(self, codigos):
+        dlg = NoteDialog(f"{len(codigos)} compras", "", parent=self.window())
+        if dlg.exec():
+            nota = dlg.get_text()
+            encoladas = self.controller.save_note_many(codigos, nota)
+            self.table.marcar_nota(codigos, bool(nota.strip()))
+            InfoBar.success("Nota Guardada", f"Nota guardada en {encoladas} compras.", parent=self)
+
+    # --- AVISOS DE LA COLA DE ESCRITURA ---
+
+    def _al_guardar_cola(self, _confirmadas: int):
+        # Otra pestaña pudo ganar filas: se recarga al volver a mostrarse
+        if not self.isVisible():
+            self._desactualizada = True
+        elif self._leida_con_pendientes:
+            # Se leyó con cambios aún en la cola: las filas que estos agregan llegan ahora
+            self.cargar_datos()
+
+    def _al_fallar_cola(self, error: str):
+        # El cambio optimista no llegó a la base: se vuelve al estado real
+        if self.isVisible():
+            self.cargar_datos()
+            InfoBar.error(
+                title="No se pudo guardar",
+                content=f"Los últimos cambios de seguimiento no se guardaron: {error}",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.BOTTOM_RIGHT,
+                parent=self
+            )
+        else:
+            self._desactualizada = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._desactualizada:
+            self._desactualizada = False
+            self.cargar_datos()
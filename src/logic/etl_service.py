@@ -5,8 +5,14 @@ Orquestador principal del proceso de scraping y puntuación.
 """
 import time
 import datetime
-from typing import TYPE_CHECKING, List, Dict
+from typing import TYPE_CHECKING, List, Dict, Optional, Set
 from src.utils.logger import configurar_logger
+from src.utils.huellas import huella_ficha
+from src.db.instrumentacion import instrumentar_metodos, operacion
+from src.db.unidad_trabajo import aislar_item, confirmar_antes_de_esperar
+from config.config import (
+    MOTOR_PUNTAJES_SQL, PUNTOS_SEGUNDO_LLAMADO, UMBRAL_FASE_2, DIAS_GRACIA_CIERRE, DIAS_RETENCION
+)
 
 from src.utils.exceptions import (
     ErrorScrapingFase1, ErrorCargaBD, ErrorTransformacionBD,
@@ -20,6 +26,10 @@ if TYPE_CHECKING:
 
 logger = configurar_logger(__name__)
 
+# Fichas acumuladas antes de cada escritura en BD durante la Fase 2
+TAMANO_LOTE_FASE_2 = 50
+
+@instrumentar_metodos("ETL")
 class ServicioEtl:
     def __init__(self, db_service: "DbService", scraper_service: "ServicioScraper", score_engine: "MotorPuntajes"):
         self.db_service = db_service
@@ -72,37 +82,56 @@ class ServicioEtl:
             emitir_porcentaje(100)
             return 0 
 
-        # 2. CARGA (Bulk Upsert)
-        emitir_porcentaje(20)
-        emitir_texto(f"Guardando {cantidad_datos} registros en BD...")
-        try:
-            self.db_service.insertar_o_actualizar_masivo(datos)
-        except Exception as e:
-            raise ErrorCargaBD(f"Fallo guardado en BD: {e}") from e
+        # 2-4. Carga, puntajes y Fase 2 comparten una conexión y confirman por lotes
+        with self.db_service.unidad_de_trabajo():
+            # 2. CARGA (Bulk Upsert)
+            emitir_porcentaje(20)
+            emitir_texto(f"Guardando {cantidad_datos} registros en BD...")
+            try:
+                with operacion("ETL.carga"):
+                    resultado = self.db_service.insertar_o_actualizar_masivo(datos)
+            except Exception as e:
+                raise ErrorCargaBD(f"Fallo guardado en BD: {e}") from e
+            emitir_texto(
+                f"{len(resultado['insertados'])} nuevas, {len(resultado['modificados'])} modificadas, "
+                f"{len(resultado['sin_cambios'])} sin cambios."
+            )
             
-        # 3. TRANSFORMACIÓN (Cálculo de Puntajes Fase 1)
-        emitir_porcentaje(30)
-        self._transformar_puntajes_fase_1(emitir_texto, emitir_porcentaje)
+            # 3. TRANSFORMACIÓN (Cálculo de Puntajes Fase 1, solo compras nuevas o modificadas)
+            emitir_porcentaje(30)
+            with operacion("ETL.transformacion"):
+                self._transformar_puntajes_fase_1(
+                    emitir_texto, emitir_porcentaje, codigos=resultado["insertados"] | resultado["modificados"]
+                )
         
-        # 4. ENRIQUECIMIENTO (Fase 2 Automática para las TOP mejores)
-        try:
-            candidatas = self.db_service.obtener_candidatas_para_fase_2(umbral_minimo=10)
-            if candidatas:
-                emitir_texto(f"Iniciando Fase 2 para {len(candidatas)} oportunidades relevantes...")
-                self._procesar_detalle_lote(candidatas, emitir_texto, emitir_porcentaje)
-        except Exception as e:
-            logger.error(f"Error en Fase 2 automática: {e}") 
+            # 4. ENRIQUECIMIENTO (Fase 2 Automática para las TOP mejores)
+            try:
+                with operacion("ETL.enriquecimiento"):
+                    candidatas = self.db_service.obtener_candidatas_para_fase_2(umbral_minimo=UMBRAL_FASE_2)
+                    if candidatas:
+                        emitir_texto(f"Iniciando Fase 2 para {len(candidatas)} oportunidades relevantes...")
+                        self._procesar_detalle_lote(candidatas, emitir_texto, emitir_porcentaje)
+            except Exception as e:
+                logger.error(f"Error en Fase 2 automática: {e}") 
             
         emitir_texto("Proceso Completo.")
         emitir_porcentaje(100)
         
         return cantidad_datos
 
-    def _transformar_puntajes_fase_1(self, callback_texto, callback_porcentaje):
-        """Recalcula puntajes base, guardando SOLO si hubo cambios (Dirty Checking)."""
+    def _transformar_puntajes_fase_1(self, callback_texto, callback_porcentaje, codigos: Optional[Set[str]] = None):
+        """
+        Recalcula puntajes base, guardando SOLO si hubo cambios (Dirty Checking).
+        Con 'codigos' se limita a esas compras; None recalcula toda la tabla.
+        """
         emitir_texto, emitir_porcentaje = self._crear_emisores_progreso(callback_texto, callback_porcentaje)
+        if codigos is not None and not codigos:
+            emitir_texto("No hubo compras nuevas ni modificadas para puntuar.")
+            return
+        if MOTOR_PUNTAJES_SQL and self._transformar_puntajes_en_servidor(emitir_texto, codigos):
+            return
         try:
-            licitaciones_dicts = self.db_service.obtener_datos_para_recalculo_puntajes()
+            licitaciones_dicts = self.db_service.obtener_datos_para_recalculo_puntajes(codigos)
             if not licitaciones_dicts: return
             
             total = len(licitaciones_dicts)
@@ -126,10 +155,10 @@ class ServicioEtl:
                 pts2 = 0
                 det2 = []
                 desc = lic_data.get('descripcion')
-                prods = lic_data.get('productos_solicitados')
+                lineas = lic_data.get('lineas_producto')
                 
-                if desc or (prods and len(prods) > 0):
-                    item_f2 = {'descripcion': desc, 'productos_solicitados': prods}
+                if desc or lineas:
+                    item_f2 = {'descripcion': desc, 'lineas_producto': lineas}
                     pts2, det2 = self.score_engine.calcular_puntaje_fase_2(item_f2)
                 
                 nuevo_score = pts1 + pts2
@@ -154,6 +183,25 @@ class ServicioEtl:
         except Exception as e:
             raise ErrorTransformacionBD(f"Error cálculo puntajes: {e}") from e
 
+    def _transformar_puntajes_en_servidor(self, emitir_texto, codigos: Optional[Set[str]] = None) -> bool:
+        """
+        Recálculo set-based dentro de PostgreSQL. Retorna False si el backend
+        no está disponible, para que el llamador use el cálculo en Python.
+        """
+        try:
+            if not self.db_service.soporta_puntaje_sql():
+                return False
+            self.score_engine.recargar_reglas_memoria()
+            emitir_texto("Recalculando puntajes en el servidor...")
+            cambios = self.db_service.recalcular_puntajes_en_servidor(
+                self.score_engine.cache_palabras_clave, PUNTOS_SEGUNDO_LLAMADO, codigos=codigos
+            )
+            emitir_texto(f"{cambios} puntajes actualizados en el servidor." if cambios else "No hubo cambios en los puntajes.")
+            return True
+        except Exception as e:
+            logger.warning(f"Motor de puntajes SQL no disponible, usando cálculo en Python: {e}")
+            return False
+
     def ejecutar_recalculo_total(self, callback_texto=None, callback_porcentaje=None):
         """Tarea manual de recálculo disparada desde la GUI."""
         emitir_texto, emitir_porcentaje = self._crear_emisores_progreso(callback_texto, callback_porcentaje)
@@ -170,60 +218,67 @@ class ServicioEtl:
         alcances = alcances or ['all']
         
         try:
-            # 1. ACTUALIZACIÓN MASIVA DE ESTADOS (CANDIDATAS)
-            if 'candidatas' in alcances or 'all' in alcances:
-                emitir_texto("Analizando fechas de candidatas activas...")
-                fecha_min, fecha_max = self.db_service.obtener_rango_fechas_candidatas_activas()
+            # Barrido, puntajes y fichas comparten una conexión y confirman por lotes
+            with self.db_service.unidad_de_trabajo():
+                # 1. ACTUALIZACIÓN MASIVA DE ESTADOS (CANDIDATAS)
+                if 'candidatas' in alcances or 'all' in alcances:
+                    emitir_texto("Analizando fechas de candidatas activas...")
+                    fecha_min, fecha_max = self.db_service.obtener_rango_fechas_candidatas_activas()
                 
-                if fecha_min and fecha_max:
-                    hoy = datetime.date.today()
-                    # Asegurar fechas seguras
-                    f_min_safe = fecha_min.date() if isinstance(fecha_min, datetime.datetime) else fecha_min
-                    f_max_safe = fecha_max.date() if isinstance(fecha_max, datetime.datetime) else fecha_max
+                    if fecha_min and fecha_max:
+                        hoy = datetime.date.today()
+                        # Asegurar fechas seguras
+                        f_min_safe = fecha_min.date() if isinstance(fecha_min, datetime.datetime) else fecha_min
+                        f_max_safe = fecha_max.date() if isinstance(fecha_max, datetime.datetime) else fecha_max
                     
-                    limite_atras = hoy - datetime.timedelta(days=5)
-                    if f_min_safe < limite_atras: f_min_safe = limite_atras
+                        limite_atras = hoy - datetime.timedelta(days=5)
+                        if f_min_safe < limite_atras: f_min_safe = limite_atras
 
-                    fecha_tope = max(f_max_safe, hoy)
-                    emitir_texto(f"Actualizando estados ({f_min_safe} al {fecha_tope})...")
+                        fecha_tope = max(f_max_safe, hoy)
+                        emitir_texto(f"Actualizando estados ({f_min_safe} al {fecha_tope})...")
                     
-                    filtros = {'date_from': f_min_safe.strftime('%Y-%m-%d'), 'date_to': fecha_tope.strftime('%Y-%m-%d')}
-                    datos_barrido = self.scraper_service.ejecutar_scraper_listado(emitir_texto, filtros, max_paginas=0)
+                        filtros = {'date_from': f_min_safe.strftime('%Y-%m-%d'), 'date_to': fecha_tope.strftime('%Y-%m-%d')}
+                        datos_barrido = self.scraper_service.ejecutar_scraper_listado(emitir_texto, filtros, max_paginas=0)
                     
-                    if datos_barrido:
-                        emitir_texto(f"Sincronizando {len(datos_barrido)} registros...")
-                        self.db_service.insertar_o_actualizar_masivo(datos_barrido)
-                        self.db_service.cerrar_licitaciones_vencidas_localmente()
-                    else:
-                        emitir_texto("No se detectaron cambios en candidatas.")
-
-            # 2. ACTUALIZACIÓN DE DETALLE (SEGUIMIENTO Y OFERTADAS)
-            necesita_fase2 = 'seguimiento' in alcances or 'ofertadas' in alcances or 'all' in alcances
-            if necesita_fase2:
-                if hasattr(self.scraper_service, 'verificar_sesion'):
-                    self.scraper_service.verificar_sesion(emitir_texto)
-
-                emitir_texto("Seleccionando licitaciones para detalle...")
-                listas_procesar = []
+                        if datos_barrido:
+                            emitir_texto(f"Sincronizando {len(datos_barrido)} registros...")
+                            resultado = self.db_service.insertar_o_actualizar_masivo(datos_barrido)
+                            self.db_service.cerrar_licitaciones_vencidas_localmente()
+                            # Un cambio de estado (ej: segundo llamado) puede alterar el puntaje
+                            self.score_engine.recargar_reglas_memoria()
+                            self._transformar_puntajes_fase_1(
+                                emitir_texto, None, codigos=resultado["insertados"] | resultado["modificados"]
+                            )
+                        else:
+                            emitir_texto("No se detectaron cambios en candidatas.")
+
+                # 2. ACTUALIZACIÓN DE DETALLE (SEGUIMIENTO Y OFERTADAS)
+                necesita_fase2 = 'seguimiento' in alcances or 'ofertadas' in alcances or 'all' in alcances
+                if necesita_fase2:
+                    if hasattr(self.scraper_service, 'verificar_sesion'):
+                        self.scraper_service.verificar_sesion(emitir_texto)
+
+                    emitir_texto("Seleccionando licitaciones para detalle...")
+                    listas_procesar = []
                 
-                if 'all' in alcances:
-                    listas_procesar.append(self.db_service.obtener_licitaciones_seguimiento())
-                    listas_procesar.append(self.db_service.obtener_licitaciones_ofertadas())
-                else:
-                    if 'seguimiento' in alcances: listas_procesar.append(self.db_service.obtener_licitaciones_seguimiento())
-                    if 'ofertadas' in alcances: listas_procesar.append(self.db_service.obtener_licitaciones_ofertadas())
+                    if 'all' in alcances:
+                        listas_procesar.append(self.db_service.obtener_licitaciones_seguimiento())
+                        listas_procesar.append(self.db_service.obtener_licitaciones_ofertadas())
+                    else:
+                        if 'seguimiento' in alcances: listas_procesar.append(self.db_service.obtener_licitaciones_seguimiento())
+                        if 'ofertadas' in alcances: listas_procesar.append(self.db_service.obtener_licitaciones_ofertadas())
                 
-                mapa_unicos = {}
-                for lst in listas_procesar:
-                    for ca in lst: mapa_unicos[ca.ca_id] = ca
+                    mapa_unicos = {}
+                    for lst in listas_procesar:
+                        for ca in lst: mapa_unicos[ca.ca_id] = ca
                 
-                procesar = list(mapa_unicos.values())
+                    procesar = list(mapa_unicos.values())
                 
-                if procesar:
-                    emitir_texto(f"Actualizando detalle de {len(procesar)} CAs...")
-                    self._procesar_detalle_lote(procesar, emitir_texto, emitir_porcentaje)
-                else:
-                    emitir_texto("No hay licitaciones en seguimiento para actualizar.")
+                    if procesar:
+                        emitir_texto(f"Actualizando detalle de {len(procesar)} CAs...")
+                        self._procesar_detalle_lote(procesar, emitir_texto, emitir_porcentaje)
+                    else:
+                        emitir_texto("No hay licitaciones en seguimiento para actualizar.")
 
         except Exception as e:
              raise ErrorScrapingFase2(f"Fallo actualización selectiva: {e}") from e
@@ -235,48 +290,64 @@ class ServicioEtl:
         """
         Descarga el detalle completo (Fase 2) para una lista de licitaciones.
         Soporta tanto diccionarios como objetos CaLicitacion.
+        Las fichas idénticas a la guardada (misma huella) no se reescriben ni se
+        vuelven a puntuar; el resto se guarda en lotes de TAMANO_LOTE_FASE_2. Si un
+        lote falla se reintenta ficha por ficha: una ficha inválida no pierde las demás.
         """
         total = len(candidatas)
         procesados = 0
+        sin_cambios = 0
+        pendientes: List[Dict] = []
+
+        codigos = [c for c in (self._codigo_de(item) for item in candidatas) if c]
+        huellas_actuales = self.db_service.obtener_huellas_ficha(codigos) if codigos else {}
+
+        def guardar_pendientes():
+            nonlocal procesados
+            if not pendientes: return
+            try:
+                procesados += self.db_service.actualizar_fase_2_lote(pendientes)
+            except Exception as e:
+                logger.warning(f"Falló el lote de {len(pendientes)} fichas ({e}); se guardan una por una.")
+                for ficha in pendientes:
+                    try:
+                        with aislar_item():
+                            procesados += self.db_service.actualizar_fase_2_lote([ficha])
+                    except Exception as e_ficha:
+                        logger.error(f"Error guardando ficha {ficha['codigo_ca']}: {e_ficha}")
+            pendientes.clear()
         
         for idx, item in enumerate(candidatas):
-            # --- CORRECCIÓN CRÍTICA: Detección de Tipo ---
-            if hasattr(item, "codigo_ca"): 
-                # Es un Objeto SQLAlchemy (Viene de la BD)
-                codigo = item.codigo_ca
-                puntos_base = item.puntuacion_final or 0
-                detalle_base = item.puntaje_detalle or []
-            else: 
-                # Es un Diccionario (Viene de legacy o pruebas)
-                codigo = item.get('codigo') or item.get('codigo_ca')
-                puntos_base = item.get('puntuacion_final', 0)
-                detalle_base = item.get('puntaje_detalle', [])
-            
+            codigo = self._codigo_de(item)
             if not codigo: continue
-            # ---------------------------------------------
             
             try:
+                # Lo ya guardado no retiene locks mientras se descarga la ficha
+                confirmar_antes_de_esperar()
                 datos_obj = self.scraper_service.extraer_detalle_api(None, codigo)
 
                 if datos_obj:
                     # Convertimos modelo Pydantic a dict
                     datos = datos_obj.model_dump()
+                    huella = huella_ficha(datos)
 
-                    # 1. Calcular Puntaje Fase 2
-                    pts_prod, det_prod = self.score_engine.calcular_puntaje_fase_2(datos)
-                    
-                    # 2. Recalcular total (Sumando a lo que ya tenía)
-                    nuevo_total = puntos_base + pts_prod
-                    nuevo_detalle = detalle_base + det_prod
-
-                    # 3. Guardar en BD (Fase 2)
-                    self.db_service.actualizar_fase_2_detalle(
-                        codigo_ca=codigo,
-                        datos_fase_2=datos,
-                        puntuacion_total=nuevo_total,
-                        detalle_completo=nuevo_detalle
-                    )
-                    procesados += 1
+                    if huella == huellas_actuales.get(codigo):
+                        sin_cambios += 1
+                    else:
+                        # 1. Puntaje base (Fase 1) + Puntaje Fase 2 de la ficha nueva
+                        puntos_base, detalle_base = self._puntaje_base(item, datos)
+                        pts_prod, det_prod = self.score_engine.calcular_puntaje_fase_2(datos)
+
+                        # 2. Encolar para guardado por lotes
+                        pendientes.append({
+                            "codigo_ca": codigo,
+                            "datos_fase_2": datos,
+                            "puntuacion_total": puntos_base + pts_prod,
+                            "detalle_completo": detalle_base + det_prod,
+                            "huella": huella,
+                        })
+                        if len(pendientes) >= TAMANO_LOTE_FASE_2:
+                            guardar_pendientes()
                 else:
                     logger.warning(f"No se pudo descargar info para {codigo}")
                 
@@ -290,21 +361,49 @@ class ServicioEtl:
             except Exception as e:
                 logger.error(f"Error procesando detalle {codigo}: {e}")
 
-        emitir_texto("Fase 2 Completada.")
+        guardar_pendientes()
+        if sin_cambios:
+            logger.info(f"Fase 2: {sin_cambios} fichas sin cambios omitidas.")
+        emitir_texto(f"Fase 2 Completada ({procesados} actualizadas, {sin_cambios} sin cambios).")
+
+    @staticmethod
+    def _codigo_de(item) -> Optional[str]:
+        if hasattr(item, "codigo_ca"):
+            # Es un Objeto SQLAlchemy (Viene de la BD)
+            return item.codigo_ca
+        # Es un Diccionario (Viene de legacy o pruebas)
+        return item.get('codigo') or item.get('codigo_ca')
+
+    def _puntaje_base(self, item, datos: Dict):
+        """
+        Puntaje Fase 1 sobre el que se suma la ficha. Para objetos de la BD se
+        recalcula (el puntaje guardado ya puede incluir una Fase 2 anterior).
+        """
+        if hasattr(item, "codigo_ca"):
+            return self.score_engine.calcular_puntaje_fase_1({
+                'nombre': item.nombre,
+                'estado_ca_texto': datos.get('estado') or item.estado_ca_texto,
+                'organismo_comprador': item.organismo.nombre if item.organismo else "",
+            })
+        return item.get('puntuacion_final', 0), item.get('puntaje_detalle', [])
 
     def ejecutar_limpieza_automatica(self, callback_texto=None, callback_porcentaje=None):
         try: 
-            # Opcional: Avisar al log si quieres
-            if callback_texto: callback_texto("Verificando vencimientos (regla 14 días)...")
-            cerradas = self.db_service.cerrar_licitaciones_vencidas_localmente()
-            
-            if callback_texto: callback_texto("Limpiando registros antiguos (regla 30 días)...")
-            eliminados = self.db_service.limpiar_registros_antiguos()
+            if callback_texto:
+                callback_texto(f"Mantenimiento: vencimientos ({DIAS_GRACIA_CIERRE} días) y purga ({DIAS_RETENCION} días)...")
+            reportes = self.db_service.ejecutar_mantenimiento(DIAS_GRACIA_CIERRE, DIAS_RETENCION)
+            # Al iniciar la app: la primera extracción ya encuentra los organismos en memoria
+            self.db_service.precargar_organismos()
             
-            if eliminados > 0 or cerradas > 0:
-                logger.info(f"Limpieza: {cerradas} cerradas, {eliminados} borradas.")
+            for r in reportes:
+                if r["filas"] > 0:
+                    logger.info(
+                        f"Limpieza [{r['operacion']}]: {r['filas']} filas, {r['lotes']} lotes, "
+                        f"{r['segundos']}s ({r['filas_por_segundo']} filas/s)."
+                    )
             
             if callback_porcentaje: callback_porcentaje(100)
+            return reportes
 
         except Exception as e:
             logger.error(f"Error en limpieza automática: {e}")
@@ -324,63 +423,66 @@ class ServicioEtl:
             self.scraper_service.verificar_sesion(emitir_texto)
 
         procesados = 0
-        for i, codigo in enumerate(codigos_limpios):
-            try:
-                percent = int(((i+1)/total)*100)
-                emitir_porcentaje(percent)
-                emitir_texto(f"Procesando ({i+1}/{total}): {codigo}")
-
-                datos = self.scraper_service.extraer_detalle_api(None, codigo)
+        with self.db_service.unidad_de_trabajo():
+            for i, codigo in enumerate(codigos_limpios):
+                try:
+                    percent = int(((i+1)/total)*100)
+                    emitir_porcentaje(percent)
+                    emitir_texto(f"Procesando ({i+1}/{total}): {codigo}")
+
+                    confirmar_antes_de_esperar()
+                    datos = self.scraper_service.extraer_detalle_api(None, codigo)
                 
-                if datos:
-                    org_real = datos.get('organismo_nombre') or "Importado Manual"
-
-                    # Calcular Puntajes Completos (F1 + F2)
-                    puntos1, det1 = self.score_engine.calcular_puntaje_fase_1({
-                        'nombre': datos.get('descripcion', 'Manual')[:100], 
-                        'estado_ca_texto': datos.get('estado'),
-                        'organismo_comprador': org_real
-                    })
-                    puntos2, det2 = self.score_engine.calcular_puntaje_fase_2(datos)
+                    if datos:
+                        org_real = datos.get('organismo_nombre') or "Importado Manual"
+
+                        # Calcular Puntajes Completos (F1 + F2)
+                        puntos1, det1 = self.score_engine.calcular_puntaje_fase_1({
+                            'nombre': datos.get('descripcion', 'Manual')[:100], 
+                            'estado_ca_texto': datos.get('estado'),
+                            'organismo_comprador': org_real
+                        })
+                        puntos2, det2 = self.score_engine.calcular_puntaje_fase_2(datos)
                     
-                    # Guardar Base
-                    registro_base = [{
-                        "codigo": codigo,
-                        "nombre": datos.get('descripcion', 'Sin Nombre'),
-                        "estado": datos.get('estado'),
-                        "fecha_publicacion": datos.get('fecha_publicacion'),
-                        "monto_disponible_CLP": datos.get('monto_estimado'),
-                        "fecha_cierre": datos.get('fecha_cierre_p1'),
-                        "organismo": org_real
-                    }]
-                    self.db_service.insertar_o_actualizar_masivo(registro_base)
+                        # Guardar, detallar y asignar destino: todo o nada por código
+                        with aislar_item():
+                            # Guardar Base
+                            registro_base = [{
+                                "codigo": codigo,
+                                "nombre": datos.get('descripcion', 'Sin Nombre'),
+                                "estado": datos.get('estado'),
+                                "fecha_publicacion": datos.get('fecha_publicacion'),
+                                "monto_disponible_CLP": datos.get('monto_estimado'),
+                                "fecha_cierre": datos.get('fecha_cierre_p1'),
+                                "organismo": org_real
+                            }]
+                            self.db_service.insertar_o_actualizar_masivo(registro_base)
                     
-                    # Actualizar Detalle
-                    self.db_service.actualizar_fase_2_detalle(
-                        codigo_ca=codigo,
-                        datos_fase_2=datos,
-                        puntuacion_total=puntos1 + puntos2,
-                        detalle_completo=det1 + det2
-                    )
-
-                    # Asignar Destino
-                    with self.db_service.session_factory() as session:
-                        from src.db.db_models import CaLicitacion
-                        lic = session.query(CaLicitacion).filter_by(codigo_ca=codigo).first()
-                        if lic:
-                            if destino == 'seguimiento':
-                                self.db_service.gestionar_favorito(lic.ca_id, True)
-                            elif destino == 'ofertadas':
-                                self.db_service.gestionar_ofertada(lic.ca_id, True)
-
-                    procesados += 1
-                else:
-                    logger.warning(f"No se pudo descargar info para {codigo}")
+                            # Actualizar Detalle
+                            self.db_service.actualizar_fase_2_detalle(
+                                codigo_ca=codigo,
+                                datos_fase_2=datos,
+                                puntuacion_total=puntos1 + puntos2,
+                                detalle_completo=det1 + det2
+                            )
+
+                            # Asignar Destino
+                            # Solo la clave: no hace falta cargar la compra
+                            ca_id = self.db_service.obtener_ca_ids([codigo]).get(codigo)
+                            if ca_id is not None:
+                                if destino == 'seguimiento':
+                                    self.db_service.gestionar_favorito(ca_id, True)
+                                elif destino == 'ofertadas':
+                                    self.db_service.gestionar_ofertada(ca_id, True)
+
+                        procesados += 1
+                    else:
+                        logger.warning(f"No se pudo descargar info para {codigo}")
                 
-                time.sleep(0.2)
+                    time.sleep(0.2)
 
-            except Exception as e:
-                logger.error(f"Error importando {codigo}: {e}")
+                except Exception as e:
+                    logger.error(f"Error importando {codigo}: {e}")
 
         emitir_texto("Importación finalizada.")
         return procesados
\ No newline at end of file
@@ -11,6 +11,7 @@ from pathlib import Path
 from typing import TYPE_CHECKING, Dict, List, Any
 
 import pandas as pd
+from src.db.enrutador_sesiones import sesion_lectura
 
 # Importamos modelos solo para tipos y referencias de Pandas
 from src.db.db_models import (
@@ -144,8 +145,8 @@ class ServicioExcel:
         tablas = [CaLicitacion, CaSeguimiento, CaOrganismo, CaSector, CaPalabraClave, CaOrganismoRegla]
         
         try:
-            # Usamos el session_factory inyectado para obtener conexión cruda para Pandas
-            with self.db_service.session_factory() as session:
+            # Conexión cruda para Pandas desde la réplica / pool de lectura (si el factory enruta)
+            with sesion_lectura(self.db_service.session_factory) as session:
                 connection = session.connection()
                 for model in tablas:
                     table_name = model.__tablename__
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de Corpus Sintético.
+
+Produce licitaciones (listado Fase 1 y fichas Fase 2) de tamaño arbitrario
+a partir de las distribuciones observadas en los respaldos CSV exportados
+(vocabulario de nombres, frecuencia de organismos, productos, estados y fechas).
+
+Sirve para pruebas de carga y benchmarks a escala de producción:
+    python -m src.logic.generador_corpus --cantidad 70000 --destino bd
+    python -m src.logic.generador_corpus --cantidad 5000 --destino fixtures --salida data/fixtures
+"""
+import argparse
+import ast
+import bisect
+import csv
+import datetime
+import json
+import random
+from collections import Counter, defaultdict
+from itertools import accumulate
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.logic.schemas import LicitacionDetalleSchema
+from src.utils.huellas import huella_ficha
+from src.utils.logger import configurar_logger
+
+if TYPE_CHECKING:
+    from src.db.repositories.etl_repository import EtlRepository
+    from src.logic.score_engine import MotorPuntajes
+
+logger = configurar_logger(__name__)
+
+DIR_EXPORTS = Path(__file__).resolve().parents[2] / "data" / "exports"
+
+# Marcadores de inicio/fin para la cadena de bigramas de nombres
+_INICIO = "<ini>"
+_FIN = "<fin>"
+
+
+class _Muestreador:
+    """Muestreo ponderado O(log n) sobre una tabla de frecuencias fija."""
+
+    def __init__(self, frecuencias: Dict[Any, int]):
+        self.valores = list(frecuencias.keys())
+        self.acumulado = list(accumulate(frecuencias.values()))
+
+    def elegir(self, rng: random.Random) -> Any:
+        x = rng.random() * self.acumulado[-1]
+        return self.valores[bisect.bisect_right(self.acumulado, x)]
+
+
+class GeneradorCorpus:
+    """
+    Aprende distribuciones desde un respaldo 'BD_Completa_CSV_*' y genera
+    registros con la misma forma que entrega el scraper.
+    """
+
+    def __init__(self, directorio_csv: Optional[Path] = None, semilla: Optional[int] = None):
+        self.directorio_csv = Path(directorio_csv) if directorio_csv else self._ultimo_respaldo()
+        self.rng = random.Random(semilla)
+        self._secuencia = 0
+
+        self.bigramas: Dict[str, _Muestreador] = {}
+        self.organismos: Optional[_Muestreador] = None
+        self.estados: Optional[_Muestreador] = None
+        self.convocatorias: Optional[_Muestreador] = None
+        self.dias_publicacion: Optional[_Muestreador] = None
+        self.horas_cierre: Optional[_Muestreador] = None
+        self.cantidad_productos: Optional[_Muestreador] = None
+        self.plazos: Optional[_Muestreador] = None
+        self.montos: List[float] = []
+        self.productos: List[Dict[str, Any]] = []
+        self.descripciones: List[str] = []
+        self.direcciones: List[str] = []
+
+        self._aprender_distribuciones()
+
+    # =========================================================================
+    # APRENDIZAJE
+    # =========================================================================
+
+    @staticmethod
+    def _ultimo_respaldo() -> Path:
+        candidatos = sorted(DIR_EXPORTS.glob("BD_Completa_CSV_*"))
+        if not candidatos:
+            raise FileNotFoundError(f"No se encontró ningún respaldo 'BD_Completa_CSV_*' en {DIR_EXPORTS}")
+        return candidatos[-1]
+
+    def _leer_csv(self, nombre: str) -> List[Dict[str, str]]:
+        ruta = self.directorio_csv / nombre
+        with open(ruta, encoding="utf-8-sig", newline="") as f:
+            return list(csv.DictReader(f))
+
+    @staticmethod
+    def _parsear_fecha(texto: str) -> Optional[datetime.datetime]:
+        if not texto:
+            return None
+        try:
+            return datetime.datetime.fromisoformat(texto)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parsear_productos(texto: str) -> List[Dict[str, Any]]:
+        # Pandas exporta la lista como repr de Python, no como JSON
+        if not texto:
+            return []
+        try:
+            valor = ast.literal_eval(texto)
+        except (ValueError, SyntaxError):
+            try:
+                valor = json.loads(texto)
+            except ValueError:
+                return []
+        return [p for p in valor if isinstance(p, dict)] if isinstance(valor, list) else []
+
+    def _aprender_distribuciones(self):
+        licitaciones = self._leer_csv("ca_licitacion.csv")
+        nombres_org = {r["organismo_id"]: r["nombre"] for r in self._leer_csv("ca_organismo.csv")}
+        if not licitaciones:
+            raise ValueError(f"El respaldo {self.directorio_csv} no contiene licitaciones.")
+
+        transiciones: Dict[str, Counter] = defaultdict(Counter)
+        freq_org, freq_estado, freq_conv = Counter(), Counter(), Counter()
+        freq_dia, freq_hora, freq_n_prod, freq_plazo = Counter(), Counter(), Counter(), Counter()
+
+        for r in licitaciones:
+            # 1. Vocabulario (cadena de bigramas sobre tokens del nombre)
+            tokens = (r.get("nombre") or "").split()
+            if tokens:
+                for previo, siguiente in zip([_INICIO] + tokens, tokens + [_FIN]):
+                    transiciones[previo][siguiente] += 1
+
+            # 2. Organismos y estados
+            org = nombres_org.get(r.get("organismo_id"))
+            if org:
+                freq_org[org] += 1
+            freq_estado[r.get("estado_ca_texto") or "Publicada"] += 1
+            conv = r.get("estado_convocatoria")
+            freq_conv[int(float(conv)) if conv else None] += 1
+
+            # 3. Fechas: día de la semana de publicación y horas hasta el cierre
+            pub = self._parsear_fecha(r.get("fecha_publicacion"))
+            cierre = self._parsear_fecha(r.get("fecha_cierre"))
+            if pub:
+                freq_dia[pub.weekday()] += 1
+            if pub and cierre:
+                horas = int((cierre - pub).total_seconds() // 3600)
+                if horas > 0:
+                    freq_hora[horas] += 1
+
+            # 4. Montos, productos y detalle de ficha
+            if r.get("monto_clp"):
+                self.montos.append(float(r["monto_clp"]))
+            productos = self._parsear_productos(r.get("productos_solicitados"))
+            if productos:
+                freq_n_prod[len(productos)] += 1
+                self.productos.extend(productos)
+            if r.get("descripcion"):
+                self.descripciones.append(r["descripcion"])
+            if r.get("direccion_entrega"):
+                self.direcciones.append(r["direccion_entrega"])
+            if r.get("plazo_entrega"):
+                freq_plazo[int(float(r["plazo_entrega"]))] += 1
+
+        self.bigramas = {previo: _Muestreador(sig) for previo, sig in transiciones.items()}
+        self.organismos = _Muestreador(freq_org or Counter({"No Especificado": 1}))
+        self.estados = _Muestreador(freq_estado)
+        self.convocatorias = _Muestreador(freq_conv)
+        self.dias_publicacion = _Muestreador(freq_dia or Counter({d: 1 for d in range(5)}))
+        self.horas_cierre = _Muestreador(freq_hora or Counter({48: 1}))
+        self.cantidad_productos = _Muestreador(freq_n_prod or Counter({1: 1}))
+        self.plazos = _Muestreador(freq_plazo or Counter({5: 1}))
+        if not self.montos:
+            self.montos = [500000.0]
+
+        logger.info(
+            f"GeneradorCorpus: {len(licitaciones)} licitaciones, {len(freq_org)} organismos, "
+            f"{len(self.bigramas)} tokens y {len(self.productos)} productos aprendidos de {self.directorio_csv.name}."
+        )
+
+    # =========================================================================
+    # GENERACIÓN
+    # =========================================================================
+
+    def _generar_nombre(self, max_tokens: int = 25) -> str:
+        tokens = []
+        actual = _INICIO
+        while len(tokens) < max_tokens:
+            muestreador = self.bigramas.get(actual)
+            if not muestreador:
+                break
+            actual = muestreador.elegir(self.rng)
+            if actual == _FIN:
+                break
+            tokens.append(actual)
+        return " ".join(tokens) or "COMPRA SINTETICA"
+
+    def _generar_fecha_publicacion(self, desde: datetime.date, dias: int) -> datetime.date:
+        # Se sortea un día del rango respetando la distribución semanal observada
+        for _ in range(10):
+            fecha = desde + datetime.timedelta(days=self.rng.randrange(max(dias, 1)))
+            dia_objetivo = self.dias_publicacion.elegir(self.rng)
+            if fecha.weekday() == dia_objetivo:
+                return fecha
+        return fecha
+
+    def _siguiente_codigo(self, anio: int) -> str:
+        # Sufijo 'SIN' para que nunca colisione con códigos reales (COT)
+        self._secuencia += 1
+        unidad = 1000 + self._secuencia % 9000
+        return f"{unidad}-{self._secuencia}-SIN{anio % 100:02d}"
+
+    def generar_listado(self, cantidad: int, hasta: Optional[datetime.date] = None, dias_ventana: int = 30) -> List[Dict[str, Any]]:
+        """Genera items con el formato del listado de la API (Fase 1): fechas en texto ISO 8601, como la API."""
+        hasta = hasta or datetime.date.today()
+        desde = hasta - datetime.timedelta(days=dias_ventana)
+        items = []
+        for _ in range(cantidad):
+            fecha_pub = self._generar_fecha_publicacion(desde, dias_ventana)
+            horas = self.horas_cierre.elegir(self.rng)
+            inicio = datetime.datetime.combine(fecha_pub, datetime.time())
+            fecha_cierre = inicio + datetime.timedelta(hours=horas, minutes=self.rng.randrange(0, 60, 5))
+            monto = self.rng.choice(self.montos) * self.rng.uniform(0.8, 1.2)
+            items.append({
+                "codigo": self._siguiente_codigo(fecha_pub.year),
+                "nombre": self._generar_nombre(),
+                "organismo": self.organismos.elegir(self.rng),
+                "monto_disponible_CLP": round(monto),
+                "fecha_publicacion": inicio.isoformat(),
+                "fecha_cierre": fecha_cierre.isoformat(),
+                "cantidad_provedores_cotizando": self.rng.randint(0, 8),
+                "estado": self.estados.elegir(self.rng),
+                "estado_convocatoria": self.convocatorias.elegir(self.rng),
+            })
+        return items
+
+    def generar_ficha(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Genera el detalle (Fase 2) de un item del listado, compatible con LicitacionDetalleSchema."""
+        productos = []
+        if self.productos:
+            for _ in range(self.cantidad_productos.elegir(self.rng)):
+                base = dict(self.rng.choice(self.productos))
+                base["cantidad"] = max(1, int(self.rng.expovariate(1 / max(float(base.get("cantidad") or 1), 1))))
+                productos.append(base)
+
+        descripcion = self.rng.choice(self.descripciones) if self.descripciones else item["nombre"]
+        return {
+            "descripcion": descripcion,
+            "direccion_entrega": self.rng.choice(self.direcciones) if self.direcciones else None,
+            "fecha_cierre_p1": item["fecha_cierre"],
+            "fecha_cierre_p2": None,
+            "productos_solicitados": productos,
+            "estado": item["estado"],
+            "cantidad_provedores_cotizando": item["cantidad_provedores_cotizando"],
+            "estado_convocatoria": item["estado_convocatoria"],
+            "plazo_entrega": self.plazos.elegir(self.rng),
+            "organismo_nombre": item["organismo"],
+            "monto_estimado": float(item["monto_disponible_CLP"]),
+            "fecha_publicacion": item["fecha_publicacion"],
+        }
+
+    def generar_lotes(self, cantidad: int, tamano_lote: int = 1000, **kwargs) -> Iterator[List[Dict[str, Any]]]:
+        """Generador perezoso de lotes para no materializar corpus gigantes en memoria."""
+        restantes = cantidad
+        while restantes > 0:
+            n = min(tamano_lote, restantes)
+            yield self.generar_listado(n, **kwargs)
+            restantes -= n
+
+    # =========================================================================
+    # SALIDAS
+    # =========================================================================
+
+    def cargar_en_bd(self, etl_repo: "EtlRepository", cantidad: int, tamano_lote: int = 1000,
+                     con_fichas: bool = False, callback_texto: Optional[Callable[[str], None]] = None,
+                     motor: Optional["MotorPuntajes"] = None) -> int:
+        """
+        Inserta el corpus usando el mismo camino de ingesta que el ETL real.
+        Con 'motor' cada lote queda puntuado como lo dejaría el ETL (Fase 1, y
+        Fase 1 + Fase 2 si van fichas); las fichas se escriben por lote con
+        actualizar_fase_2_lote y exigen 'motor' para no guardar puntajes falsos.
+        """
+        if con_fichas and motor is None:
+            raise ValueError("Cargar fichas requiere un MotorPuntajes para puntuarlas.")
+        cargadas = 0
+        for lote in self.generar_lotes(cantidad, tamano_lote):
+            etl_repo.insertar_o_actualizar_masivo(lote)
+            if con_fichas:
+                etl_repo.actualizar_fase_2_lote([self._ficha_puntuada(item, motor) for item in lote])
+            elif motor:
+                datos = etl_repo.obtener_datos_recalculo({item["codigo"] for item in lote})
+                etl_repo.actualizar_puntajes_en_lote([
+                    (d["ca_id"], *motor.calcular_puntaje_fase_1({
+                        "nombre": d["nombre"], "estado_ca_texto": d["estado_ca_texto"],
+                        "organismo_comprador": d["organismo_nombre"],
+                    })) for d in datos
+                ])
+            cargadas += len(lote)
+            if callback_texto:
+                callback_texto(f"Corpus sintético: {cargadas}/{cantidad} registros cargados...")
+        return cargadas
+
+    def _ficha_puntuada(self, item: Dict[str, Any], motor: "MotorPuntajes") -> Dict[str, Any]:
+        """Ficha en el formato de actualizar_fase_2_lote, validada y puntuada como en el ETL."""
+        datos = LicitacionDetalleSchema(**self.generar_ficha(item)).model_dump()
+        puntos_base, detalle_base = motor.calcular_puntaje_fase_1({
+            "nombre": item["nombre"],
+            "estado_ca_texto": datos.get("estado") or item["estado"],
+            "organismo_comprador": item["organismo"],
+        })
+        pts_ficha, det_ficha = motor.calcular_puntaje_fase_2(datos)
+        return {
+            "codigo_ca": item["codigo"],
+            "datos_fase_2": datos,
+            "puntuacion_total": puntos_base + pts_ficha,
+            "detalle_completo": detalle_base + det_ficha,
+            "huella": huella_ficha(datos),
+        }
+
+    def escribir_fixtures(self, directorio: Path, cantidad: int, con_fichas: bool = True) -> Tuple[Path, Optional[Path]]:
+        """Escribe 'listado.json' (y opcionalmente 'fichas.json' indexado por código)."""
+        directorio = Path(directorio)
+        directorio.mkdir(parents=True, exist_ok=True)
+        listado = self.generar_listado(cantidad)
+
+        ruta_listado = directorio / "listado.json"
+        with open(ruta_listado, "w", encoding="utf-8") as f:
+            json.dump(listado, f, ensure_ascii=False)
+
+        ruta_fichas = None
+        if con_fichas:
+            ruta_fichas = directorio / "fichas.json"
+            fichas = {item["codigo"]: self.generar_ficha(item) for item in listado}
+            with open(ruta_fichas, "w", encoding="utf-8") as f:
+                json.dump(fichas, f, ensure_ascii=False)
+        return ruta_listado, ruta_fichas
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Genera un corpus sintético de licitaciones.")
+    parser.add_argument("--cantidad", type=int, required=True, help="Número de licitaciones a generar.")
+    parser.add_argument("--destino", choices=["bd", "fixtures"], default="fixtures")
+    parser.add_argument("--salida", type=Path, default=Path("data") / "fixtures", help="Carpeta para fixtures JSON.")
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--lote", type=int, default=1000, help="Tamaño de lote para la carga en BD.")
+    parser.add_argument("--fichas", action="store_true", help="Incluir detalle Fase 2.")
+    parser.add_argument("--origen", type=Path, default=None, help="Carpeta BD_Completa_CSV_* a usar como muestra.")
+    args = parser.parse_args(argv)
+
+    generador = GeneradorCorpus(args.origen, semilla=args.semilla)
+    if args.destino == "bd":
+        from src.db.session import SessionLocal
+        from src.db.db_service import DbService
+        from src.logic.score_engine import MotorPuntajes
+        db_service = DbService(SessionLocal)
+        total = generador.cargar_en_bd(db_service.etl_repo, args.cantidad, args.lote, args.fichas, print,
+                                       motor=MotorPuntajes(db_service))
+        print(f"{total} licitaciones sintéticas cargadas en la BD.")
+    else:
+        rutas = generador.escribir_fixtures(args.salida, args.cantidad, args.fichas)
+        print(f"Fixtures escritos en: {', '.join(str(r) for r in rutas if r)}")
+
+
+if __name__ == "__main__":
+    main()
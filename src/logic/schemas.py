@@ -3,6 +3,7 @@ from typing import Optional, List, Any
 from datetime import datetime
 
 class ProductoSchema(BaseModel):
+    codigo_producto: Optional[int] = None
     nombre: Optional[str] = None
     descripcion: Optional[str] = None
     cantidad: float = 0.0
@@ -6,10 +6,10 @@ Este módulo contiene el algoritmo de priorización de licitaciones.
 Implementa lógica de 'Masking' para evitar puntuación doble en frases contenidas.
 """
 import unicodedata
-import json
 from functools import lru_cache
 from typing import Dict, List, Tuple, Any, Set
 from src.utils.logger import configurar_logger
+from src.utils.productos import lineas_producto, prefijos_de
 from config.config import PUNTOS_SEGUNDO_LLAMADO
 
 logger = configurar_logger(__name__)
@@ -17,7 +17,7 @@ logger = configurar_logger(__name__)
 class MotorPuntajes:
     """
     Clase encargada de calcular el puntaje (Score) de cada licitación
-    basándose en reglas configurables (Palabras clave y Organismos).
+    basándose en reglas configurables (Palabras clave, Organismos y Códigos de producto).
     """
     
     def __init__(self, db_service):
@@ -26,6 +26,8 @@ class MotorPuntajes:
         self.cache_palabras_clave: List[Dict[str, Any]] = [] 
         self.reglas_prioritarias: Dict[int, int] = {}
         self.reglas_no_deseadas: Dict[int, int] = {} 
+        # Prefijo de código ONU (texto) -> puntos
+        self.reglas_producto: Dict[str, int] = {}
         
         self.mapa_nombre_id_organismo: Dict[str, int] = {}
         self.recargar_reglas_memoria()
@@ -74,7 +76,15 @@ class MotorPuntajes:
         except Exception as e:
             logger.error(f"Error cargando reglas de organismos: {e}")
 
-        # 3. Mapa de Nombres de Organismos
+        # 3. Cargar Reglas por Código de Producto
+        self.reglas_producto = {}
+        try:
+            for r in self.db_service.obtener_reglas_producto():
+                self.reglas_producto[r.prefijo] = r.puntos or 0
+        except Exception as e:
+            logger.error(f"Error cargando reglas de productos: {e}")
+
+        # 4. Mapa de Nombres de Organismos
         self.mapa_nombre_id_organismo = {}
         try:
             orgs = self.db_service.obtener_todos_organismos()
@@ -126,6 +136,30 @@ class MotorPuntajes:
         
         return puntaje_acumulado, detalle_acumulado
 
+    def _evaluar_codigos_producto(self, codigos) -> Tuple[int, List[str]]:
+        """
+        Reglas por código ONU: cada código toma la regla de prefijo más largo que
+        lo cubre (a lo más 8 búsquedas en el diccionario, sin recorrer las reglas).
+        Una regla suma una sola vez por compra aunque la cumplan varias líneas.
+        """
+        if not self.reglas_producto: return 0, []
+
+        aplicadas: Set[str] = set()
+        for codigo in codigos:
+            for prefijo in prefijos_de(codigo):
+                if prefijo in self.reglas_producto:
+                    aplicadas.add(prefijo)
+                    break
+
+        puntaje = 0
+        detalle = []
+        for prefijo in sorted(aplicadas):
+            puntos = self.reglas_producto[prefijo]
+            if puntos == 0: continue
+            puntaje += puntos
+            detalle.append(f"Cód. Prod.: {prefijo} ({'+' if puntos>0 else ''}{puntos})")
+        return puntaje, detalle
+
     def calcular_puntaje_fase_1(self, licitacion_raw: dict) -> Tuple[int, List[str]]:
         """Calcula puntaje base (Organismo + Estado + Título)."""
         org_norm = self._normalizar_texto(licitacion_raw.get("organismo_comprador"))
@@ -169,7 +203,7 @@ class MotorPuntajes:
         return max(0, puntaje), detalle
 
     def calcular_puntaje_fase_2(self, datos_ficha: dict) -> Tuple[int, List[str]]:
-        """Calcula puntaje avanzado (Descripción + Productos)."""
+        """Calcula puntaje avanzado (Descripción + Productos + Códigos de producto)."""
         puntaje = 0
         detalle = []
         
@@ -180,27 +214,24 @@ class MotorPuntajes:
             puntaje += pts_desc
             detalle.extend(det_desc)
         
-        # 2. Evaluar Productos
-        prods_raw = datos_ficha.get("productos_solicitados")
-        if isinstance(prods_raw, str):
-            try: prods_raw = json.loads(prods_raw)
-            except: prods_raw = []
-        elif prods_raw is None:
-            prods_raw = []
-            
-        txt_prods_norm = ""
-        if isinstance(prods_raw, list):
-            parts = []
-            for p in prods_raw:
-                if isinstance(p, dict):
-                    n = p.get("nombre") or ""
-                    d = p.get("descripcion") or ""
-                    parts.append(self._normalizar_texto(f"{n} {d}"))
-            txt_prods_norm = " | ".join(parts)
-
+        # 2. Evaluar Productos. 'lineas_producto' viene ya normalizado desde ca_producto;
+        # si no, se arma desde la lista de la ficha.
+        lineas = datos_ficha.get("lineas_producto")
+        if lineas is None:
+            lineas = [
+                (l["codigo_producto"], l["nombre_norm"])
+                for l in lineas_producto(datos_ficha.get("productos_solicitados"))
+            ]
+
+        txt_prods_norm = " | ".join(nombre for _, nombre in lineas)
         if txt_prods_norm:
             pts_prod, det_prod = self._evaluar_con_masking(txt_prods_norm, "p_prod", "Prod.")
             puntaje += pts_prod
             detalle.extend(det_prod)
+
+        # 3. Evaluar Códigos de Producto
+        pts_cod, det_cod = self._evaluar_codigos_producto(codigo for codigo, _ in lineas)
+        puntaje += pts_cod
+        detalle.extend(det_cod)
                 
         return puntaje, detalle
\ No newline at end of file
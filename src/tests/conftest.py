@@ -6,14 +6,22 @@ Aquí definimos los "fixtures": recursos compartidos que las pruebas
 pueden solicitar (como una conexión a base de datos limpia).
 """
 
+import os
+import tempfile
+
+# El archivo histórico (Parquet) de las pruebas no debe escribir en data/ del repo
+os.environ.setdefault("DIR_ARCHIVO", tempfile.mkdtemp(prefix="ca_archivo_tests_"))
+# Ni el log: app.log de las pruebas va a un directorio temporal
+os.environ.setdefault("DIR_LOGS", tempfile.mkdtemp(prefix="ca_logs_tests_"))
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
 # Importamos tus modelos y la base
 from src.db.db_models import Base, CaLicitacion, CaSeguimiento, CaOrganismo, CaSector
 from src.db.db_service import DbService
+from src.db.dialecto import crear_engine
 
 # Usamos SQLite en memoria para pruebas rápidas y aisladas.
 # check_same_thread=False es necesario porque SQLite a veces se queja con hilos.
@@ -22,11 +30,8 @@ TEST_DATABASE_URL = "sqlite:///:memory:"
 @pytest.fixture(scope="session")
 def engine():
     """Crea el motor de base de datos (Engine) una sola vez por sesión de pruebas."""
-    engine = create_engine(
-        TEST_DATABASE_URL, 
-        connect_args={"check_same_thread": False}, 
-        poolclass=StaticPool
-    )
+    # Mismo Engine que el modo embebido (BASE_LOCAL): StaticPool en memoria y PRAGMA de SQLite
+    engine = crear_engine(TEST_DATABASE_URL)
     return engine
 
 @pytest.fixture(scope="function")
@@ -58,4 +63,36 @@ def db_service(db_session):
     # Creamos un fake_factory
     fake_factory = lambda: db_session
     service = DbService(fake_factory)
-    return service
\ No newline at end of file
+    return service
+
+@pytest.fixture(scope="function")
+def engine_postgres():
+    """
+    Motor contra un PostgreSQL real para pruebas específicas del dialecto
+    (COPY, EXPLAIN, etc.). Se omite si no está definida TEST_POSTGRES_URL.
+    """
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("Requiere TEST_POSTGRES_URL")
+    engine_pg = create_engine(url)
+    Base.metadata.drop_all(engine_pg)
+    Base.metadata.create_all(engine_pg)
+    yield engine_pg
+    Base.metadata.drop_all(engine_pg)
+    engine_pg.dispose()
+
+@pytest.fixture(scope="function")
+def engine_postgres_lectura(engine_postgres):
+    """
+    Segundo PostgreSQL (réplica o base aparte) para probar el enrutamiento de
+    lecturas. Se omite si no está definida TEST_POSTGRES_LECTURA_URL.
+    """
+    url = os.getenv("TEST_POSTGRES_LECTURA_URL")
+    if not url:
+        pytest.skip("Requiere TEST_POSTGRES_LECTURA_URL")
+    engine_lectura = create_engine(url)
+    Base.metadata.drop_all(engine_lectura)
+    Base.metadata.create_all(engine_lectura)
+    yield engine_lectura
+    Base.metadata.drop_all(engine_lectura)
+    engine_lectura.dispose()
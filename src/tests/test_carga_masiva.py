@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la carga masiva del listado (upsert Fase 1).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from src.db.db_models import Base, CaLicitacion, CaOrganismo, CaSector, EstadoCa, MES_FIJADO
+from src.db.ddl_particiones import convertir_a_particionada
+from src.db.dialecto import crear_engine
+from src.db.perfiles_carga import PERFIL_DETALLE
+from src.db.repositories.etl_repository import EtlRepository, FILAS_MINIMAS_COPY
+from src.logic.generador_corpus import GeneradorCorpus
+
+
+def test_upsert_sqlite_inserta_y_actualiza(db_service, db_session):
+    """En SQLite (sin COPY) se usa INSERT ... ON CONFLICT multi-fila con el mismo resultado."""
+    listado = [
+        {"codigo": "MAS-01", "nombre": "Resmas", "organismo": "Muni A", "estado": "Publicada"},
+        {"codigo": "MAS-02", "nombre": "Toner", "organismo": "Muni B", "estado": "Publicada"},
+        {"codigo": "MAS-02", "nombre": "Duplicado", "organismo": "Muni B", "estado": "Publicada"},
+    ]
+    db_service.insertar_o_actualizar_masivo(listado)
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "MAS-02", "nombre": "Toner", "organismo": "Muni B", "estado": "Cerrada", "cantidad_provedores_cotizando": 4},
+    ])
+
+    filas = {l.codigo_ca: l for l in db_session.query(CaLicitacion).options(*PERFIL_DETALLE).all()}
+    assert set(filas) == {"MAS-01", "MAS-02"}
+    assert filas["MAS-02"].estado_codigo == EstadoCa.CERRADA
+    assert filas["MAS-02"].proveedores_cotizando == 4
+    assert filas["MAS-02"].organismo.nombre == "Muni B"
+
+
+def test_upsert_via_copy_postgres(engine_postgres):
+    factory = sessionmaker(bind=engine_postgres)
+    repo = EtlRepository(factory)
+    listado = GeneradorCorpus(semilla=5).generar_listado(FILAS_MINIMAS_COPY + 100)
+
+    assert len(repo.insertar_o_actualizar_masivo(listado)["insertados"]) == len(listado)
+    for item in listado[:50]:
+        item["estado"] = "Cerrada (Vencida Local)"
+    resultado = repo.insertar_o_actualizar_masivo(listado)
+    assert resultado["modificados"] == {i["codigo"] for i in listado[:50]}
+    assert not resultado["insertados"]
+    # Lote chico: camino INSERT ... ON CONFLICT con RETURNING
+    assert repo.insertar_o_actualizar_masivo(listado[:10])["sin_cambios"] == {i["codigo"] for i in listado[:10]}
+
+    with factory() as session:
+        assert session.scalar(select(func.count()).select_from(CaLicitacion)) == len(listado)
+        assert session.scalar(select(func.count()).where(CaLicitacion.estado_codigo == EstadoCa.VENCIDA_LOCAL)) == 50
+        assert session.scalar(select(func.count()).where(CaLicitacion.organismo_id.is_(None))) == 0
+        assert session.scalar(select(func.count()).select_from(CaOrganismo)) == len({i["organismo"] for i in listado})
+
+
+def test_upsert_informa_insertados_modificados_y_sin_cambios(db_service):
+    listado = [
+        {"codigo": "CHG-01", "nombre": "A", "organismo": "Org", "estado": "Publicada", "cantidad_provedores_cotizando": 1},
+        {"codigo": "CHG-02", "nombre": "B", "organismo": "Org", "estado": "Publicada", "cantidad_provedores_cotizando": 1},
+    ]
+    primero = db_service.insertar_o_actualizar_masivo(listado)
+    assert primero["insertados"] == {"CHG-01", "CHG-02"}
+
+    listado[1]["cantidad_provedores_cotizando"] = 3
+    listado.append({"codigo": "CHG-03", "nombre": "C", "organismo": "Org", "estado": "Publicada"})
+    segundo = db_service.insertar_o_actualizar_masivo(listado)
+
+    assert segundo == {"insertados": {"CHG-03"}, "modificados": {"CHG-02"}, "sin_cambios": {"CHG-01"}}
+
+
+def test_upsert_usa_el_mes_guardado_postgres(engine_postgres):
+    """La llave del conflicto es el mes_particion ya guardado: filas fijadas o sin fecha no se duplican."""
+    factory = sessionmaker(bind=engine_postgres)
+    compra = {"codigo": "MES-01", "nombre": "Resmas", "organismo": "Org", "estado": "Publicada", "fecha_publicacion": "2024-03-05"}
+    sin_fecha = {"codigo": "MES-02", "nombre": "Toner", "organismo": "Org", "estado": "Publicada"}
+    EtlRepository(factory).insertar_o_actualizar_masivo([compra, sin_fecha])
+
+    def fijar(codigo):
+        with engine_postgres.begin() as conn:
+            conn.execute(text("UPDATE ca_licitacion SET mes_particion = :fijo WHERE codigo_ca = :codigo"),
+                         {"fijo": MES_FIJADO, "codigo": codigo})
+
+    def filas():
+        with engine_postgres.connect() as conn:
+            return conn.execute(text("SELECT codigo_ca, mes_particion, estado_ca_texto FROM ca_licitacion "
+                                     "WHERE codigo_ca LIKE 'MES-%' ORDER BY codigo_ca")).all()
+
+    # Tabla plana: antes chocaba con el índice único de codigo_ca
+    fijar("MES-01")
+    compra["estado"] = "Cerrada"
+    assert EtlRepository(factory).insertar_o_actualizar_masivo([compra])["modificados"] == {"MES-01"}
+    assert filas() == [("MES-01", MES_FIJADO, "Cerrada"), ("MES-02", MES_FIJADO, "Publicada")]
+
+    with engine_postgres.begin() as conn:
+        conn.execute(text("UPDATE ca_licitacion SET mes_particion = '2024-03-01' WHERE codigo_ca = 'MES-01'"))
+        conn.execute(text("INSERT INTO ca_seguimiento (ca_id, es_favorito, es_ofertada, es_oculta) "
+                          "SELECT ca_id, true, false, false FROM ca_licitacion WHERE codigo_ca = 'MES-01'"))
+        convertir_a_particionada(conn)
+    # Convertir no fija a las favoritas: siguen en su mes mientras la partición exista
+    assert filas()[0][1] == date(2024, 3, 1)
+
+    # Particionada, por ON CONFLICT y por COPY: una sola fila por código
+    fijar("MES-01")
+    repo = EtlRepository(factory)
+    compra["estado"] = "Desierta"
+    assert repo.insertar_o_actualizar_masivo([compra, sin_fecha])["modificados"] == {"MES-01"}
+    compra["estado"] = "Cancelada"
+    sin_fecha["estado"] = "Cerrada"
+    listado = GeneradorCorpus(semilla=9).generar_listado(FILAS_MINIMAS_COPY) + [compra, sin_fecha]
+    assert repo.insertar_o_actualizar_masivo(listado)["modificados"] == {"MES-01", "MES-02"}
+    assert filas() == [("MES-01", MES_FIJADO, "Cancelada"), ("MES-02", MES_FIJADO, "Cerrada")]
+
+def test_upsert_acepta_fechas_en_texto_iso(db_service, db_session):
+    """El scraper entrega las fechas como texto ISO (resp.json()); SQLite solo acepta date/datetime."""
+    listado = [{
+        "codigo": "ISO-01", "nombre": "Resmas", "organismo": "Muni A", "estado": "Publicada",
+        "fecha_publicacion": "2026-10-01", "fecha_cierre": "2026-10-10T15:30:00",
+    }, {
+        "codigo": "ISO-02", "nombre": "Toner", "organismo": "Muni A", "estado": "Publicada",
+        "fecha_publicacion": "2026-09-28T08:00:00", "fecha_cierre": "no informada",
+    }]
+    assert db_service.insertar_o_actualizar_masivo(listado)["insertados"] == {"ISO-01", "ISO-02"}
+    # Re-barrer el mismo texto no cuenta como cambio
+    assert db_service.insertar_o_actualizar_masivo(listado)["sin_cambios"] == {"ISO-01", "ISO-02"}
+
+    filas = {l.codigo_ca: l for l in db_session.query(CaLicitacion).all()}
+    assert filas["ISO-01"].fecha_publicacion == date(2026, 10, 1)
+    assert filas["ISO-01"].fecha_cierre.replace(tzinfo=None) == datetime(2026, 10, 10, 15, 30)
+    assert filas["ISO-01"].mes_particion == date(2026, 10, 1)
+    assert filas["ISO-02"].fecha_publicacion == date(2026, 9, 28)
+    assert filas["ISO-02"].mes_particion == date(2026, 9, 1)
+    assert filas["ISO-02"].fecha_cierre is None
+
+def test_modo_embebido_sqlite(tmp_path):
+    """Base local en archivo: WAL y PRAGMA de puesto único, upsert portable y SAVEPOINT."""
+    engine_local = crear_engine(f"sqlite:///{(tmp_path / 'local.db').as_posix()}")
+    Base.metadata.create_all(engine_local)
+    factory = sessionmaker(bind=engine_local)
+    repo = EtlRepository(factory)
+    listado = GeneradorCorpus(semilla=3).generar_listado(50)
+
+    assert len(repo.insertar_o_actualizar_masivo(listado)["insertados"]) == 50
+    listado[0]["estado"] = "Cerrada"
+    assert repo.insertar_o_actualizar_masivo(listado)["modificados"] == {listado[0]["codigo"]}
+
+    with factory() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert session.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        with session.begin_nested() as punto:
+            session.execute(CaLicitacion.__table__.delete())
+            punto.rollback()
+        assert session.scalar(select(func.count()).select_from(CaLicitacion)) == 50
+    engine_local.dispose()
+
+
+def _cache_organismos(factory, engine):
+    repo = EtlRepository(factory)
+    assert repo.precargar_organismos() == 0
+    repo.insertar_o_actualizar_masivo([{"codigo": "ORG-01", "nombre": "Resmas", "organismo": " Muni A ", "estado": "Publicada"}])
+    assert len(repo.organismos) == 1
+
+    sentencias = []
+
+    def espiar(conn, cursor, sql, *args):
+        sentencias.append(sql)
+
+    event.listen(engine, "before_cursor_execute", espiar)
+    try:
+        repo.insertar_o_actualizar_masivo([{"codigo": "ORG-02", "nombre": "Toner", "organismo": "Muni A", "estado": "Publicada"}])
+    finally:
+        event.remove(engine, "before_cursor_execute", espiar)
+    # Solo el refresco de la vista la cruza (JOIN); ningún SELECT/INSERT propio
+    assert not [sql for sql in sentencias if "FROM ca_organismo" in sql or "INTO ca_organismo" in sql]
+
+    # Lo creado en una transacción revertida no queda en caché
+    with factory() as session:
+        assert "Muni X" in repo.organismos.resolver(session, {"Muni X"})
+        session.rollback()
+    assert len(repo.organismos) == 1
+
+    # Creado por otro proceso: ON CONFLICT DO NOTHING no lo retorna y se lee
+    with factory() as session:
+        sector_id = session.scalar(select(CaSector.sector_id))
+        session.add(CaOrganismo(nombre="Muni B", sector_id=sector_id))
+        session.commit()
+        oid = session.scalar(select(CaOrganismo.organismo_id).where(CaOrganismo.nombre == "Muni B"))
+        assert repo.organismos.resolver(session, {"Muni B"}) == {"Muni B": oid}
+        session.commit()
+    assert len(repo.organismos) == 2
+
+
+def test_cache_de_organismos(db_session, engine):
+    _cache_organismos(lambda: db_session, engine)
+
+
+def test_cache_de_organismos_postgres(engine_postgres):
+    _cache_organismos(sessionmaker(bind=engine_postgres), engine_postgres)
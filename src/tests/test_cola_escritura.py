@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la cola de escritura diferida (acciones de triage en segundo plano).
+"""
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.controllers.cola_escritura import ColaEscrituraDiferida
+from src.db.db_models import CaLicitacion
+
+
+def _sembrar(db_session):
+    db_session.add_all([
+        CaLicitacion(codigo_ca=f"COLA-0{i}", nombre="Compra", estado_ca_texto="Publicada", puntuacion_final=10)
+        for i in (1, 2, 3)
+    ])
+    db_session.commit()
+
+
+def test_fusiona_y_reintenta_errores_transitorios(db_service, db_session):
+    _sembrar(db_session)
+    lotes, guardadas = [], []
+
+    def aplicar(cambios):
+        lotes.append({ca_id: dict(valores) for ca_id, valores in cambios.items()})
+        if len(lotes) == 1:
+            raise OperationalError("UPDATE ca_seguimiento", {}, Exception("could not serialize access"))
+        return db_service.aplicar_seguimiento(cambios)
+
+    cola = ColaEscrituraDiferida(aplicar, retardo=5, espera_base=0.01, al_guardar=guardadas.extend)
+    cola.marcar([1, 2, 999], es_favorito=True, es_ofertada=False)
+    cola.marcar([2], es_ofertada=True)
+    cola.anotar([3], "revisar")
+    assert cola.valor_pendiente(3, "notas") == "revisar"
+
+    # 'esperar' no aguarda la ventana de agrupación: un solo lote, reintentado una vez
+    assert cola.esperar(timeout=5)
+    assert len(lotes) == 2 and lotes[0] == lotes[1]
+    assert lotes[0][2] == {"es_favorito": True, "es_ofertada": True}
+    assert sorted(guardadas) == [1, 2, 3]  # 999 no existe y se omite
+    assert cola.valor_pendiente(3, "notas") is None
+
+    assert [f["codigo_ca"] for f in db_service.obtener_listado_seguimiento()] == ["COLA-01"]
+    assert [f["codigo_ca"] for f in db_service.obtener_listado_ofertadas()] == ["COLA-02"]
+    assert db_service.obtener_nota_usuario(3) == "revisar"
+    assert cola.cerrar(timeout=5)
+
+
+def test_error_no_transitorio_descarta_y_avisa():
+    fallos = []
+
+    def aplicar(cambios):
+        raise IntegrityError("INSERT INTO ca_seguimiento", {}, Exception("violación de llave"))
+
+    cola = ColaEscrituraDiferida(aplicar, retardo=0, al_fallar=lambda ids, error: fallos.append(ids))
+    cola.marcar([7], es_oculta=True)
+    assert cola.esperar(timeout=5)
+    assert fallos == [[7]] and not cola.hay_pendientes()
+    assert cola.cerrar(timeout=5)
+
+
+def test_superponer_aplica_lo_pendiente_sin_esperar(db_service, db_session):
+    _sembrar(db_session)
+    db_service.reconstruir_vista_trabajo()
+    db_service.aplicar_seguimiento({2: {"es_favorito": True}})
+    cola = ColaEscrituraDiferida(db_service.aplicar_seguimiento, retardo=60)
+    cola.marcar([1], es_favorito=True, es_ofertada=False)
+    cola.marcar([2], es_ofertada=True)
+    cola.anotar([3], "revisar")
+
+    candidatas = cola.superponer(db_service.obtener_listado_candidatas(), "candidatas")
+    assert [(f["codigo_ca"], f["tiene_nota"]) for f in candidatas] == [("COLA-03", True)]
+    # COLA-02 pasa a ofertadas: sale de seguimiento aunque la base aún no lo sepa
+    assert cola.superponer(db_service.obtener_listado_seguimiento(), "seguimiento") == []
+    ofertadas = cola.superponer(db_service.obtener_listado_ofertadas(), "ofertadas")
+    assert ofertadas == []  # lo que entra a una pestaña aparece al confirmarse
+
+    # Sin vista (búsqueda) solo se corrigen las marcas
+    todas = {f["codigo_ca"]: f for f in cola.superponer(db_service.buscar_licitaciones("Compra")["filas"])}
+    assert todas["COLA-02"]["es_favorito"] and todas["COLA-02"]["es_ofertada"]
+    assert todas["COLA-01"]["es_favorito"] and not todas["COLA-01"]["es_ofertada"]
+
+    assert cola.esperar(timeout=5) and cola.cambios_pendientes() == {}
+    assert [f["codigo_ca"] for f in db_service.obtener_listado_ofertadas()] == ["COLA-02"]
+    assert cola.cerrar(timeout=5)
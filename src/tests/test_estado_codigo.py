@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del código de estado normalizado (estado_codigo).
+"""
+
+from datetime import datetime, timedelta
+
+from src.db.db_models import CaLicitacion, EstadoCa, derivar_estado_codigo
+
+
+def test_derivar_estado_codigo():
+    assert derivar_estado_codigo("Publicada") == EstadoCa.PUBLICADA
+    assert derivar_estado_codigo("Publicada", estado_convocatoria=2) == EstadoCa.SEGUNDO_LLAMADO
+    assert derivar_estado_codigo("Publicada - Segundo llamado") == EstadoCa.SEGUNDO_LLAMADO
+    assert derivar_estado_codigo("Cerrada (Vencida Local)") == EstadoCa.VENCIDA_LOCAL
+    assert derivar_estado_codigo("OC Emitida") == EstadoCa.OC_EMITIDA
+    assert derivar_estado_codigo(None) == EstadoCa.DESCONOCIDO
+
+
+def test_estado_codigo_se_sincroniza_en_ingesta_y_cierre(db_service, db_session):
+    """El upsert (Core) y el cierre local (ORM) deben mantener el código al día."""
+    hace_20_dias = datetime.now() - timedelta(days=20)
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "EST-01", "nombre": "Abierta", "organismo": "Org", "estado": "Publicada", "fecha_cierre": hace_20_dias},
+        {"codigo": "EST-02", "nombre": "Cerrada", "organismo": "Org", "estado": "Cerrada"},
+    ])
+    codigos = dict(db_session.query(CaLicitacion.codigo_ca, CaLicitacion.estado_codigo).all())
+    assert codigos == {"EST-01": EstadoCa.PUBLICADA, "EST-02": EstadoCa.CERRADA}
+
+    assert db_service.cerrar_licitaciones_vencidas_localmente() == 1
+    db_session.expire_all()
+    lic = db_session.query(CaLicitacion).filter_by(codigo_ca="EST-01").one()
+    assert lic.estado_codigo == EstadoCa.VENCIDA_LOCAL
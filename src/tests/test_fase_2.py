@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la escritura de fichas (Fase 2) con detección de cambios por huella.
+"""
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from config.config import PUNTOS_SEGUNDO_LLAMADO
+from src.db.db_models import CaLicitacion, CaProducto
+from src.db.db_service import DbService
+from src.db.ddl_postgres import instalar_esquema_texto
+from src.db.perfiles_carga import PERFIL_ETL
+from src.logic.etl_service import ServicioEtl
+from src.logic.schemas import LicitacionDetalleSchema
+from src.logic.score_engine import MotorPuntajes
+
+
+class ScraperFalso:
+    """Devuelve fichas fijas y cuenta las descargas."""
+    def __init__(self, fichas):
+        self.fichas = fichas
+
+    def extraer_detalle_api(self, _pagina, codigo):
+        return LicitacionDetalleSchema(**self.fichas[codigo])
+
+
+def test_fichas_identicas_no_se_reescriben(db_service, db_session, monkeypatch):
+    monkeypatch.setattr("src.logic.etl_service.time.sleep", lambda _s: None)
+    db_service.agregar_palabra_clave_flexible("guantes", 0, 10, 0)
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "F2-01", "nombre": "Insumos", "organismo": "Hospital", "estado": "Publicada"},
+        {"codigo": "F2-02", "nombre": "Insumos", "organismo": "Hospital", "estado": "Publicada"},
+    ])
+    fichas = {
+        "F2-01": {"descripcion": "Compra de guantes", "productos_solicitados": [{"nombre": "Guante", "cantidad": 10}]},
+        "F2-02": {"descripcion": "Compra de mascarillas"},
+    }
+    etl = ServicioEtl(db_service, ScraperFalso(fichas), MotorPuntajes(db_service))
+    escrituras = []
+    original = db_service.actualizar_fase_2_lote
+    monkeypatch.setattr(db_service, "actualizar_fase_2_lote", lambda lote: escrituras.append(len(lote)) or original(lote))
+
+    candidatas = db_session.query(CaLicitacion).options(*PERFIL_ETL).all()
+    etl._procesar_detalle_lote(candidatas, lambda _t: None, lambda _p: None)
+    assert escrituras == [2]
+
+    # Misma ficha: ni escritura ni recálculo (el puntaje no se acumula)
+    etl._procesar_detalle_lote(db_session.query(CaLicitacion).options(*PERFIL_ETL).all(), lambda _t: None, lambda _p: None)
+    assert escrituras == [2]
+
+    fichas["F2-02"]["descripcion"] = "Compra de guantes y mascarillas"
+    etl._procesar_detalle_lote(db_session.query(CaLicitacion).options(*PERFIL_ETL).all(), lambda _t: None, lambda _p: None)
+    assert escrituras == [2, 1]
+
+    db_session.expire_all()
+    puntajes = dict(db_session.query(CaLicitacion.codigo_ca, CaLicitacion.puntuacion_final).all())
+    assert puntajes == {"F2-01": 10, "F2-02": 10}
+
+
+def test_lineas_de_producto_y_reglas_por_codigo(db_service, db_session, monkeypatch):
+    monkeypatch.setattr("src.logic.etl_service.time.sleep", lambda _s: None)
+    db_service.establecer_regla_producto("4618", 7)
+    db_service.establecer_regla_producto(47131502, 3)
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "F2-10", "nombre": "Insumos", "organismo": "Hospital", "estado": "Publicada"},
+    ])
+    fichas = {"F2-10": {"productos_solicitados": [
+        {"codigo_producto": 46181504, "nombre": "Guante", "descripcion": "Látex", "cantidad": 10, "unidad_medida": "Caja"},
+        {"codigo_producto": 46181505, "nombre": "Guante"},
+        {"codigo_producto": 47131502, "nombre": "Paño"},
+    ]}}
+    etl = ServicioEtl(db_service, ScraperFalso(fichas), MotorPuntajes(db_service))
+    etl._procesar_detalle_lote(db_session.query(CaLicitacion).options(*PERFIL_ETL).all(), lambda _t: None, lambda _p: None)
+
+    lineas = db_session.query(CaProducto).order_by(CaProducto.linea).all()
+    assert [(l.codigo_producto, l.nombre_norm) for l in lineas] == [
+        (46181504, "guante latex"), (46181505, "guante"), (47131502, "pano"),
+    ]
+    assert (lineas[0].cantidad, lineas[0].unidad) == (10.0, "Caja")
+    # La familia 4618 suma una vez aunque la cumplan dos líneas
+    lic = db_session.query(CaLicitacion).one()
+    assert lic.puntuacion_final == 10
+    assert lic.puntaje_detalle == ["Cód. Prod.: 4618 (+7)", "Cód. Prod.: 47131502 (+3)"]
+
+    # El recálculo lee las líneas de ca_producto; la regla más específica manda
+    db_service.establecer_regla_producto("46181505", 1)
+    etl._transformar_puntajes_fase_1(lambda _t: None, lambda _p: None)
+    db_session.expire_all()
+    assert db_session.query(CaLicitacion.puntuacion_final).scalar() == 11
+
+
+def test_ficha_que_falla_no_pierde_el_lote(db_service, db_session, monkeypatch):
+    monkeypatch.setattr("src.logic.etl_service.time.sleep", lambda _s: None)
+    codigos = ["F2-10", "F2-MALA", "F2-11"]
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": c, "nombre": "Insumos", "organismo": "Hospital", "estado": "Publicada"} for c in codigos
+    ])
+    fichas = {c: {"descripcion": f"Ficha {c}"} for c in codigos}
+    etl = ServicioEtl(db_service, ScraperFalso(fichas), MotorPuntajes(db_service))
+    original = db_service.actualizar_fase_2_lote
+
+    def actualizar_fase_2_lote(lote):
+        if any(f["codigo_ca"] == "F2-MALA" for f in lote):
+            raise ValueError("ficha inválida")
+        return original(lote)
+
+    monkeypatch.setattr(db_service, "actualizar_fase_2_lote", actualizar_fase_2_lote)
+    etl._procesar_detalle_lote(db_session.query(CaLicitacion).options(*PERFIL_ETL).all(), lambda _t: None, lambda _p: None)
+
+    db_session.expire_all()
+    descripciones = dict(db_session.query(CaLicitacion.codigo_ca, CaLicitacion.descripcion).all())
+    assert descripciones == {"F2-10": "Ficha F2-10", "F2-MALA": None, "F2-11": "Ficha F2-11"}
+
+
+def test_puntajes_sql_iguales_a_python_postgres(engine_postgres, monkeypatch):
+    """El recálculo en el servidor da el mismo puntaje y detalle que MotorPuntajes."""
+    try:
+        with engine_postgres.begin() as conexion:
+            instalar_esquema_texto(conexion)
+    except DBAPIError:
+        pytest.skip("Requiere las extensiones pg_trgm y unaccent")
+    monkeypatch.setattr("src.logic.etl_service.time.sleep", lambda _s: None)
+    factory = sessionmaker(bind=engine_postgres)
+    db_service = DbService(factory)
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "PAR-01", "nombre": "Compra de guantes de látex", "organismo": "Hospital Regional", "estado": "Publicada"},
+        {"codigo": "PAR-02", "nombre": "Guantes", "organismo": "Hospital Regional de Talca", "estado": "Segundo llamado"},
+        {"codigo": "PAR-03", "nombre": "Guantes", "organismo": "Municipalidad de Lota", "estado": "Publicada"},
+        {"codigo": "PAR-04", "nombre": "Mascarillas", "organismo": "Servicio de Salud", "estado": "Publicada"},
+    ])
+    organismos = {o.nombre: o.organismo_id for o in db_service.obtener_todos_organismos()}
+    db_service.establecer_regla_organismo(organismos["Hospital Regional"], "PRIORITARIO", 5)
+    db_service.establecer_regla_organismo(organismos["Municipalidad de Lota"], "NO_DESEADO", -50)
+    db_service.agregar_palabra_clave_flexible("guantes", 10, 3, 2)
+    db_service.agregar_palabra_clave_flexible("guantes de latex", 15, 0, 0)
+    db_service.agregar_palabra_clave_flexible("mascarilla", 4, 4, 4)
+    db_service.establecer_regla_producto("4618", 7)
+    fichas = {
+        "PAR-01": {"descripcion": "Guantes de látex talla M", "productos_solicitados": [
+            {"codigo_producto": 46181504, "nombre": "Guante", "descripcion": "Látex"}]},
+        "PAR-04": {"descripcion": "Mascarillas N95", "productos_solicitados": [{"nombre": "Mascarilla", "cantidad": 5}]},
+    }
+    etl = ServicioEtl(db_service, ScraperFalso(fichas), MotorPuntajes(db_service))
+    with factory() as session:
+        candidatas = session.query(CaLicitacion).options(*PERFIL_ETL).filter(CaLicitacion.codigo_ca.in_(fichas)).all()
+    etl._procesar_detalle_lote(candidatas, lambda _t: None, lambda _p: None)
+
+    def recalcular_desde_cero(recalculo):
+        # Un puntaje imposible obliga a ambos motores a reescribir todas las filas
+        with factory() as session:
+            session.execute(update(CaLicitacion).values(puntuacion_final=-999, puntaje_detalle=None))
+            session.commit()
+        recalculo()
+        with factory() as session:
+            return {
+                r.codigo_ca: (r.puntuacion_final, r.puntaje_detalle)
+                for r in session.query(CaLicitacion.codigo_ca, CaLicitacion.puntuacion_final, CaLicitacion.puntaje_detalle)
+            }
+
+    monkeypatch.setattr("src.logic.etl_service.MOTOR_PUNTAJES_SQL", False)
+    en_python = recalcular_desde_cero(lambda: etl._transformar_puntajes_fase_1(lambda _t: None, lambda _p: None))
+    etl.score_engine.recargar_reglas_memoria()
+    en_servidor = recalcular_desde_cero(lambda: db_service.recalcular_puntajes_en_servidor(
+        etl.score_engine.cache_palabras_clave, PUNTOS_SEGUNDO_LLAMADO))
+
+    assert en_servidor == en_python
+    assert en_python["PAR-01"][1][0] == "Org. Prioritario (+5)"
+    # Un organismo guardado se resuelve por su propio nombre: no hereda la regla del que contiene
+    assert not any(d.startswith("Org.") for d in en_python["PAR-02"][1])
+    assert en_python["PAR-03"] == (-50, ["Organismo No Deseado (-50)"])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de planes de ejecución: las consultas de los repositorios deben usar los
+índices compuestos / parciales definidos para ellas.
+
+Se captura el SQL real que emite cada método y se pasa por EXPLAIN. En SQLite
+corre siempre; contra PostgreSQL solo si existe TEST_POSTGRES_URL (fixture engine_postgres).
+"""
+
+import json
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text, update
+from sqlalchemy.orm import sessionmaker
+
+from src.db.db_models import CaLicitacion, CaSeguimiento, EstadoCa
+from src.db.db_service import DbService
+from src.db.ddl_particiones import convertir_a_particionada
+from src.db.ddl_postgres import crear_indice
+from src.logic.generador_corpus import GeneradorCorpus
+
+
+@contextmanager
+def capturar_selects(engine):
+    """Registra las sentencias SELECT ejecutadas dentro del bloque."""
+    capturadas = []
+
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            capturadas.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _antes)
+    try:
+        yield capturadas
+    finally:
+        event.remove(engine, "before_cursor_execute", _antes)
+
+
+def _poblar(db_service, session):
+    GeneradorCorpus(semilla=11).cargar_en_bd(db_service.etl_repo, 2000, tamano_lote=500)
+    # Distribución realista: pocas compras sobre el umbral, la mayoría ya con ficha y cerradas
+    session.execute(update(CaLicitacion).values(puntuacion_final=CaLicitacion.ca_id % 13))
+    session.execute(update(CaLicitacion).where(CaLicitacion.ca_id % 5 != 0).values(descripcion="Ficha descargada"))
+    session.execute(update(CaLicitacion).where(CaLicitacion.ca_id % 4 != 0).values(estado_ca_texto="Cerrada", estado_codigo=EstadoCa.CERRADA.value))
+    # Seguimiento con mayoría de filas sin marcas (solo notas o marcas retiradas)
+    for ca_id in range(1, 1200):
+        marcada = ca_id % 30 == 0
+        session.add(CaSeguimiento(ca_id=ca_id, es_favorito=marcada, es_ofertada=marcada and ca_id % 60 == 0, notas="nota"))
+    session.commit()
+
+
+def _verificar_indices(metodo, plan, indices):
+    for indice in indices:
+        alternativas = indice if isinstance(indice, tuple) else (indice,)
+        assert any(a in plan for a in alternativas), f"{metodo} no usa {indice}: {plan}"
+
+
+def _planes_sqlite(engine, sentencias):
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        return [
+            " ".join(str(fila[-1]) for fila in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params))
+            for sql, params in sentencias
+        ]
+
+
+# Cada elemento es un índice o una tupla de alternativas válidas: sin LIMIT,
+# PostgreSQL puede preferir leer las abiertas por (estado, cierre) y ordenar en memoria.
+CONSULTAS = [
+    ("exportar_candidatas", [("ix_ca_licitacion_abiertas_puntaje", "ix_ca_licitacion_estado_cierre"),
+                             "ix_ca_seguimiento_marcadas"]),
+    ("obtener_candidatas_para_fase_2", ["ix_ca_licitacion_pendientes_fase_2"]),
+    ("obtener_licitaciones_seguimiento", ["ix_ca_seguimiento_favoritas"]),
+    ("obtener_licitaciones_ofertadas", ["ix_ca_seguimiento_ofertadas"]),
+    ("obtener_rango_fechas_candidatas_activas", ["ix_ca_licitacion_estado_cierre", "ix_ca_seguimiento_marcadas"]),
+]
+
+
+@pytest.mark.parametrize("metodo, indices", CONSULTAS)
+def test_consultas_usan_indices_sqlite(engine, db_service, db_session, metodo, indices):
+    _poblar(db_service, db_session)
+
+    with capturar_selects(engine) as sentencias:
+        getattr(db_service, metodo)()
+
+    plan = " ".join(_planes_sqlite(engine, sentencias))
+    _verificar_indices(metodo, plan, indices)
+    # En SQLite la lista de candidatas sale ordenada directamente del índice parcial
+    if metodo == "exportar_candidatas":
+        assert "ix_ca_licitacion_abiertas_puntaje" in plan
+
+
+@pytest.mark.parametrize("metodo, indices", CONSULTAS)
+def test_consultas_usan_indices_postgres(engine_postgres, metodo, indices):
+    factory = sessionmaker(bind=engine_postgres)
+    servicio = DbService(factory)
+    with factory() as session:
+        _poblar(servicio, session)
+        session.execute(text("ANALYZE"))
+        session.commit()
+
+    with capturar_selects(engine_postgres) as sentencias:
+        getattr(servicio, metodo)()
+
+    planes = []
+    with engine_postgres.connect() as conn:
+        # Con tablas pequeñas un seq scan siempre es más barato; se descarta para ver qué índices son elegibles
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for sql, params in sentencias:
+            planes.append(json.dumps(conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).scalar()))
+    _verificar_indices(metodo, " ".join(planes), indices)
+
+
+def test_indice_concurrente_en_tabla_particionada_postgres(engine_postgres):
+    """CONCURRENTLY no existe para tablas particionadas: padre ON ONLY + cada partición + ATTACH."""
+    with engine_postgres.begin() as conexion:
+        convertir_a_particionada(conexion)
+    with engine_postgres.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        for _ in range(2):  # Idempotente: reaplicar la migración no falla
+            crear_indice(conexion, "ix_ca_licitacion_prueba", "ca_licitacion", "(nombre)")
+        validos = conexion.execute(text(
+            "SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass('ix_ca_licitacion_prueba')"
+        )).scalar()
+        hijos = conexion.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass('ix_ca_licitacion_prueba')"
+        )).scalar()
+        particiones = conexion.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass('ca_licitacion')"
+        )).scalar()
+    # Todas las particiones adjuntas: el índice del padre queda válido
+    assert validos and hijos == particiones > 1
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la instrumentación SQL (agregados por operación y detector de N+1).
+"""
+import json
+import logging
+
+from src.db.db_models import CaLicitacion
+from src.db.instrumentacion import InstrumentacionSql, normalizar_sentencia
+
+
+def test_normaliza_listas_de_parametros():
+    assert normalizar_sentencia("SELECT a FROM t WHERE id IN (?, ?, ?)") == \
+        normalizar_sentencia("SELECT a  FROM t WHERE id IN (?)")
+    assert normalizar_sentencia("INSERT INTO t (a, b) VALUES (%(a_m0)s, %(b_m0)s), (%(a_m1)s, %(b_m1)s)") == \
+        "INSERT INTO t (a, b) VALUES (?)"
+
+
+def test_agrupa_por_operacion_y_detecta_n_mas_1(engine, db_service, db_session, caplog, tmp_path):
+    db_session.add_all([
+        CaLicitacion(codigo_ca=f"SQL-0{i}", nombre="Compra", estado_ca_texto="Publicada", puntuacion_final=10)
+        for i in range(1, 6)
+    ])
+    db_session.commit()
+
+    instr = InstrumentacionSql(lenta_ms=60_000, umbral_n_mas_1=3)
+    instr.instalar(engine)
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.db.instrumentacion"):
+            with instr.operacion("Prueba.nota_por_fila"):
+                for ca_id in range(1, 6):
+                    db_service.obtener_nota_usuario(ca_id)
+            with instr.operacion("Prueba.lote"):
+                db_service.obtener_ca_ids([f"SQL-0{i}" for i in range(1, 6)])
+    finally:
+        instr.desinstalar(engine)
+
+    # Cada llamada suelta no repite nada; la operación externa sí (una vez por sentencia)
+    avisos = [r.getMessage() for r in caplog.records if "N+1" in r.getMessage()]
+    assert len(avisos) == 1 and "[Prueba.nota_por_fila]" in avisos[0]
+
+    operaciones = {o["operacion"]: o for o in instr.resumen_operaciones()}
+    assert operaciones["Prueba.nota_por_fila"]["sentencias"] == 5
+    assert operaciones["Prueba.lote"]["sentencias"] == 1
+
+    # El detalle queda en la operación más interna (el método de DbService)
+    sentencias = [
+        s for s in instr.resumen_sentencias()
+        if s["operacion"] == "DbService.obtener_nota_usuario" and s["sentencia"].startswith("SELECT")
+    ]
+    assert len(sentencias) == 1 and sentencias[0]["veces"] == 5
+    assert sentencias[0]["origen"].startswith("src/db/repositories/")
+
+    ruta = instr.exportar(tmp_path / "sql.json")
+    assert {o["operacion"] for o in json.loads(ruta.read_text(encoding="utf-8"))["operaciones"]} == set(operaciones)
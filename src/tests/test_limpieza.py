@@ -86,4 +86,104 @@ def test_limpieza_automatica_logica(db_service, db_session):
     assert db_session.get(CaLicitacion, id_borrar) is None, "El CASO 1 (Basura) debería haber sido borrado."
     assert db_session.get(CaLicitacion, id_reciente) is not None, "El CASO 2 (Reciente) no debió borrarse."
     assert db_session.get(CaLicitacion, id_publicada) is not None, "El CASO 3 (Publicada) no debió borrarse."
-    assert db_session.get(CaLicitacion, id_favorita) is not None, "El CASO 4 (Favorita) debió estar protegido."
\ No newline at end of file
+    assert db_session.get(CaLicitacion, id_favorita) is not None, "El CASO 4 (Favorita) debió estar protegido."
+
+def test_purga_por_lotes_reporta_metricas(db_service, db_session):
+    """La purga borra en lotes acotados (keyset por ca_id) y reporta filas/s."""
+    hace_60_dias = datetime.now() - timedelta(days=60)
+    db_session.add_all([
+        CaLicitacion(codigo_ca=f"LOTE-{i}", nombre="Vieja", estado_ca_texto="Cerrada", fecha_cierre=hace_60_dias)
+        for i in range(7)
+    ])
+    db_session.commit()
+    db_session.add(CaSeguimiento(ca_id=1, es_oculta=True))
+    db_session.commit()
+
+    reporte = db_service.mantenimiento_repo.purgar_antiguas(dias_retencion=30, tamano_lote=3)
+
+    assert reporte["filas"] == 7
+    assert reporte["lotes"] == 3
+    assert reporte["filas_por_segundo"] > 0
+    assert db_session.query(CaLicitacion).count() == 0
+    assert db_session.query(CaSeguimiento).count() == 0
+
+def test_retencion_por_particiones_conserva_fijadas(engine_postgres):
+    """
+    Con ca_licitacion particionada la purga retira meses completos y fija lo que
+    la purga plana conservaría: favoritas, ofertadas, abiertas y sin estado conocido.
+    """
+    from datetime import date
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+    from src.db.db_models import MES_FIJADO
+    from src.db.db_service import DbService
+    from src.db.ddl_particiones import convertir_a_particionada
+
+    with engine_postgres.begin() as conn:
+        convertir_a_particionada(conn)
+    servicio = DbService(sessionmaker(bind=engine_postgres))
+    vieja = {"nombre": "Vieja", "organismo": "Org", "fecha_publicacion": "2024-03-05", "fecha_cierre": "2024-03-20T15:00:00"}
+    servicio.insertar_o_actualizar_masivo([{**vieja, "codigo": f"VIEJA-{i}", "estado": "Cerrada"} for i in range(4)] + [
+        {**vieja, "codigo": "ABIERTA-01", "estado": "Publicada"},
+        {**vieja, "codigo": "RARA-01", "estado": "En evaluación"},
+        {**vieja, "codigo": "SIN-CIERRE", "estado": "Cerrada", "fecha_cierre": None},
+        {"codigo": "NUEVA-01", "nombre": "Nueva", "organismo": "Org", "estado": "Publicada", "fecha_publicacion": date.today()},
+    ])
+
+    with engine_postgres.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO ca_seguimiento (ca_id, es_favorito, es_ofertada, es_oculta) "
+            "SELECT ca_id, codigo_ca = 'VIEJA-0', codigo_ca = 'VIEJA-1', codigo_ca = 'VIEJA-2' FROM ca_licitacion "
+            "WHERE codigo_ca IN ('VIEJA-0', 'VIEJA-1', 'VIEJA-2')"
+        ))
+
+    reporte = servicio.mantenimiento_repo.purgar_antiguas(dias_retencion=30)
+
+    assert reporte["operacion"] == "purgar_particiones"
+    assert reporte["filas"] == 2 and reporte["lotes"] == 1 and reporte["fijadas"] == 5
+    with engine_postgres.connect() as conn:
+        restantes = dict(conn.execute(text("SELECT codigo_ca, mes_particion FROM ca_licitacion")).all())
+        seguimiento = conn.execute(text("SELECT count(*) FROM ca_seguimiento")).scalar()
+        particiones = conn.execute(text("SELECT to_regclass('ca_licitacion_p202403')")).scalar()
+    assert restantes == {
+        "VIEJA-0": MES_FIJADO, "VIEJA-1": MES_FIJADO, "ABIERTA-01": MES_FIJADO, "RARA-01": MES_FIJADO,
+        "SIN-CIERRE": MES_FIJADO, "NUEVA-01": date.today().replace(day=1),
+    }
+    assert seguimiento == 2
+    assert particiones is None
+
+    # Cuando lo fijado cierra, la purga lo borra de la partición fija como en la tabla plana
+    servicio.insertar_o_actualizar_masivo([{**vieja, "codigo": "ABIERTA-01", "estado": "Cerrada"}])
+    reporte = servicio.mantenimiento_repo.purgar_antiguas(dias_retencion=30)
+    assert reporte["filas"] == 1 and reporte["lotes"] == 1 and reporte["fijadas"] == 0
+    with engine_postgres.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM ca_licitacion WHERE codigo_ca = 'ABIERTA-01'")).scalar() == 0
+
+def test_purga_archiva_en_parquet_antes_de_borrar(db_service, db_session, tmp_path):
+    """Lo purgado queda en el archivo Parquet por mes y se puede consultar."""
+    import pytest
+    pytest.importorskip("pyarrow")
+    from datetime import date
+    from src.db.archivo_historico import ArchivoHistorico
+
+    archivo = ArchivoHistorico(tmp_path)
+    db_service.archivo = db_service.mantenimiento_repo.archivo = archivo
+    hace_60_dias = datetime.now() - timedelta(days=60)
+    db_session.add_all([
+        CaLicitacion(codigo_ca="ARCH-01", nombre="Compra de Guantes", estado_ca_texto="Cerrada",
+                     fecha_publicacion=date(2025, 3, 2), fecha_cierre=hace_60_dias,
+                     productos_solicitados=[{"nombre": "Guante"}]),
+        CaLicitacion(codigo_ca="ARCH-02", nombre="Resmas de papel", estado_ca_texto="Desierta",
+                     fecha_publicacion=date(2025, 4, 9), fecha_cierre=hace_60_dias),
+    ])
+    db_session.commit()
+
+    assert db_service.limpiar_registros_antiguos(dias_retencion=30) == 2
+    assert db_session.query(CaLicitacion).count() == 0
+
+    assert {p.name for p in (tmp_path / "ca_licitacion").iterdir()} == {"mes=2025-03", "mes=2025-04"}
+    assert db_service.resumen_archivo() == [{"mes": "2025-03", "compras": 1}, {"mes": "2025-04", "compras": 1}]
+    encontradas = db_service.consultar_archivo(texto="guantes")
+    assert [f["codigo_ca"] for f in encontradas] == ["ARCH-01"]
+    assert encontradas[0]["productos_solicitados"] == [{"nombre": "Guante"}]
+    assert [f["codigo_ca"] for f in db_service.consultar_archivo(desde=date(2025, 4, 1))] == ["ARCH-02"]
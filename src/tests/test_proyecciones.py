@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de las proyecciones livianas para las vistas de listado.
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+from sqlalchemy.orm import sessionmaker
+
+from src.db.ddl_postgres import instalar_esquema_texto
+from src.db.db_models import CaLicitacion, CaSeguimiento, CaOrganismo, CaSector, CaVistaTrabajo
+from src.db.enrutador_sesiones import EnrutadorSesiones
+from src.db.repositories.licitacion_repository import LicitacionRepository
+from src.db.repositories.vista_trabajo_repository import VistaTrabajoRepository
+
+
+def _sembrar(db_session):
+    db_session.add_all([
+        CaLicitacion(codigo_ca="PROY-01", nombre="Candidata", estado_ca_texto="Publicada", puntuacion_final=20,
+                     descripcion="Texto largo", productos_solicitados=[{"nombre": "Guantes"}]),
+        CaLicitacion(codigo_ca="PROY-02", nombre="Seguida", estado_ca_texto="Publicada", puntuacion_final=8),
+    ])
+    db_session.commit()
+    db_session.add(CaSeguimiento(ca_id=2, es_favorito=True, notas="  revisar  "))
+    db_session.commit()
+
+
+def test_listados_no_cargan_campos_pesados(db_service, db_session):
+    _sembrar(db_session)
+    db_service.reconstruir_vista_trabajo()
+
+    candidatas = db_service.obtener_listado_candidatas()
+    assert [f["codigo_ca"] for f in candidatas] == ["PROY-01"]
+    assert "descripcion" not in candidatas[0] and "productos_solicitados" not in candidatas[0]
+    assert candidatas[0]["organismo_nombre"] == "N/A"
+    assert not candidatas[0]["tiene_nota"] and not candidatas[0]["es_favorito"]
+
+    seguimiento = db_service.obtener_listado_seguimiento()
+    assert [f["codigo_ca"] for f in seguimiento] == ["PROY-02"]
+    assert seguimiento[0]["tiene_nota"] and seguimiento[0]["es_favorito"]
+
+
+def test_detalle_y_exportacion_incluyen_campos_pesados(db_service, db_session):
+    _sembrar(db_session)
+
+    detalle = db_service.obtener_detalle_licitacion("PROY-01")
+    assert detalle["descripcion"] == "Texto largo"
+    assert detalle["productos_solicitados"] == [{"nombre": "Guantes"}]
+    assert detalle["nota_usuario"] == ""
+    assert db_service.obtener_detalle_licitacion("NO-EXISTE") is None
+
+    exportadas = db_service.exportar_candidatas()
+    assert exportadas[0]["productos_solicitados"] == str([{"nombre": "Guantes"}])
+    assert exportadas[0]["tiene_nota"] is False
+
+
+def test_paginacion_keyset_recorre_sin_repetir(db_service, db_session):
+    # Puntajes con empates para ejercitar el desempate por ca_id
+    db_session.add_all([
+        CaLicitacion(codigo_ca=f"PAG-{i:02d}", nombre=f"Compra {i}", estado_ca_texto="Publicada",
+                     puntuacion_final=10 + i % 3)
+        for i in range(7)
+    ])
+    db_session.commit()
+    db_service.reconstruir_vista_trabajo()
+
+    vistos, cursor, hay_mas = [], None, True
+    while hay_mas:
+        pagina = db_service.obtener_pagina_listado("candidatas", cursor, tamano=3)
+        assert len(pagina["filas"]) <= 3
+        vistos.extend((f["puntuacion_final"], f["ca_id"]) for f in pagina["filas"])
+        cursor, hay_mas = pagina["cursor"], pagina["hay_mas"]
+
+    assert len(vistos) == 7 and len(set(vistos)) == 7
+    assert vistos == sorted(vistos, key=lambda v: (-v[0], v[1]))
+    assert db_service.estimar_total_listado("candidatas") == 7
+    assert len(db_service.exportar_candidatas()) == 7
+
+
+def test_vista_trabajo_se_mantiene_con_cada_escritura(db_service):
+    def codigos(filas):
+        return [f["codigo_ca"] for f in filas]
+
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "VT-01", "nombre": "Guantes", "organismo": "Org", "estado": "Publicada", "fecha_cierre": datetime(2020, 1, 1, 10)},
+        {"codigo": "VT-02", "nombre": "Papel", "organismo": "Org", "estado": "Publicada"},
+    ])
+    datos = {d["codigo_ca"]: d["ca_id"] for d in db_service.obtener_datos_para_recalculo_puntajes()}
+    db_service.actualizar_puntajes_en_lote([(datos["VT-01"], 20, ["KW"]), (datos["VT-02"], 7, [])])
+    assert codigos(db_service.obtener_listado_candidatas()) == ["VT-01", "VT-02"]
+
+    db_service.gestionar_favorito(datos["VT-02"], True)
+    assert codigos(db_service.obtener_listado_candidatas()) == ["VT-01"]
+    assert codigos(db_service.obtener_listado_seguimiento()) == ["VT-02"]
+
+    db_service.guardar_nota_usuario(datos["VT-02"], "llamar")
+    assert db_service.obtener_listado_seguimiento()[0]["tiene_nota"]
+
+    # El cierre local saca a VT-01 de candidatas; la favorita sigue en seguimiento
+    db_service.cerrar_licitaciones_vencidas_localmente()
+    assert db_service.obtener_listado_candidatas() == []
+    assert codigos(db_service.obtener_listado_seguimiento()) == ["VT-02"]
+    assert db_service.reconstruir_vista_trabajo() == 1
+
+
+def test_vista_trabajo_sigue_a_organismos(db_service, db_session):
+    db_service.insertar_o_actualizar_masivo([
+        {"codigo": "VT-ORG", "nombre": "Guantes", "organismo": "Hospital Antiguo", "estado": "Publicada"},
+    ])
+    db_service.actualizar_puntajes_en_lote([(db_service.obtener_ca_ids(["VT-ORG"])["VT-ORG"], 20, [])])
+    org = db_session.scalars(select(CaOrganismo).filter_by(nombre="Hospital Antiguo")).one()
+
+    def nombre_en_vista():
+        return db_session.scalar(select(CaVistaTrabajo.organismo_nombre))
+
+    # Renombrar (o fusionar) organismos refresca por organismo_id en la misma transacción
+    org.nombre = "Hospital Regional"
+    db_session.flush()
+    assert VistaTrabajoRepository.refrescar_organismos(db_session, [org.organismo_id]) == 1
+    db_session.commit()
+    assert nombre_en_vista() == "Hospital Regional"
+
+
+def test_refresco_concurrente_no_choca_con_la_pk_postgres(engine_postgres):
+    """Dos escritores refrescan la misma compra: el segundo espera al primero en vez de violar la PK."""
+    factory = sessionmaker(bind=engine_postgres)
+    with factory() as session:
+        _sembrar(session)
+        VistaTrabajoRepository.refrescar(session, ca_ids=[1, 2])
+        session.commit()
+
+    errores = []
+
+    def segundo_escritor():
+        try:
+            with factory() as session:
+                VistaTrabajoRepository.refrescar(session, ca_ids=[1, 2])
+                session.commit()
+        except Exception as e:
+            errores.append(e)
+
+    with factory() as primero:
+        primero.execute(update(CaLicitacion).where(CaLicitacion.ca_id == 1).values(puntuacion_final=30))
+        VistaTrabajoRepository.refrescar(primero, ca_ids=[1, 2])
+        hilo = threading.Thread(target=segundo_escritor)
+        hilo.start()
+        hilo.join(0.5)  # El segundo queda esperando el lock de las filas del primero
+        primero.commit()
+    hilo.join(10)
+
+    assert errores == []
+    with factory() as session:
+        assert session.scalar(select(CaVistaTrabajo.puntuacion_final).where(CaVistaTrabajo.ca_id == 1)) == 30
+        assert session.scalar(select(func.count()).select_from(CaVistaTrabajo)) == 2
+
+
+def test_acciones_por_clave_en_una_transaccion(db_service, db_session):
+    _sembrar(db_session)
+    ids = db_service.obtener_ca_ids(["PROY-01", "PROY-02", "NO-EXISTE"])
+    assert ids == {"PROY-01": 1, "PROY-02": 2}
+
+    # Favorita y ofertada a la vez: una sola escritura deja la fila en Ofertadas
+    assert db_service.actualizar_seguimiento(ids["PROY-01"], es_favorito=True, es_ofertada=True)
+    assert [f["codigo_ca"] for f in db_service.obtener_listado_ofertadas()] == ["PROY-01"]
+    assert db_service.obtener_listado_candidatas() == []
+
+    assert db_service.obtener_nota_usuario(ids["PROY-02"]) == "  revisar  "
+    assert db_service.obtener_nota_usuario(ids["PROY-01"]) == ""
+
+
+
+def _marcar_en_lote(repo):
+    ids = [1, 2, 999]  # 999 no existe: el INSERT ... SELECT lo descarta
+    assert repo.marcar_en_lote(ids, es_ofertada=True) == 2
+    assert {f["codigo_ca"] for f in repo.listar_ofertadas()} == {"PROY-01", "PROY-02"}
+
+    # La nota en lote no toca las marcas; la existente se reemplaza
+    assert repo.anotar_en_lote([1, 2], "lote") == 2
+    assert repo.obtener_nota(1) == repo.obtener_nota(2) == "lote"
+
+    assert repo.marcar_en_lote([1, 2], es_oculta=True) == 2
+    assert repo.listar_ofertadas() == [] and repo.listar_seguimiento() == []
+    assert repo.listar_candidatas(umbral_minimo=0) == []
+    assert repo.marcar_en_lote([], es_favorito=True) == 0
+
+
+def test_marcas_en_lote(db_service, db_session):
+    _sembrar(db_session)
+    _marcar_en_lote(db_service.licitacion_repo)
+
+
+def test_marcas_en_lote_postgres(engine_postgres):
+    factory = sessionmaker(bind=engine_postgres)
+    with factory() as session:
+        _sembrar(session)
+    _marcar_en_lote(LicitacionRepository(factory))
+
+def _sembrar_busqueda(session):
+    org = CaOrganismo(nombre="Hospital Clínico Regional", sector=CaSector(nombre="Salud"))
+    session.add(org)
+    session.flush()
+    session.add_all([
+        CaLicitacion(codigo_ca="BUS-01", nombre="Adquisición de guantes de látex", estado_ca_texto="Cerrada",
+                     descripcion="Insumos clínicos", organismo_id=org.organismo_id),
+        CaLicitacion(codigo_ca="BUS-02", nombre="Servicio de aseo", estado_ca_texto="Publicada",
+                     productos_solicitados=[{"codigo_producto": 46181504, "nombre": "Guantes nitrilo", "descripcion": "talla M"},
+                                            {"codigo_producto": 47131502, "nombre": "Paños de limpieza"}]),
+        CaLicitacion(codigo_ca="BUS-03", nombre="Compra de papelería", estado_ca_texto="Publicada"),
+    ])
+    session.commit()
+
+
+def test_busqueda_encuentra_fuera_de_la_pestana(db_service, db_session):
+    _sembrar_busqueda(db_session)
+
+    # 'BUS-01' está cerrada (no es candidata) y aun así se encuentra; el título pesa más que los productos
+    resultado = db_service.buscar_licitaciones("guantes")
+    assert [f["codigo_ca"] for f in resultado["filas"]] == ["BUS-01", "BUS-02"]
+    assert [f["codigo_ca"] for f in db_service.buscar_licitaciones("bus-03")["filas"]] == ["BUS-03"]
+    assert db_service.buscar_licitaciones("  ")["filas"] == []
+
+    pagina = db_service.licitacion_repo.buscar("bus", tamano=2)
+    assert pagina["hay_mas"] and len(db_service.licitacion_repo.buscar("bus", pagina["cursor"], tamano=2)["filas"]) == 1
+
+
+def _consultar_por_producto(repo):
+    def codigos(**filtro):
+        return [f["codigo_ca"] for f in repo.buscar_por_producto(**filtro)]
+
+    assert codigos(codigo_producto=46181504) == ["BUS-02"]
+    assert codigos(codigo_producto=1) == []
+    # El texto se busca en los productos, no en el título ('BUS-01' tiene guantes solo en el nombre)
+    assert codigos(texto="talla m") == ["BUS-02"]
+    assert codigos(codigo_producto=47131502, texto="paños") == ["BUS-02"]
+    assert codigos(texto="  ") == []
+
+
+def test_consulta_por_producto(db_service, db_session):
+    _sembrar_busqueda(db_session)
+    _consultar_por_producto(db_service.licitacion_repo)
+
+
+def test_consulta_por_producto_postgres(engine_postgres):
+    factory = sessionmaker(bind=engine_postgres)
+    with factory() as session:
+        _sembrar_busqueda(session)
+    _consultar_por_producto(LicitacionRepository(factory))
+
+
+def test_busqueda_texto_completo_postgres(engine_postgres):
+    factory = sessionmaker(bind=engine_postgres)
+    with factory() as session:
+        _sembrar_busqueda(session)
+    # En producción lo instala la migración 7c2d9e4f1a35; la búsqueda solo detecta si existe
+    try:
+        with engine_postgres.begin() as conexion:
+            instalar_esquema_texto(conexion)
+    except DBAPIError:
+        pytest.skip("Requiere las extensiones pg_trgm y unaccent")
+    repo = LicitacionRepository(factory)
+
+    def codigos(texto):
+        return [f["codigo_ca"] for f in repo.buscar(texto)["filas"]]
+
+    # Sin tildes, por prefijo y con raíz en español
+    assert codigos("latex") == ["BUS-01"]
+    assert codigos("guant") == ["BUS-01", "BUS-02"]
+    assert codigos("nitrilos") == ["BUS-02"]
+    # Organismo y código por trigram
+    assert codigos("clinico regional") == ["BUS-01"]
+    assert codigos("BUS-03") == ["BUS-03"]
+
+
+def test_perfiles_de_carga(db_service, db_session):
+    _sembrar_busqueda(db_session)
+    ca_id = db_service.obtener_ca_ids(["BUS-01"])["BUS-01"]
+
+    # Detalle: organismo y sector vienen cargados aunque la sesión ya se cerró
+    assert db_service.obtener_licitacion_por_id(ca_id).organismo.sector.nombre == "Salud"
+
+    # ETL: solo el organismo; cualquier otra relación es un error, no una consulta por fila
+    db_service.actualizar_seguimiento(ca_id, es_favorito=True)
+    [lic] = db_service.obtener_licitaciones_seguimiento()
+    assert lic.organismo.nombre == "Hospital Clínico Regional"
+    with pytest.raises(InvalidRequestError):
+        lic.seguimiento
+
+
+def test_lecturas_enrutadas_postgres(engine_postgres, engine_postgres_lectura, monkeypatch):
+    """Lecturas a la base de lectura; tras un commit propio, al primario hasta que la réplica lo tenga."""
+    sesiones = EnrutadorSesiones(sessionmaker(bind=engine_postgres), sessionmaker(bind=engine_postgres_lectura))
+    repo = LicitacionRepository(sesiones)
+    with sessionmaker(bind=engine_postgres_lectura)() as session:
+        session.add(CaLicitacion(codigo_ca="LEC-01", nombre="En réplica", puntuacion_final=10))
+        session.commit()
+    assert set(repo.obtener_ca_ids(["LEC-01", "LEC-02"])) == {"LEC-01"}
+
+    with sesiones() as session:
+        session.add(CaLicitacion(codigo_ca="LEC-02", nombre="Recién escrita", puntuacion_final=10))
+        session.commit()
+    # Réplica atrasada: la lectura siguiente ve lo propio desde el primario
+    monkeypatch.setattr(EnrutadorSesiones, "_replica_al_dia", staticmethod(lambda session, lsn: False))
+    assert set(repo.obtener_ca_ids(["LEC-01", "LEC-02"])) == {"LEC-02"}
+    # Una base que no es standby siempre está al día: vuelve a la de lectura
+    monkeypatch.undo()
+    assert set(repo.obtener_ca_ids(["LEC-01", "LEC-02"])) == {"LEC-01"}
+
+
+def test_lector_concurrente_espera_el_lsn_pendiente(engine, monkeypatch):
+    """Mientras un lector consulta el LSN del último commit, otro no puede leer sin él."""
+    sesiones = EnrutadorSesiones(sessionmaker(bind=engine), sessionmaker(bind=engine))
+    consultando, liberar = threading.Event(), threading.Event()
+
+    def lsn_actual(self):
+        consultando.set()
+        liberar.wait(5)
+        return "0/10"
+
+    monkeypatch.setattr(EnrutadorSesiones, "_lsn_actual", lsn_actual)
+    sesiones._marcar_commit()
+    objetivos = []
+    primero = threading.Thread(target=lambda: objetivos.append(sesiones._objetivo()))
+    primero.start()
+    assert consultando.wait(5)
+    segundo = threading.Thread(target=lambda: objetivos.append(sesiones._objetivo()))
+    segundo.start()
+    segundo.join(0.2)
+    assert segundo.is_alive() and objetivos == []
+    liberar.set()
+    primero.join(5)
+    segundo.join(5)
+    assert objetivos == ["0/10", "0/10"]
+
+
+def test_leer_lo_propio_cuenta_solo_commits_reales(db_session, engine, monkeypatch):
+    """En una unidad de trabajo cuenta el commit del lote, no cada SAVEPOINT; sin réplica no hay seguimiento."""
+    escritura = sessionmaker(bind=engine)
+    sesiones = EnrutadorSesiones(escritura, sessionmaker(bind=engine))
+    with sesiones.unidad_de_trabajo(tamano_transaccion=2, segundos_transaccion=3600) as unidad:
+        with sesiones() as session:
+            session.add(CaLicitacion(codigo_ca="RYW-01", nombre="En el lote", puntuacion_final=10))
+            session.commit()
+        assert unidad.confirmaciones == 0 and not sesiones._commit_pendiente
+    assert unidad.confirmaciones == 1 and sesiones._commit_pendiente
+
+    # Pool de lectura sobre el primario: sin listener ni consultas de WAL
+    sin_replica = EnrutadorSesiones(escritura, sessionmaker(bind=engine), replica=False)
+    monkeypatch.setattr(EnrutadorSesiones, "_objetivo", lambda self: pytest.fail("consulta de WAL innecesaria"))
+    with sin_replica() as session:
+        session.add(CaLicitacion(codigo_ca="RYW-02", nombre="Suelta", puntuacion_final=10))
+        session.commit()
+    assert not sin_replica._commit_pendiente
+    assert set(LicitacionRepository(sin_replica).obtener_ca_ids(["RYW-01", "RYW-02"])) == {"RYW-01", "RYW-02"}
+    with sin_replica.unidad_de_trabajo() as unidad:
+        assert unidad.al_confirmar_lote is None
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la unidad de trabajo del ETL (una conexión, commits por lotes, SAVEPOINT por ítem).
+"""
+import pytest
+from sqlalchemy import event, func, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.db.db_models import CaLicitacion, CaOrganismo
+from src.db.db_service import DbService
+from src.db.enrutador_sesiones import EnrutadorSesiones
+from src.db.perfiles_carga import PERFIL_ETL
+from src.db.unidad_trabajo import aislar_item
+from src.logic.etl_service import ServicioEtl
+from src.logic.schemas import LicitacionDetalleSchema
+from src.logic.score_engine import MotorPuntajes
+
+
+def _compra(codigo, organismo="Municipalidad de Prueba"):
+    return {"codigo": codigo, "nombre": "Compra", "organismo": organismo, "estado": "Publicada"}
+
+
+def _unidad_de_trabajo(engine):
+    factory = sessionmaker(bind=engine)
+    db = DbService(EnrutadorSesiones(factory))
+    conexiones, commits = [], []
+
+    def contar_conexion(conn):
+        conexiones.append(conn)
+
+    def contar_commit(conn):
+        commits.append(conn)
+
+    event.listen(engine, "engine_connect", contar_conexion)
+    event.listen(engine, "commit", contar_commit)
+    try:
+        with db.unidad_de_trabajo(tamano_transaccion=2, segundos_transaccion=3600) as unidad:
+            for codigo in ("UOW-01", "UOW-02", "UOW-03"):
+                db.insertar_o_actualizar_masivo([_compra(codigo)])
+            # Lo no confirmado del lote se lee dentro de la unidad
+            assert set(db.obtener_ca_ids(["UOW-01", "UOW-03"])) == {"UOW-01", "UOW-03"}
+
+            # Un ítem que falla deshace todo lo suyo, incluido el organismo nuevo
+            with pytest.raises(RuntimeError):
+                with aislar_item():
+                    db.insertar_o_actualizar_masivo([_compra("UOW-04", "Organismo Revertido")])
+                    raise RuntimeError("ficha inválida")
+            with aislar_item():
+                db.insertar_o_actualizar_masivo([_compra("UOW-05")])
+    finally:
+        event.remove(engine, "engine_connect", contar_conexion)
+        event.remove(engine, "commit", contar_commit)
+
+    # Una sola conexión y dos commits: (UOW-01, UOW-02) al llegar a 2 y (UOW-03, UOW-05) al cerrar
+    assert len(conexiones) == 1
+    assert unidad.confirmaciones == len(commits) == 2
+    assert "Organismo Revertido" not in db.etl_repo.organismos._ids
+    with factory() as session:
+        assert set(session.scalars(select(CaLicitacion.codigo_ca))) == {"UOW-01", "UOW-02", "UOW-03", "UOW-05"}
+        assert session.scalar(select(func.count()).select_from(CaOrganismo)) == 1
+
+
+def test_unidad_de_trabajo(db_session, engine):
+    _unidad_de_trabajo(engine)
+
+
+def test_unidad_de_trabajo_postgres(engine_postgres):
+    _unidad_de_trabajo(engine_postgres)
+
+
+def test_fase_2_no_retiene_locks_durante_descargas(engine_postgres, monkeypatch):
+    """Cada descarga de ficha empieza sin transacción abierta: lo ya escrito no bloquea a otros escritores."""
+    monkeypatch.setattr("src.logic.etl_service.time.sleep", lambda _s: None)
+    monkeypatch.setattr("src.logic.etl_service.TAMANO_LOTE_FASE_2", 1)
+    factory = sessionmaker(bind=engine_postgres)
+    db = DbService(EnrutadorSesiones(factory))
+    db.insertar_o_actualizar_masivo([_compra(f"LCK-0{i}") for i in range(1, 4)])
+
+    bloqueos = []
+
+    class ScraperConEspia:
+        def extraer_detalle_api(self, _pagina, codigo):
+            # Otro escritor (p. ej. la cola de acciones) intenta tomar las filas sin esperar
+            with engine_postgres.connect() as otra:
+                try:
+                    otra.execute(text("SET lock_timeout = '100ms'"))
+                    otra.execute(text("SELECT ca_id FROM ca_licitacion FOR UPDATE"))
+                    otra.execute(text("SELECT ca_id FROM ca_vista_trabajo FOR UPDATE"))
+                except OperationalError:
+                    bloqueos.append(codigo)
+                otra.rollback()
+            return LicitacionDetalleSchema(descripcion=f"Ficha {codigo}")
+
+    etl = ServicioEtl(db, ScraperConEspia(), MotorPuntajes(db))
+    with factory() as session:
+        candidatas = session.query(CaLicitacion).options(*PERFIL_ETL).order_by(CaLicitacion.codigo_ca).all()
+    with db.unidad_de_trabajo(segundos_transaccion=3600) as unidad:
+        etl._procesar_detalle_lote(candidatas, lambda _t: None, lambda _p: None)
+
+    assert bloqueos == []
+    # Una confirmación por ficha guardada antes de la descarga siguiente, más la del cierre
+    assert unidad.confirmaciones == 3
+    with factory() as session:
+        assert session.scalar(select(func.count()).where(CaLicitacion.descripcion.like("Ficha %"))) == 3
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+Huellas de Contenido (Fingerprints).
+
+Permiten detectar si una ficha descargada (Fase 2) cambió respecto de la
+guardada, para omitir la escritura y el recálculo de puntaje cuando es idéntica.
+"""
+
+import hashlib
+import json
+from typing import Dict, Any
+
+# Campos de la ficha que se persisten en ca_licitacion (ver EtlRepository.actualizar_fase_2_lote)
+CAMPOS_FICHA = (
+    "descripcion", "productos_solicitados", "direccion_entrega", "plazo_entrega",
+    "fecha_cierre_p2", "estado", "estado_convocatoria",
+)
+
+LARGO_HUELLA = 32
+
+
+def huella_ficha(datos_fase_2: Dict[str, Any]) -> str:
+    """Hash estable (hex de 32 caracteres) de los campos persistidos de una ficha."""
+    contenido = {campo: datos_fase_2.get(campo) for campo in CAMPOS_FICHA}
+    serializado = json.dumps(contenido, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.blake2b(serializado.encode("utf-8"), digest_size=LARGO_HUELLA // 2).hexdigest()
@@ -7,11 +7,12 @@ estandarizada de logging, asegurando trazabilidad en archivos y consola.
 """
 
 import logging
+import os
 import sys
 from pathlib import Path
 
-# Directorio de logs (../.. para salir de src/utils)
-DIR_LOGS = Path(__file__).resolve().parents[2] / "data" / "logs"
+# Directorio de logs (../.. para salir de src/utils); DIR_LOGS lo redirige (ej: pruebas)
+DIR_LOGS = Path(os.getenv('DIR_LOGS', str(Path(__file__).resolve().parents[2] / "data" / "logs")))
 DIR_LOGS.mkdir(parents=True, exist_ok=True)
 
 FORMATO_LOG = "%(asctime)s - %(levelname)-8s - %(name)-15s - %(message)s"
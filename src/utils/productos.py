@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Líneas de Producto y Códigos ONU (UNSPSC).
+
+Las fichas (Fase 2) traen sus productos como una lista JSON. Aquí se convierten
+en líneas normalizadas para ca_producto y se traducen los prefijos de código
+de las reglas de puntaje a rangos enteros. Un código UNSPSC tiene 8 dígitos:
+segmento (2), familia (4), clase (6) y producto (8); un prefijo de n dígitos
+cubre el rango [prefijo * 10^(8-n), (prefijo + 1) * 10^(8-n) - 1].
+"""
+
+import json
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+DIGITOS_UNSPSC = 8
+
+
+def normalizar_texto(texto: Any) -> str:
+    """Minúsculas, sin tildes y con espacios simples (igual que MotorPuntajes)."""
+    if not texto:
+        return ""
+    s = ''.join(c for c in unicodedata.normalize('NFD', str(texto).lower()) if unicodedata.category(c) != 'Mn')
+    return " ".join(s.split())
+
+
+def _codigo(valor: Any) -> Optional[int]:
+    try:
+        codigo = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return codigo if codigo > 0 else None
+
+
+def _cantidad(valor: Any) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def lineas_producto(productos: Any) -> List[Dict[str, Any]]:
+    """
+    Líneas normalizadas de 'productos_solicitados' (lista o texto JSON).
+    'nombre_norm' es "nombre descripcion" normalizado, el mismo texto que
+    evalúa el masking de palabras clave en productos.
+    """
+    if isinstance(productos, str):
+        try: productos = json.loads(productos)
+        except ValueError: productos = []
+    if not isinstance(productos, list):
+        return []
+
+    lineas = []
+    for p in productos:
+        if not isinstance(p, dict): continue
+        unidad = p.get("unidad_medida")
+        lineas.append({
+            "linea": len(lineas),
+            "codigo_producto": _codigo(p.get("codigo_producto")),
+            "nombre_norm": normalizar_texto(f"{p.get('nombre') or ''} {p.get('descripcion') or ''}"),
+            "cantidad": _cantidad(p.get("cantidad")),
+            "unidad": str(unidad)[:100] if unidad else None,
+        })
+    return lineas
+
+
+def validar_prefijo(prefijo: Any) -> str:
+    """Prefijo de código como texto de 1 a 8 dígitos. Lanza ValueError si no lo es."""
+    texto = str(prefijo).strip()
+    if not texto.isdigit() or not 1 <= len(texto) <= DIGITOS_UNSPSC or texto.startswith("0"):
+        raise ValueError(f"Prefijo de código de producto inválido: '{prefijo}' (1 a {DIGITOS_UNSPSC} dígitos).")
+    return texto
+
+
+def rango_prefijo(prefijo: str) -> Tuple[int, int]:
+    """Códigos de 8 dígitos que empiezan con 'prefijo', como rango cerrado (desde, hasta)."""
+    escala = 10 ** (DIGITOS_UNSPSC - len(prefijo))
+    return int(prefijo) * escala, (int(prefijo) + 1) * escala - 1
+
+
+def prefijos_de(codigo: Optional[int]) -> List[str]:
+    """
+    Prefijos de un código de 8 dígitos, del más específico al más general
+    ('46181504', '4618150', ..., '4'). Vacío si no es un código UNSPSC válido,
+    igual que el cruce por rango en SQL.
+    """
+    if codigo is None or not 10 ** (DIGITOS_UNSPSC - 1) <= codigo < 10 ** DIGITOS_UNSPSC:
+        return []
+    return [str(codigo // 10 ** (DIGITOS_UNSPSC - digitos)) for digitos in range(DIGITOS_UNSPSC, 0, -1)]